@@ -11,6 +11,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 import os
+import tempfile
 from pathlib import Path
 from config import DB_USERNAME, DB_PASSWORD, DB_HOST, DB_PORT, DB_NAME, SECRET_KEY
 
@@ -87,6 +88,30 @@ DATABASES = {
     }
 }
 
+# Caches
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+# Hotel documents served by the read API, shared with the generation
+# commands so their writes can drop stale entries. The file cache works
+# for a single host; set HOTEL_CACHE_URL (redis://...) to share it wider.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'hotels': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('HOTEL_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'hotel_api_cache')),
+        'TIMEOUT': int(os.getenv('HOTEL_CACHE_TTL', 24 * 60 * 60)),
+        'OPTIONS': {'MAX_ENTRIES': int(os.getenv('HOTEL_CACHE_MAX_ENTRIES', 10000))},
+    },
+}
+if os.getenv('HOTEL_CACHE_URL'):
+    CACHES['hotels'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('HOTEL_CACHE_URL'),
+        'TIMEOUT': CACHES['hotels']['TIMEOUT'],
+    }
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
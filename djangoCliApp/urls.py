@@ -16,7 +16,11 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path
+from llmApp import views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', views.metrics, name='metrics'),
+    path('api/hotels', views.hotel_list, name='hotel-list'),
+    path('api/hotels/<str:hotel_id>', views.hotel_detail, name='hotel-detail'),
 ]
@@ -1,21 +1,133 @@
 from django.contrib import admin
-from .models import Hotel, PropertySummary, PropertyReview
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models.functions import Left
+from django.utils.functional import cached_property
+from .models import Hotel, PropertySummary, PropertyReview, GenerationJob, GenerationTask
+
+# Characters of long text columns shown on list pages
+PREVIEW_LENGTH = 80
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that takes the row count of an unfiltered list from the
+    planner's statistics instead of a COUNT(*) over the whole table. Filtered
+    lists and small tables are still counted exactly.
+    """
+    min_estimate = 10000
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where:
+            connection = connections[self.object_list.db]
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                        [self.object_list.model._meta.db_table],
+                    )
+                    row = cursor.fetchone()
+                # -1 until the table has been analyzed
+                if row and row[0] >= self.min_estimate:
+                    return row[0]
+        return super().count
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    # Skips the second COUNT(*) behind "N results (M total)" when filtering
+    show_full_result_count = False
+    # Long text columns loaded only as <field>_preview on list pages; one
+    # character more than shown tells whether the text was cut
+    preview_fields = ()
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if request.resolver_match and request.resolver_match.url_name.endswith('_changelist'):
+            queryset = queryset.defer(*self.preview_fields).annotate(
+                **{f'{field}_preview': Left(field, PREVIEW_LENGTH + 1) for field in self.preview_fields}
+            )
+        return queryset
+
+    def truncate(self, text):
+        if text and len(text) > PREVIEW_LENGTH:
+            return text[:PREVIEW_LENGTH] + '…'
+        return text
+
+class RatingBandFilter(admin.SimpleListFilter):
+    """
+    Fixed rating bands, so the filter does not list every distinct rating
+    """
+    title = 'rating'
+    parameter_name = 'min_rating'
+
+    def lookups(self, request, model_admin):
+        return [('4.5', '4.5 and up'), ('4', '4 and up'), ('3', '3 and up')]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(rating__gte=float(self.value()))
+        return queryset
 
 @admin.register(Hotel)
-class HotelAdmin(admin.ModelAdmin):
-    list_display = ('property_title', 'description', 'city_name', "hotel_id",'price','rating','address','latitude','longitude','room_type','image','local_image_path')
-    search_fields = ('property_title', 'city_name', 'address')
-    list_filter = ('city_name', 'rating')
+class HotelAdmin(LargeTableAdmin):
+    list_display = ('property_title', 'description_preview', 'city_name', "hotel_id",'price','rating','address','latitude','longitude','room_type','image','local_image_path')
+    search_fields = ('property_title', 'city_name', 'address', 'hotel_id__exact')
+    list_filter = ('city_name', RatingBandFilter)
+    preview_fields = ('description',)
+
+    @admin.display(description='description')
+    def description_preview(self, obj):
+        return self.truncate(obj.description_preview)
+
+class GeneratedContentAdmin(LargeTableAdmin):
+    """
+    Summaries and reviews, shown and searched by their hotel's title
+    """
+    list_select_related = ('property',)
+    raw_id_fields = ('property',)
+
+    def get_queryset(self, request):
+        # The hotel is only needed for its title
+        return super().get_queryset(request).defer(
+            'property__description', 'property__address', 'property__original_title',
+        )
+
+    @admin.display(description='hotel', ordering='property__property_title')
+    def hotel(self, obj):
+        return f"{obj.property.property_title} ({obj.property_id})"
 
 @admin.register(PropertySummary)
-class PropertySummaryAdmin(admin.ModelAdmin):
-    list_display = ('property', 'summary', 'created_at', 'updated_at')
-    search_fields = ('property_title', 'summary')
+class PropertySummaryAdmin(GeneratedContentAdmin):
+    list_display = ('hotel', 'summary_preview', 'created_at', 'updated_at')
+    search_fields = ('property__property_title', 'property_id__exact', 'summary')
     list_filter = ('created_at', 'updated_at')
+    preview_fields = ('summary',)
+
+    @admin.display(description='summary')
+    def summary_preview(self, obj):
+        return self.truncate(obj.summary_preview)
 
 @admin.register(PropertyReview)
-class PropertyReviewAdmin(admin.ModelAdmin):
-    list_display = ('property', 'rating', 'review','created_at')
-    search_fields = ('property_title', 'review')
-    list_filter = ('rating', 'created_at')
-    
\ No newline at end of file
+class PropertyReviewAdmin(GeneratedContentAdmin):
+    list_display = ('hotel', 'rating', 'review_preview','created_at')
+    search_fields = ('property__property_title', 'property_id__exact', 'review')
+    list_filter = (RatingBandFilter, 'created_at')
+    preview_fields = ('review',)
+
+    @admin.display(description='review')
+    def review_preview(self, obj):
+        return self.truncate(obj.review_preview)
+
+
+@admin.register(GenerationJob)
+class GenerationJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'command', 'stages', 'status', 'left_out', 'created_at', 'finished_at')
+    list_filter = ('command', 'status')
+
+@admin.register(GenerationTask)
+class GenerationTaskAdmin(admin.ModelAdmin):
+    list_display = ('job', 'hotel_id', 'stage', 'status', 'attempts', 'updated_at')
+    search_fields = ('hotel_id', 'last_error')
+    list_filter = ('stage', 'status')
+    raw_id_fields = ('job',)
@@ -0,0 +1,603 @@
+# llmApp/management/base.py
+import json
+import multiprocessing
+import os
+from functools import partial
+from typing import Optional
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from llmApp.models import GenerationJob, GenerationTask
+from llmApp.services.concurrency import chunked_by, run_concurrently
+from llmApp.services.dedup import share_from_duplicates
+from llmApp.services.gemini_service import AsyncGeminiService, GeminiService, parse_stage_limits
+from llmApp.services.hotel_api import invalidate_hotels
+from llmApp.services.job_ledger import JobLedger, poison_hotel_ids
+from llmApp.services.llm_backends import get_backend, parse_stage_backends
+from llmApp.services.metrics import MetricsRegistry, get_registry, reset_registry
+from llmApp.services.planner import (
+    DEFAULT_LATENCY, PromptRecorder, format_duration, observed_latency, plan_stage, project_seconds
+)
+from llmApp.services.rate_limiter import RateLimiter
+from llmApp.services.stages import STAGES
+from llmApp.services.write_buffer import WriteBuffer
+
+# Options common to every Django command, not worth recording on a job
+BASE_OPTIONS = {'verbosity', 'settings', 'pythonpath', 'traceback', 'no_color', 'force_color', 'skip_checks'}
+# Options that decide which work a job does, restored from the job on --resume
+JOB_OPTIONS = {'force', 'stages', 'reviews_per_hotel'}
+
+
+class GeminiCommand(BaseCommand):
+    """
+    Options, saving and reporting shared by the commands that call Gemini.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2,
+            help='Number of hotels to process in each batch'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=1,
+            help='Number of Gemini requests to keep in flight at once; all of them share the GEMINI_RPM / '
+                 'GEMINI_TPM limits, which default to the published quota of the model'
+        )
+        parser.add_argument(
+            '--no-cache',
+            action='store_true',
+            help='Neither read nor store responses in the prompt cache'
+        )
+        parser.add_argument(
+            '--refresh-cache',
+            action='store_true',
+            help='Ignore cached responses but store the new ones'
+        )
+        parser.add_argument(
+            '--flush-size',
+            type=int,
+            default=100,
+            help='Number of results written to the database per bulk flush'
+        )
+        parser.add_argument(
+            '--flush-interval',
+            type=float,
+            default=5.0,
+            help='Maximum seconds results wait in the write buffer'
+        )
+        parser.add_argument(
+            '--resume',
+            type=int,
+            metavar='JOB_ID',
+            help='Continue an earlier job instead of starting a new one'
+        )
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            help="Retry failed tasks and include hotels that used up their attempts"
+        )
+        parser.add_argument(
+            '--max-attempts',
+            type=int,
+            default=3,
+            help='Failed attempts after which a hotel is left out of new jobs'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of worker processes claiming hotels from the job'
+        )
+        parser.add_argument(
+            '--lease-seconds',
+            type=float,
+            default=1800,
+            help='Seconds a worker holds its claimed hotels before others may take them over'
+        )
+        parser.add_argument(
+            '--backend',
+            metavar='NAME[:MODEL]',
+            help="Model server for every stage: gemini, ollama or ollama-chat, optionally with a model (default: LLM_BACKEND or gemini)"
+        )
+        parser.add_argument(
+            '--stage-backends',
+            metavar='STAGE=NAME[:MODEL],...',
+            help='Send some stages to another backend or model, e.g. title=ollama:llama3.2 (default: LLM_STAGE_BACKENDS)'
+        )
+        parser.add_argument(
+            '--max-output-tokens',
+            metavar='STAGE=TOKENS,...',
+            help='maxOutputTokens per hotel for some stages, e.g. title=64,summary=256 (0 for no limit)'
+        )
+        parser.add_argument(
+            '--input-budget',
+            metavar='STAGE=TOKENS,...',
+            help='Tokens of description a stage may put in its prompt before it is shortened, e.g. summary=300 (0 for no limit)'
+        )
+        parser.add_argument(
+            '--metrics-json',
+            metavar='PATH',
+            help="Write a JSON summary of the run's metrics to PATH ('-' for stdout)"
+        )
+        parser.add_argument(
+            '--plan',
+            action='store_true',
+            help='Estimate requests, tokens, cost and duration for the pending hotels without calling the API'
+        )
+        parser.add_argument(
+            '--plan-sample',
+            type=int,
+            default=20,
+            help='Number of pending hotels per stage whose prompts are built for the --plan estimate'
+        )
+        parser.add_argument(
+            '--plan-latency',
+            type=float,
+            metavar='SECONDS',
+            help='Seconds per request assumed by --plan (default: the median recorded in the metrics file)'
+        )
+
+    @property
+    def command_name(self) -> str:
+        return self.__module__.rsplit('.', 1)[-1]
+
+    def get_ledger(self, options, stage_names, hotels) -> Optional[JobLedger]:
+        """
+        Resume the job given with --resume, or start one with a task per
+        stage for every hotel in ``hotels``. Returns None, and keeps no job,
+        when there is nothing to do.
+        """
+        ledger_options = {
+            'max_attempts': options['max_attempts'],
+            'retry_failed': options['retry_failed'],
+            'flush_size': options['flush_size'],
+            'lease_seconds': options['lease_seconds'],
+        }
+        if options['resume']:
+            job = self.get_resumed_job(options)
+            self.stdout.write(f"Resuming job {job.pk}")
+            return JobLedger.resume(job, **ledger_options)
+
+        recorded = {
+            key: value for key, value in options.items()
+            if key not in BASE_OPTIONS and isinstance(value, (str, int, float, bool, type(None)))
+        }
+        ledger = JobLedger.start(self.command_name, stage_names, recorded, **ledger_options)
+        queued = ledger.seed(hotels, stage_names)
+        if queued:
+            self.stdout.write(
+                f"Started job {ledger.job.pk} with {queued} tasks (continue it with --resume {ledger.job.pk})"
+            )
+        else:
+            # A job without tasks would only be listed as completed
+            ledger.job.delete()
+            self.stdout.write(f"Nothing to do: no hotels need {', '.join(stage_names)}")
+        if ledger.job.left_out:
+            self.stdout.write(self.style.WARNING(
+                f"Left out {ledger.job.left_out} tasks of hotels that failed {options['max_attempts']} times "
+                f"(include them with --retry-failed)"
+            ))
+        return ledger if queued else None
+
+    def get_resumed_job(self, options) -> GenerationJob:
+        job = GenerationJob.objects.filter(pk=options['resume']).first()
+        if job is None:
+            raise CommandError(f"Job {options['resume']} does not exist")
+        if job.command != self.command_name:
+            raise CommandError(f"Job {job.pk} was started by {job.command}")
+        return job
+
+    def restore_job_options(self, options):
+        """
+        With --resume, carry on with the JOB_OPTIONS the job was started
+        with, refusing ones given on the command line that differ from them
+        """
+        if not options['resume']:
+            return
+        job = self.get_resumed_job(options)
+        defaults = vars(self.create_parser('manage.py', self.command_name).parse_args([]))
+        conflicts = []
+        for key in sorted(JOB_OPTIONS & job.options.keys()):
+            value, recorded = options.get(key), job.options[key]
+            if value != recorded and value != defaults.get(key):
+                conflicts.append(f"--{key.replace('_', '-')}={value} (started with {recorded})")
+            options[key] = recorded
+        if conflicts:
+            raise CommandError(f"Job {job.pk} cannot be resumed with {', '.join(conflicts)}")
+
+    def plan(self, options, work):
+        """
+        Print the requests, tokens, cost and projected duration of ``work``,
+        a list of (stage, pending hotels) pairs, without calling the API or
+        writing to the database
+        """
+        if options['resume']:
+            raise CommandError('--plan estimates a new job and cannot be combined with --resume')
+        backend, stage_backends = self.backends
+        service = PromptRecorder(backend=backend, stage_backends=stage_backends, **self.token_limits)
+        prompt_batch = options.get('prompt_batch') or 1
+        plans = []
+        for stage, hotels in work:
+            # The same hotels a new job would be seeded with
+            if not options['retry_failed']:
+                hotels = hotels.exclude(hotel_id__in=poison_hotel_ids(stage.name, options['max_attempts']))
+            sample = list(hotels.only(*stage.fields)[:max(0, options['plan_sample'])])
+            plans.append(plan_stage(stage, hotels.count(), sample, service, prompt_batch))
+        service.close()
+
+        limiter = RateLimiter.for_backends([backend, *stage_backends.values()])
+        latency = options['plan_latency'] or observed_latency() or DEFAULT_LATENCY
+        projection = project_seconds(
+            plans, options['concurrency'], options['workers'], latency, limiter.rpm, limiter.tpm
+        )
+
+        def cost(value):
+            return f"${value:,.4f}" if value is not None else 'unknown cost'
+
+        self.stdout.write(f"Plan for {self.command_name} (no requests sent):")
+        for stage_plan in plans:
+            self.stdout.write(
+                f"  {stage_plan.stage}: {stage_plan.hotels} hotels, {stage_plan.requests} requests, "
+                f"~{stage_plan.total_prompt_tokens} prompt + ~{stage_plan.total_response_tokens} response tokens, "
+                f"{cost(stage_plan.cost)} on {stage_plan.backend!r}"
+            )
+        costs = [stage_plan.cost for stage_plan in plans]
+        self.stdout.write(
+            f"Total: {sum(stage_plan.requests for stage_plan in plans)} requests, "
+            f"~{sum(plan.total_prompt_tokens + plan.total_response_tokens for plan in plans)} tokens, "
+            f"{cost(None if None in costs else sum(costs))}"
+        )
+        if limiter.enabled and any(stage_plan.backend.rate_limited for stage_plan in plans):
+            limits = f"{limiter.rpm:,.0f} requests/min, {limiter.tpm:,.0f} tokens/min"
+        else:
+            limits = 'no rate limit'
+        bottleneck = f" (limited by {projection['bottleneck']})" if projection['bottleneck'] else ''
+        self.stdout.write(
+            f"Projected duration: {format_duration(projection['seconds'])}{bottleneck} with concurrency "
+            f"{max(1, options['concurrency'])}, {max(1, options['workers'])} worker(s), "
+            f"{latency:.2f}s per request and {limits}"
+        )
+        return plans, projection
+
+    def share_duplicates(self, stages, force=False):
+        """
+        Give near-duplicate hotels their representative's content for the
+        shared stages, reporting the requests that saves
+        """
+        for stage in stages:
+            shared = share_from_duplicates(stage, force=force)
+            if shared:
+                self.metrics.inc('llm_calls_saved_total', shared, stage=stage.name)
+                self.stdout.write(
+                    f"Copied {stage.name} to {shared} near-duplicate hotels ({shared} requests saved)"
+                )
+        self.metrics.flush()
+
+    def finish_job(self, interrupted=False):
+        counts = self.ledger.finish(interrupted=interrupted)
+        job = self.ledger.job
+        self.stdout.write(
+            f"Job {job.pk} {job.status}: " + ', '.join(f"{status} {count}" for status, count in counts.items())
+            + (f", left out {job.left_out}" if job.left_out else '')
+        )
+
+    def work(self, options):
+        """
+        Claim and process hotels from self.ledger until none are left
+        """
+        raise NotImplementedError
+
+    def run_workers(self, options):
+        """
+        Run work() here, or in --workers forked processes that each claim
+        their own hotels from the same job
+        """
+        workers = max(1, options['workers'])
+        if workers == 1:
+            self.work(options)
+            return
+
+        # Every process needs its own database connections
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        processes = [
+            context.Process(target=self.run_worker, args=(options, number))
+            for number in range(1, workers + 1)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        failed = sum(1 for process in processes if process.exitcode)
+        if failed:
+            raise CommandError(f"{failed} of {workers} workers failed")
+
+    def run_worker(self, options, number):
+        # Leases are held per worker, so each process needs its own id
+        self.ledger.worker_id = self.ledger.make_worker_id()
+        self.worker_number = number
+        reset_registry()
+        try:
+            self.work(options)
+        finally:
+            connections.close_all()
+
+    @property
+    def metrics(self) -> MetricsRegistry:
+        return get_registry()
+
+    def get_backends(self, options):
+        """
+        The default backend and per-stage overrides from --backend and
+        --stage-backends
+        """
+        try:
+            backend = get_backend(options['backend'])
+            stage_backends = parse_stage_backends(options['stage_backends'] or os.getenv('LLM_STAGE_BACKENDS'))
+        except ValueError as e:
+            raise CommandError(str(e))
+        unknown = [name for name in stage_backends if name not in STAGES]
+        if unknown:
+            raise CommandError(f"Unknown stage(s) in --stage-backends: {', '.join(unknown)}")
+        return backend, stage_backends
+
+    def get_token_limits(self, options):
+        """
+        Per-stage output and input token limits from --max-output-tokens and
+        --input-budget, on top of LLM_MAX_OUTPUT_TOKENS and LLM_INPUT_BUDGETS
+        """
+        limits = {}
+        for option, key, variable in (
+            ('max_output_tokens', 'max_output_tokens', 'LLM_MAX_OUTPUT_TOKENS'),
+            ('input_budget', 'input_budgets', 'LLM_INPUT_BUDGETS'),
+        ):
+            try:
+                # The environment is read by GeminiService; parsed here to fail early
+                parse_stage_limits(os.getenv(variable))
+                limits[key] = parse_stage_limits(options.get(option))
+            except ValueError as e:
+                raise CommandError(str(e))
+            unknown = [name for name in limits[key] if name not in STAGES]
+            if unknown:
+                raise CommandError(f"Unknown stage(s) in --{option.replace('_', '-')}: {', '.join(unknown)}")
+        return limits
+
+    def get_service(self, options) -> GeminiService:
+        backend, stage_backends = self.backends
+        return GeminiService(
+            pool_size=max(1, options['concurrency']),
+            use_cache=not options['no_cache'],
+            refresh_cache=options['refresh_cache'],
+            backend=backend,
+            stage_backends=stage_backends,
+            **self.token_limits,
+        )
+
+    def success_message(self, hotel, stage, result) -> str:
+        return f"Generated {stage.name} for: {hotel.property_title}"
+
+    def get_write_buffer(self, options) -> WriteBuffer:
+        return WriteBuffer(
+            flush_size=options['flush_size'],
+            flush_interval=options['flush_interval'],
+            force=options.get('force', False),
+            on_saved=self.report_saved,
+            on_error=self.record_failure,
+            on_flush=self.record_saved,
+            metrics=self.metrics,
+            guard=self.keep_leased,
+        )
+
+    def keep_leased(self, pending):
+        """
+        Drop results of tasks whose lease ran out and went to another
+        worker, which saves its own; runs in the flush transaction
+        """
+        held = self.ledger.lock_leased(
+            (hotel.hotel_id, stage.name) for stage, items in pending for hotel, _ in items
+        )
+        kept = []
+        for stage, items in pending:
+            leased = [(hotel, result) for hotel, result in items if (hotel.hotel_id, stage.name) in held]
+            lost = len(items) - len(leased)
+            if lost:
+                self.metrics.inc('hotels_processed_total', lost, stage=stage.name, status='lease_lost')
+                self.stdout.write(self.style.WARNING(
+                    f"Dropped {lost} {stage.name} results whose lease was taken over by another worker"
+                ))
+            kept.append((stage, leased))
+        return kept
+
+    def record_saved(self, saved):
+        """
+        Mark written results as succeeded, in the same transaction as the writes
+        """
+        for stage, items in saved:
+            for hotel, result in items:
+                self.ledger.mark(hotel, stage.name, GenerationTask.STATUS_SUCCEEDED)
+            self.metrics.inc('hotels_processed_total', len(items), stage=stage.name, status='succeeded')
+        self.ledger.flush()
+        self.metrics.flush()
+        # The read API serves the new content once it is committed
+        hotel_ids = [hotel.hotel_id for _, items in saved for hotel, _ in items]
+        transaction.on_commit(lambda: invalidate_hotels(hotel_ids))
+
+    def record_failure(self, hotel, stage, error):
+        self.report_error(hotel, stage, error)
+        self.metrics.inc('hotels_processed_total', stage=stage.name, status='failed')
+        self.ledger.mark(hotel, stage.name, GenerationTask.STATUS_FAILED, str(error))
+        self.ledger.flush(full_only=True)
+
+    def report_saved(self, hotel, stage, result):
+        self.stdout.write(self.style.SUCCESS(self.success_message(hotel, stage, result)))
+
+    def report_error(self, hotel, stage, error):
+        self.stdout.write(
+            self.style.ERROR(f"Error processing hotel {hotel.id}: {str(error)}")
+        )
+
+    def process_result(self, hotel, stage, result, error=None):
+        """
+        Queue a result for the next bulk write; errors and empty results
+        are recorded as failed tasks
+        """
+        if error is not None:
+            self.record_failure(hotel, stage, error)
+        elif stage.is_valid(result):
+            self.write_buffer.add(hotel, stage, result)
+        else:
+            self.metrics.inc('hotels_processed_total', stage=stage.name, status='failed')
+            self.ledger.mark(hotel, stage.name, GenerationTask.STATUS_FAILED, 'Empty or unparsable response')
+            self.ledger.flush(full_only=True)
+
+    def report(self, gemini_service: GeminiService):
+        writes = self.write_buffer.stats
+        self.stdout.write(
+            f"Database flushes: {writes['flushes']}, rows written: {writes['written']}, "
+            f"failed: {writes['failed']}, flush time: {writes['flush_seconds']:.2f}s"
+        )
+        stats = gemini_service.stats
+        self.stdout.write(
+            f"Gemini requests: {stats['requests']}, attempts: {stats['attempts']}, "
+            f"retries: {stats['retries']}, failures: {stats['failures']}, "
+            f"batch fallbacks: {stats['batch_fallbacks']}"
+        )
+        if gemini_service.cache is not None:
+            cache = gemini_service.cache
+            self.stdout.write(f"Cache hits: {cache.hits}, misses: {cache.misses}")
+
+        self.metrics.flush()
+        summary = self.metrics.summary()
+        self.stdout.write(
+            f"Hotels/sec: {summary['hotels_per_second']}, "
+            f"prompt tokens: {self.metrics.counter_total('gemini_prompt_tokens_total'):.0f}, "
+            f"response tokens: {self.metrics.counter_total('gemini_response_tokens_total'):.0f}"
+        )
+        repairs = self.metrics.counter_total('llm_repairs_total')
+        if repairs:
+            self.stdout.write(
+                f"Malformed results: {self.metrics.counter_total('llm_parse_failures_total'):.0f} "
+                f"(waste rate {summary['waste_rate']:.1%}), repair prompts: {repairs:.0f}"
+            )
+        self.write_metrics_json(summary)
+
+    def write_metrics_json(self, summary):
+        path = self.options.get('metrics_json')
+        if not path:
+            return
+        summary = dict(summary, command=self.command_name, job=self.ledger.job.pk)
+        text = json.dumps(summary, indent=2, sort_keys=True)
+        if path == '-':
+            self.stdout.write(text)
+            return
+        number = getattr(self, 'worker_number', None)
+        if number is not None:
+            # One file per forked worker
+            base, dot, extension = path.rpartition('.')
+            path = f"{base}.worker{number}.{extension}" if dot else f"{path}.worker{number}"
+        with open(path, 'w') as handle:
+            handle.write(text + '\n')
+
+
+class HotelGenerationCommand(GeminiCommand):
+    """
+    Shared driver for the commands that generate one kind of hotel content.
+
+    Subclasses pick the stage (see llmApp.services.stages) that selects the
+    hotels to process, generates content for one hotel or a group of hotels
+    in one prompt, and saves it. Requests run concurrently while saves happen
+    one at a time in the command's own thread.
+    """
+    stage = None
+    found_message = "Found {total} hotels to process"
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--prompt-batch',
+            type=int,
+            default=1,
+            help='Number of hotels to pack into each Gemini prompt'
+        )
+
+    def get_hotels(self, assume_adopted=False):
+        return self.stage.pending(force=self.options.get('force', False), assume_adopted=assume_adopted)
+
+    async def generate(self, service: AsyncGeminiService, hotel):
+        return await self.stage.generate(service, hotel)
+
+    async def generate_batch(self, service: AsyncGeminiService, hotels):
+        """
+        Return results for several hotels keyed by hotel_id
+        """
+        return await self.stage.generate_batch(service, hotels)
+
+    def iter_batches(self, hotels, batch_size, fields=None):
+        pages = self.ledger.iter_pages(hotels, batch_size, fields)
+        for page_number, page in enumerate(pages, start=1):
+            self.stdout.write(f"Processing batch {page_number}")
+            yield from page
+
+    def handle(self, *args, **options):
+        self.restore_job_options(options)
+        self.options = options
+        self.backends = self.get_backends(options)
+        self.token_limits = self.get_token_limits(options)
+        if options['plan']:
+            # Nothing is written, so legacy content is counted as adopt() will leave it
+            self.plan(options, [(self.stage, self.get_hotels(assume_adopted=True))])
+            return
+        self.stage.adopt()
+        force = self.options.get('force', False)
+        self.share_duplicates([self.stage], force)
+        hotels = self.get_hotels()
+        self.ledger = self.get_ledger(options, [self.stage.name], hotels)
+        if self.ledger is None:
+            return
+        total_hotels = self.ledger.hotels(hotels).count()
+
+        self.stdout.write(self.found_message.format(total=total_hotels))
+
+        interrupted = True
+        try:
+            self.run_workers(options)
+            # Tasks still open belong to hotels that no longer need the stage
+            self.ledger.skip_remaining(hotels)
+            # Duplicates of the hotels generated just now
+            self.share_duplicates([self.stage], force)
+            interrupted = False
+        finally:
+            self.finish_job(interrupted)
+
+    def work(self, options):
+        batch_size = max(1, options['batch_size'])
+        concurrency = max(1, options['concurrency'])
+        prompt_batch = max(1, options['prompt_batch'])
+        gemini_service = self.get_service(options)
+        service = AsyncGeminiService(gemini_service, concurrency=concurrency)
+        self.write_buffer = self.get_write_buffer(options)
+
+        # Pacing is handled by the shared rate limiter inside GeminiService
+        batches = self.iter_batches(self.get_hotels(), batch_size, self.stage.fields)
+        # The buffer flushes whatever is left on exit, even on errors
+        with self.write_buffer:
+            if prompt_batch > 1:
+                # Hotels of one city share a prompt, which then names the city once
+                groups = chunked_by(batches, prompt_batch, key=lambda hotel: hotel.city_name)
+                worker = partial(self.generate_batch, service)
+                for group, results, error in run_concurrently(groups, worker, concurrency):
+                    for hotel in group:
+                        result = (results or {}).get(str(hotel.hotel_id))
+                        self.process_result(hotel, self.stage, result, error)
+            else:
+                worker = partial(self.generate, service)
+                for hotel, result, error in run_concurrently(batches, worker, concurrency):
+                    self.process_result(hotel, self.stage, result, error)
+        self.ledger.flush()
+
+        self.report(gemini_service)
+        gemini_service.close()
@@ -0,0 +1,204 @@
+# llmApp/management/commands/benchmark_llm.py
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from io import StringIO
+
+from django.core.management import call_command, load_command_class
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from llmApp.management.base import HotelGenerationCommand
+from llmApp.management.commands.fake_gemini import add_server_arguments, build_server
+from llmApp.models import GenerationJob, Hotel
+from llmApp.services.benchmark import SYNTHETIC_PREFIX, summarize_run, synthetic_hotels
+from llmApp.services.metrics import MetricsRegistry, reset_registry
+
+COMMANDS = ['rewrite_titles', 'generate_descriptions', 'generate_summaries', 'generate_reviews', 'enrich_hotels']
+# Commands whose hotels must already have a description
+NEEDS_DESCRIPTION = {'generate_summaries'}
+
+
+@contextmanager
+def environment(values):
+    previous = {key: os.environ.get(key) for key in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for key, value in previous.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the generation commands against a fake Gemini server and synthetic hotels'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hotels',
+            type=int,
+            default=200,
+            help='Number of synthetic hotels each command processes'
+        )
+        parser.add_argument(
+            '--commands',
+            default=','.join(COMMANDS),
+            help='Comma separated commands to benchmark'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help='Number of hotels each command claims per batch'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=8,
+            help='Number of Gemini requests to keep in flight at once'
+        )
+        parser.add_argument(
+            '--prompt-batch',
+            type=int,
+            default=1,
+            help='Number of hotels to pack into each prompt (single stage commands)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of worker processes per command (queries are only counted with 1)'
+        )
+        parser.add_argument(
+            '--rpm',
+            type=float,
+            default=0,
+            help='Requests per minute allowed by the rate limiter (0 for no limit)'
+        )
+        parser.add_argument(
+            '--tpm',
+            type=float,
+            default=0,
+            help='Tokens per minute allowed by the rate limiter (0 for no limit)'
+        )
+        parser.add_argument(
+            '--backend',
+            choices=['gemini', 'ollama', 'ollama-chat'],
+            default='gemini',
+            help='Backend protocol the commands use to talk to the fake server'
+        )
+        parser.add_argument(
+            '--output',
+            metavar='PATH',
+            help='Also write the results as JSON to PATH'
+        )
+        add_server_arguments(parser)
+
+    def handle(self, *args, **options):
+        names = [name.strip() for name in options['commands'].split(',') if name.strip()]
+        unknown = [name for name in names if name not in COMMANDS]
+        if unknown:
+            raise CommandError(f"Cannot benchmark {', '.join(unknown)}; choose from {', '.join(COMMANDS)}")
+        # The commands process every pending hotel, so real ones would be
+        # overwritten with canned content
+        if Hotel.objects.exclude(hotel_id__startswith=SYNTHETIC_PREFIX).exists():
+            raise CommandError(
+                'The hotels table holds real hotels; run the benchmark against a scratch database'
+            )
+
+        results = []
+        with build_server(options) as server, tempfile.TemporaryDirectory() as workdir:
+            self.stdout.write(
+                f"Fake {options['backend']} server at {server.root_url}, {options['hotels']} hotels per command"
+            )
+            for name in names:
+                result = self.run_one(name, options, server, workdir)
+                results.append(result)
+                self.stdout.write(self.format_result(result))
+            self.stdout.write(
+                f"Fake server requests: {server.stats['requests']}, 429s: {server.stats['throttled']}, "
+                f"500s: {server.stats['errors']}, malformed: {server.stats['malformed']}"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(results, handle, indent=2)
+                handle.write('\n')
+
+    def seed(self, name, count, seed):
+        self.clear()
+        hotels = synthetic_hotels(count, seed=seed, with_descriptions=name in NEEDS_DESCRIPTION)
+        Hotel.objects.bulk_create(hotels, batch_size=1000)
+
+    def clear(self):
+        # Generated summaries and reviews go with their hotels
+        Hotel.objects.filter(hotel_id__startswith=SYNTHETIC_PREFIX).delete()
+
+    def run_one(self, name, options, server, workdir) -> dict:
+        self.seed(name, options['hotels'], options['seed'])
+        last_job = GenerationJob.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        metrics_path = os.path.join(workdir, f'{name}.metrics.json')
+        settings = {
+            'GEMINI_BASE_URL': server.base_url,
+            'OLLAMA_HOST': server.root_url,
+            'GEMINI_API_KEY': 'benchmark',
+            'GEMINI_RPM': str(options['rpm']),
+            'GEMINI_TPM': str(options['tpm']),
+            'GEMINI_RATE_LIMIT_FILE': os.path.join(workdir, f'{name}.rate_limit.json'),
+            'GEMINI_METRICS_FILE': metrics_path,
+        }
+        command_options = {
+            'batch_size': options['batch_size'],
+            'concurrency': options['concurrency'],
+            'workers': options['workers'],
+            'no_cache': True,
+            'backend': options['backend'],
+            'stage_backends': None,
+        }
+        if isinstance(load_command_class('llmApp', name), HotelGenerationCommand):
+            command_options['prompt_batch'] = options['prompt_batch']
+
+        queries = 0
+
+        def count_queries(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        output = self.stdout if options['verbosity'] > 1 else StringIO()
+        try:
+            with environment(settings):
+                # Metrics go to this run's own file
+                reset_registry()
+                started = time.monotonic()
+                with connection.execute_wrapper(count_queries):
+                    call_command(name, stdout=output, **command_options)
+                seconds = time.monotonic() - started
+        finally:
+            reset_registry()
+            self.clear()
+            GenerationJob.objects.filter(pk__gt=last_job).delete()
+
+        result = summarize_run(MetricsRegistry(metrics_path), options['hotels'], seconds)
+        result['command'] = name
+        result['db_queries'] = queries if options['workers'] <= 1 else None
+        return result
+
+    def format_result(self, result) -> str:
+        def seconds(value):
+            return f"{value * 1000:.0f}ms" if value is not None else '-'
+
+        queries = result['db_queries'] if result['db_queries'] is not None else '-'
+        waste = f"{result['waste_rate']:.1%}" if result['waste_rate'] is not None else '-'
+        return (
+            f"{result['command']}: {result['hotels_per_second']} hotels/sec "
+            f"({result['hotels']} hotels in {result['seconds']:.2f}s), "
+            f"latency p50 {seconds(result['latency_p50'])} p99 {seconds(result['latency_p99'])}, "
+            f"requests {result['gemini_requests']:.0f}, retries {result['retries']:.0f}, "
+            f"repairs {result['repairs']:.0f}, waste {waste}, "
+            f"tasks failed {result['tasks_failed']:.0f}, DB queries {queries}"
+        )
@@ -0,0 +1,63 @@
+# llmApp/management/commands/dedup_hotels.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from llmApp.services.dedup import (
+    DEFAULT_MAX_DISTANCE, DEFAULT_SIMILARITY, assign_duplicates, find_clusters, iter_city_listings,
+)
+from llmApp.services.stages import STAGES
+
+class Command(BaseCommand):
+    help = 'Find near-duplicate hotels so their descriptions and summaries are generated once per cluster'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-distance',
+            type=float,
+            default=DEFAULT_MAX_DISTANCE,
+            help='Meters within which two listings may be the same property'
+        )
+        parser.add_argument(
+            '--similarity',
+            type=float,
+            default=DEFAULT_SIMILARITY,
+            help='Minimum estimated similarity (0-1) of the titles of two duplicates'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report the clusters without saving them'
+        )
+
+    def handle(self, *args, **options):
+        if not 0 < options['similarity'] <= 1:
+            raise CommandError('--similarity must be between 0 and 1')
+        if options['max_distance'] <= 0:
+            raise CommandError('--max-distance must be positive')
+
+        started = time.monotonic()
+        totals = {'hotels': 0, 'clusters': 0, 'duplicates': 0, 'changed': 0}
+        for city, listings in iter_city_listings():
+            clusters = find_clusters(listings, options['max_distance'], options['similarity'])
+            with transaction.atomic():
+                changed = assign_duplicates(city, listings, clusters, dry_run=options['dry_run'])
+            duplicates = sum(len(cluster) - 1 for cluster in clusters)
+            totals['hotels'] += len(listings)
+            totals['clusters'] += len(clusters)
+            totals['duplicates'] += duplicates
+            totals['changed'] += changed
+            if clusters and options['verbosity'] > 1:
+                self.stdout.write(f"{city}: {len(clusters)} clusters, {duplicates} duplicates")
+
+        shared = [name for name, stage in STAGES.items() if stage.shared]
+        action = 'would change' if options['dry_run'] else 'changed'
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked {totals['hotels']} hotels in {time.monotonic() - started:.1f}s: "
+            f"{totals['clusters']} clusters with {totals['duplicates']} near-duplicates, "
+            f"{action} {totals['changed']} hotels"
+        ))
+        self.stdout.write(
+            f"The {' and '.join(shared)} of duplicates are copied from their cluster, "
+            f"saving up to {totals['duplicates'] * len(shared)} requests"
+        )
@@ -0,0 +1,140 @@
+# llmApp/management/commands/enrich_hotels.py
+from django.core.management.base import CommandError
+from llmApp.management.base import GeminiCommand
+from llmApp.models import GenerationTask, Hotel
+from llmApp.services.gemini_service import AsyncGeminiService
+from llmApp.services.pipeline import EnrichmentPipeline
+from llmApp.services.stages import ReviewStage, annotate_progress, get_stages, pending_any, stage_fields, upstream
+
+class Command(GeminiCommand):
+    help = 'Run title, description, summary and review generation as one streaming pipeline'
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--stages',
+            default='title,description,summary,review',
+            help='Comma separated stages to run'
+        )
+        parser.add_argument(
+            '--queue-size',
+            type=int,
+            default=None,
+            help='Maximum hotels waiting in front of each stage (defaults to twice the concurrency)'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Regenerate every selected stage, even for hotels whose content is up to date'
+        )
+        parser.add_argument(
+            '--reviews-per-hotel',
+            type=int,
+            help='Number of reviews by different traveller personas to generate per hotel in one request '
+                 '(default: as many as the hotel has, or 1)'
+        )
+
+    def get_stages(self, names):
+        stages = get_stages(names)
+        if self.options['reviews_per_hotel']:
+            stages = [
+                ReviewStage(per_hotel=self.options['reviews_per_hotel']) if stage.name == 'review' else stage
+                for stage in stages
+            ]
+        return stages
+
+    def get_hotels(self, stages, force):
+        # Only scan hotels that need at least one of the selected stages
+        return pending_any(stages, force)
+
+    def should_run(self, hotel, stage):
+        """
+        Run the stages the job still has open for this hotel. Stages that
+        turn out not to be needed are skipped, unless that is only because
+        an earlier stage failed, so a retry can pick them up.
+        """
+        if self.ledger.get_task(hotel, stage.name) is None:
+            return False
+        if stage.needs(hotel, force=self.options['force']) and not stage.copies_duplicate(hotel):
+            return True
+        if not self.ledger.has_failures(hotel):
+            self.ledger.mark(hotel, stage.name, GenerationTask.STATUS_SKIPPED)
+        return False
+
+    def skip_dependent(self, hotel, stage):
+        """
+        Close the task of a stage built on one that failed for this hotel;
+        the hotel still needs it, so a later job picks it up again
+        """
+        self.ledger.mark(hotel, stage.name, GenerationTask.STATUS_SKIPPED, 'An earlier stage failed')
+
+    def iter_pages(self, hotels, batch_size, fields):
+        for page_number, page in enumerate(self.ledger.iter_pages(hotels, batch_size, fields), start=1):
+            self.stdout.write(f"Processing batch {page_number}")
+            yield page
+
+    def handle(self, *args, **options):
+        self.restore_job_options(options)
+        self.options = options
+        self.backends = self.get_backends(options)
+        self.token_limits = self.get_token_limits(options)
+        try:
+            stages = self.get_stages([name.strip() for name in options['stages'].split(',') if name.strip()])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if options['plan']:
+            # A hotel needs a stage again once a stage it is built from reruns
+            # Nothing is written, so legacy content is counted as adopt() will leave it
+            self.plan(options, [
+                (stage, pending_any(upstream(stage, stages), options['force'], assume_adopted=True))
+                for stage in stages
+            ])
+            return
+        stage_names = [stage.name for stage in stages]
+        for stage in stages:
+            stage.adopt()
+        self.share_duplicates(stages, options['force'])
+        self.ledger = self.get_ledger(options, stage_names, self.get_hotels(stages, options['force']))
+        if self.ledger is None:
+            return
+        if options['resume']:
+            # Carry on with the stages the job was started with
+            stages = self.get_stages(self.ledger.stage_names)
+            stage_names = [stage.name for stage in stages]
+
+        self.stages = stages
+        hotels = annotate_progress(Hotel.objects.all(), stages)
+        total_hotels = self.ledger.hotels(hotels).count()
+        self.stdout.write(f"Found {total_hotels} hotels to enrich ({', '.join(stage_names)})")
+
+        interrupted = True
+        try:
+            self.run_workers(options)
+            self.share_duplicates(stages, options['force'])
+            interrupted = False
+        finally:
+            self.finish_job(interrupted)
+
+    def work(self, options):
+        concurrency = max(1, options['concurrency'])
+        gemini_service = self.get_service(options)
+        service = AsyncGeminiService(gemini_service, concurrency=concurrency)
+        pipeline = EnrichmentPipeline(
+            service,
+            stages=self.stages,
+            queue_size=options['queue_size'] or 2 * concurrency,
+            force=options['force'],
+            should_run=self.should_run,
+            on_skip=self.skip_dependent,
+        )
+        self.write_buffer = self.get_write_buffer(options)
+
+        hotels = annotate_progress(Hotel.objects.all(), self.stages)
+        pages = self.iter_pages(hotels, max(1, options['batch_size']), stage_fields(self.stages))
+        with self.write_buffer:
+            for hotel, stage, result, error in pipeline.run(pages):
+                self.process_result(hotel, stage, result, error)
+        self.ledger.flush()
+
+        self.report(gemini_service)
+        gemini_service.close()
@@ -0,0 +1,88 @@
+# llmApp/management/commands/export_llm_jobs.py
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from llmApp.services.batch_jobs import build_job, fake_results, read_jsonl, write_jsonl
+from llmApp.services.gemini_service import GeminiService
+from llmApp.services.iteration import iter_keyset
+from llmApp.services.stages import get_stages, pending_any, upstream
+
+class Command(BaseCommand):
+    help = 'Export pending generation work as Gemini batch prediction JSONL (export again after each import)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            default='-',
+            help='File to write request lines to ("-" for stdout)'
+        )
+        parser.add_argument(
+            '--stages',
+            default='title,description,summary,review',
+            help='Comma separated stages to export'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Export every selected stage, even for hotels whose content is up to date (use with one stage at a time)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Number of hotels fetched per database round trip'
+        )
+        parser.add_argument(
+            '--fake-results',
+            help='Also write fake results for the exported jobs to this file, for offline testing'
+        )
+
+    def iter_jobs(self, stages, service, force, chunk_size):
+        """
+        Yield a job per hotel and stage. A hotel is only exported for a stage
+        once the exported stages it is built from are up to date, so
+        importing the results and exporting again works through the stages
+        one round at a time.
+        """
+        for stage in stages:
+            stage.adopt()
+        for stage in stages:
+            hotels = stage.pending(force=force)
+            feeding = upstream(stage, stages)[:-1]
+            if feeding:
+                # Built from content still waiting on this round's results
+                hotels = hotels.exclude(pk__in=pending_any(feeding).values('pk'))
+            count = 0
+            for hotel in iter_keyset(hotels, chunk_size, stage.fields):
+                yield build_job(
+                    stage.name, hotel.hotel_id, stage.fingerprint(hotel), stage.build_prompt(service, hotel),
+                    service.generation_config(stage.name), stage.system_instruction(service, hotel), force,
+                )
+                count += 1
+                if count % chunk_size == 0:
+                    self.stderr.write(f"Exported {count} {stage.name} jobs")
+            self.stderr.write(self.style.SUCCESS(f"Exported {count} {stage.name} jobs"))
+
+    def handle(self, *args, **options):
+        if options['fake_results'] and options['output'] == '-':
+            raise CommandError('--fake-results needs --output to be a file')
+        try:
+            stages = get_stages([name.strip() for name in options['stages'].split(',') if name.strip()])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        service = GeminiService(use_cache=False)
+        jobs = self.iter_jobs(stages, service, options['force'], options['chunk_size'])
+
+        if options['output'] == '-':
+            total = write_jsonl(sys.stdout, jobs)
+        else:
+            with open(options['output'], 'w', encoding='utf-8') as handle:
+                total = write_jsonl(handle, jobs)
+        self.stderr.write(f"Wrote {total} request lines")
+
+        if options['fake_results']:
+            with open(options['output'], encoding='utf-8') as jobs_file, \
+                    open(options['fake_results'], 'w', encoding='utf-8') as results_file:
+                write_jsonl(results_file, fake_results(read_jsonl(jobs_file)))
+            self.stderr.write(f"Wrote fake results to {options['fake_results']}")
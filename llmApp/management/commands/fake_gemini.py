@@ -0,0 +1,114 @@
+# llmApp/management/commands/fake_gemini.py
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from llmApp.services.fake_gemini import FakeGeminiServer, LatencyModel
+
+
+def add_server_arguments(parser):
+    """
+    Options describing the fake server, shared with benchmark_llm
+    """
+    parser.add_argument(
+        '--latency',
+        choices=LatencyModel.DISTRIBUTIONS,
+        default='lognormal',
+        help='Distribution of simulated response times'
+    )
+    parser.add_argument(
+        '--latency-median',
+        type=float,
+        default=0.2,
+        help='Median response time in seconds'
+    )
+    parser.add_argument(
+        '--latency-sigma',
+        type=float,
+        default=0.5,
+        help='Spread of lognormal response times'
+    )
+    parser.add_argument(
+        '--rate-429',
+        type=float,
+        default=0.0,
+        help='Fraction of requests answered with 429 Too Many Requests'
+    )
+    parser.add_argument(
+        '--rate-500',
+        type=float,
+        default=0.0,
+        help='Fraction of requests answered with 500 Internal Server Error'
+    )
+    parser.add_argument(
+        '--rate-malformed',
+        type=float,
+        default=0.0,
+        help='Fraction of answers with a field left empty'
+    )
+    parser.add_argument(
+        '--retry-after',
+        type=float,
+        default=None,
+        help='Retry-After seconds sent with 429 responses'
+    )
+    parser.add_argument(
+        '--responses',
+        metavar='PATH',
+        help='JSON file mapping prompt substrings to the response text for them'
+    )
+    parser.add_argument(
+        '--seed',
+        type=int,
+        default=None,
+        help='Random seed for reproducible latencies and errors'
+    )
+
+
+def build_server(options, port=0) -> FakeGeminiServer:
+    responses = None
+    if options['responses']:
+        try:
+            with open(options['responses']) as handle:
+                responses = json.load(handle)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Cannot read responses from {options['responses']}: {e}")
+    return FakeGeminiServer(
+        port=port,
+        latency=LatencyModel(options['latency'], options['latency_median'], options['latency_sigma']),
+        rate_429=options['rate_429'],
+        rate_500=options['rate_500'],
+        rate_malformed=options['rate_malformed'],
+        retry_after=options['retry_after'],
+        responses=responses,
+        seed=options['seed'],
+    )
+
+
+class Command(BaseCommand):
+    help = 'Serve a fake Gemini generateContent endpoint for offline runs and benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--port',
+            type=int,
+            default=8765,
+            help='Port to listen on'
+        )
+        add_server_arguments(parser)
+
+    def handle(self, *args, **options):
+        server = build_server(options, options['port'])
+        self.stdout.write("Fake Gemini listening, point the commands at it with:")
+        self.stdout.write(f"export GEMINI_BASE_URL={server.base_url}")
+        self.stdout.write(f"export OLLAMA_HOST={server.root_url}  # for --backend ollama")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.httpd.server_close()
+            stats = server.stats
+            self.stdout.write(
+                f"Requests: {stats['requests']}, responses: {stats['responses']}, "
+                f"429s: {stats['throttled']}, 500s: {stats['errors']}, malformed: {stats['malformed']}"
+            )
@@ -0,0 +1,112 @@
+# llmApp/management/commands/fetch_data.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+from llmApp.services.concurrency import chunked
+from llmApp.services.ingest import (
+    FORMATS, HotelLoader, InvalidRecord, clean_record, detect_format, iter_postgres_records, iter_records,
+    max_lengths, open_source,
+)
+
+class Command(BaseCommand):
+    help = 'Load scraped hotels from JSONL or CSV files, or another PostgreSQL database, into the hotels table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'sources',
+            nargs='*',
+            metavar='FILE',
+            help="JSONL or CSV files to load, optionally gzipped ('-' for stdin)"
+        )
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            help='Input format (default: from the file extension, JSONL otherwise)'
+        )
+        parser.add_argument(
+            '--from-postgres',
+            metavar='DSN',
+            help="Read hotels from this PostgreSQL database instead of files, e.g. 'dbname=scraper host=db'"
+        )
+        parser.add_argument(
+            '--source-table',
+            default='hotels',
+            help='Table to read with --from-postgres'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=20000,
+            help='Number of hotels written per COPY and merge'
+        )
+        parser.add_argument(
+            '--max-errors',
+            type=int,
+            default=1000,
+            help='Stop after this many invalid records (0 for no limit)'
+        )
+
+    def iter_records(self, options):
+        if options['from_postgres']:
+            yield from (
+                (options['source_table'], number, record)
+                for number, record in iter_postgres_records(
+                    options['from_postgres'], options['source_table'], options['chunk_size']
+                )
+            )
+            return
+        for path in options['sources']:
+            try:
+                handle = open_source(path)
+            except OSError as e:
+                raise CommandError(f"Cannot open {path}: {e}")
+            with handle:
+                for line_number, record in iter_records(handle, options['format'] or detect_format(path)):
+                    yield path, line_number, record
+
+    def iter_rows(self, options):
+        """
+        Clean records, reporting and counting the invalid ones
+        """
+        lengths = max_lengths()
+        for source, line_number, record in self.iter_records(options):
+            try:
+                if isinstance(record, InvalidRecord):
+                    raise record
+                yield clean_record(record, lengths)
+            except InvalidRecord as e:
+                self.counts['invalid'] += 1
+                self.stderr.write(f"Skipping {source}:{line_number}: {e}")
+                if options['max_errors'] and self.counts['invalid'] >= options['max_errors']:
+                    raise CommandError(f"Stopped after {self.counts['invalid']} invalid records")
+
+    def handle(self, *args, **options):
+        if not options['sources'] and not options['from_postgres']:
+            raise CommandError('Give files to load or --from-postgres')
+        if options['sources'] and options['from_postgres']:
+            raise CommandError('Load either files or --from-postgres, not both')
+
+        loader = HotelLoader()
+        self.counts = {'rows': 0, 'inserted': 0, 'updated': 0, 'unchanged': 0, 'invalid': 0}
+        started = time.monotonic()
+        try:
+            for rows in chunked(self.iter_rows(options), max(1, options['chunk_size'])):
+                result = loader.load(rows)
+                self.counts['rows'] += len(rows)
+                for key, value in result.items():
+                    self.counts[key] += value
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f"Loaded {self.counts['rows']} hotels in {elapsed:.1f}s "
+                    f"({self.counts['rows'] / elapsed if elapsed else 0:.0f}/s)"
+                )
+        except DatabaseError as e:
+            raise CommandError(f"Loading failed after {self.counts['rows']} hotels: {e}")
+
+        method = 'COPY and merge' if loader.uses_copy else 'bulk upsert'
+        self.stdout.write(self.style.SUCCESS(
+            f"Loaded {self.counts['rows']} hotels with {method} in {time.monotonic() - started:.1f}s: "
+            f"{self.counts['inserted']} new, {self.counts['updated']} updated, "
+            f"{self.counts['unchanged']} unchanged, {self.counts['invalid']} invalid"
+        ))
@@ -0,0 +1,82 @@
+# llmApp/management/commands/import_llm_results.py
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from llmApp.services.batch_jobs import read_jsonl, response_text, split_key
+from llmApp.services.concurrency import chunked
+from llmApp.services.gemini_service import GeminiService
+from llmApp.services.hotel_api import invalidate_hotels
+from llmApp.services.stages import STAGES
+
+class Command(BaseCommand):
+    help = 'Apply a Gemini batch prediction results file to hotels, summaries and reviews'
+
+    def add_arguments(self, parser):
+        parser.add_argument('results', help='JSONL file with batch prediction results')
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='Number of result lines applied per transaction'
+        )
+
+    def apply_chunk(self, lines, service, counts):
+        by_stage = defaultdict(dict)
+        for line in lines:
+            try:
+                stage_name, hotel_id, fingerprint, force = split_key(line.get('key', ''))
+            except ValueError as e:
+                counts['invalid'] += 1
+                self.stdout.write(self.style.ERROR(str(e)))
+                continue
+            if stage_name not in STAGES:
+                counts['invalid'] += 1
+                self.stdout.write(self.style.ERROR(f"Unknown stage in key {line['key']!r}"))
+                continue
+            if line.get('error'):
+                counts['errors'] += 1
+                continue
+            by_stage[stage_name, force][hotel_id] = (fingerprint, response_text(line))
+
+        with transaction.atomic():
+            for (stage_name, force), texts in by_stage.items():
+                stage = STAGES[stage_name]
+                # Only hotels still pending (or, for jobs exported with
+                # --force, every hotel) are updated; results replace the old
+                # content, so re-importing a file does not duplicate summaries
+                # or reviews
+                hotels = stage.pending(force=force).filter(hotel_id__in=list(texts))
+                results = []
+                for hotel in hotels:
+                    fingerprint, text = texts.pop(hotel.hotel_id)
+                    # The hotel changed after the prompt was exported, so the
+                    # result would be stamped with inputs it was not built from
+                    if fingerprint != stage.fingerprint(hotel):
+                        counts['outdated'] += 1
+                        continue
+                    result = stage.parse(service, text)
+                    if stage.is_valid(result):
+                        results.append((hotel, result))
+                    else:
+                        counts['unparsable'] += 1
+                counts['applied'] += stage.apply_many(results, force=force)
+                counts['skipped'] += len(texts)
+                hotel_ids = [hotel.hotel_id for hotel, _ in results]
+                transaction.on_commit(lambda hotel_ids=hotel_ids: invalidate_hotels(hotel_ids))
+
+    def handle(self, *args, **options):
+        service = GeminiService(use_cache=False)
+        counts = defaultdict(int)
+        try:
+            with open(options['results'], encoding='utf-8') as handle:
+                for lines in chunked(read_jsonl(handle), options['chunk_size']):
+                    self.apply_chunk(lines, service, counts)
+                    self.stdout.write(f"Applied {counts['applied']} results so far")
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Applied: {counts['applied']}, not pending: {counts['skipped']}, "
+            f"outdated: {counts['outdated']}, unparsable: {counts['unparsable']}, errors: {counts['errors']}, invalid: {counts['invalid']}"
+        ))
@@ -0,0 +1,10 @@
+# llmApp/management/commands/llm_plan.py
+from llmApp.management.commands.enrich_hotels import Command as EnrichCommand
+
+
+class Command(EnrichCommand):
+    help = 'Estimate the requests, tokens, cost and duration of enriching the pending hotels, without calling the API'
+
+    def handle(self, *args, **options):
+        options['plan'] = True
+        super().handle(*args, **options)
@@ -0,0 +1,49 @@
+# llmApp/migrations/0003_generation_ledger.py
+from django.db import migrations, models
+import django.db.models.deletion
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('llmApp', '0002_update_property_references'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GenerationJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('command', models.CharField(max_length=50)),
+                ('stages', models.CharField(max_length=100)),
+                ('status', models.CharField(choices=[('running', 'Running'), ('completed', 'Completed'), ('incomplete', 'Completed with failed or pending tasks'), ('interrupted', 'Interrupted')], default='running', max_length=20)),
+                ('options', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'generation_jobs',
+            },
+        ),
+        migrations.CreateModel(
+            name='GenerationTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hotel_id', models.CharField(max_length=50)),
+                ('stage', models.CharField(max_length=20)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed'), ('skipped', 'Skipped')], default='pending', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tasks', to='llmApp.generationjob')),
+            ],
+            options={
+                'db_table': 'generation_tasks',
+                'constraints': [models.UniqueConstraint(fields=('job', 'hotel_id', 'stage'), name='generation_tasks_unique_stage')],
+                'indexes': [
+                    models.Index(fields=['job', 'status', 'hotel_id'], name='generation_tasks_runnable'),
+                    models.Index(fields=['hotel_id', 'stage', 'status'], name='generation_tasks_hotel_stage'),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# llmApp/migrations/0004_generation_task_leases.py
+from django.db import migrations, models
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('llmApp', '0003_generation_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generationtask',
+            name='lease_owner',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='generationtask',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# llmApp/migrations/0005_source_fingerprints.py
+from django.db import migrations, models
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('llmApp', '0004_generation_task_leases'),
+    ]
+
+    operations = [
+        # The scraped title is kept so titles are always rewritten from it
+        migrations.RunSQL(
+            sql='''
+            ALTER TABLE hotels ADD COLUMN IF NOT EXISTS original_title VARCHAR(255);
+            ALTER TABLE hotels ADD COLUMN IF NOT EXISTS title_fingerprint VARCHAR(32);
+            ALTER TABLE hotels ADD COLUMN IF NOT EXISTS description_fingerprint VARCHAR(32);
+            ''',
+            reverse_sql='''
+            ALTER TABLE hotels DROP COLUMN IF EXISTS original_title;
+            ALTER TABLE hotels DROP COLUMN IF EXISTS title_fingerprint;
+            ALTER TABLE hotels DROP COLUMN IF EXISTS description_fingerprint;
+            '''
+        ),
+        migrations.AddField(
+            model_name='propertysummary',
+            name='source_fingerprint',
+            field=models.CharField(blank=True, max_length=32, null=True),
+        ),
+        migrations.AddField(
+            model_name='propertyreview',
+            name='source_fingerprint',
+            field=models.CharField(blank=True, max_length=32, null=True),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# llmApp/migrations/0006_admin_search_indexes.py
+from django.db import migrations
+
+# (index, table, indexed expression). Admin search runs
+# UPPER(column::text) LIKE UPPER('%term%'), so the trigram indexes are on
+# that expression rather than the bare column.
+TRIGRAM_INDEXES = [
+    ('hotels_property_title_trgm', 'hotels', 'UPPER(property_title::text)'),
+    ('hotels_city_name_trgm', 'hotels', 'UPPER(city_name::text)'),
+    ('hotels_address_trgm', 'hotels', 'UPPER(address::text)'),
+    ('property_summaries_summary_trgm', 'property_summaries', 'UPPER(summary::text)'),
+    ('property_reviews_review_trgm', 'property_reviews', 'UPPER(review::text)'),
+]
+
+def create_index(name, table, expression, method='gin', opclass='gin_trgm_ops'):
+    # Built concurrently so the tables stay writable; each statement must
+    # run on its own, outside a transaction
+    return migrations.RunSQL(
+        sql=f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} USING {method} (({expression}) {opclass});',
+        reverse_sql=f'DROP INDEX CONCURRENTLY IF EXISTS {name};',
+    )
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('llmApp', '0005_source_fingerprints'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql='CREATE EXTENSION IF NOT EXISTS pg_trgm;',
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        *[create_index(name, table, expression) for name, table, expression in TRIGRAM_INDEXES],
+        # The city filter lists distinct city names, read from this index
+        create_index('hotels_city_name', 'hotels', 'city_name', method='btree', opclass=''),
+    ]
@@ -0,0 +1,35 @@
+# llmApp/migrations/0007_work_discovery_indexes.py
+from django.db import migrations
+
+# (index, table, columns, partial index predicate)
+INDEXES = [
+    # The property_id foreign keys added in 0002 had no index: every
+    # pending-work anti-join, summary/review lookup and ON DELETE CASCADE
+    # from hotels scanned these tables. The fingerprint is included so the
+    # anti-join is answered from the index alone.
+    ('property_summaries_property', 'property_summaries', 'property_id, source_fingerprint', None),
+    ('property_reviews_property', 'property_reviews', 'property_id, source_fingerprint', None),
+    # Content not stamped with a fingerprint yet, looked up by adopt() at
+    # the start of every command; small once the backlog is generated
+    ('hotels_description_unstamped', 'hotels', 'id', 'description_fingerprint IS NULL'),
+    ('property_summaries_unstamped', 'property_summaries', 'id', 'source_fingerprint IS NULL'),
+    ('property_reviews_unstamped', 'property_reviews', 'id', 'source_fingerprint IS NULL'),
+]
+
+def create_index(name, table, columns, where):
+    # Built concurrently so the tables stay writable; each statement must
+    # run on its own, outside a transaction
+    predicate = f' WHERE {where}' if where else ''
+    return migrations.RunSQL(
+        sql=f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({columns}){predicate};',
+        reverse_sql=f'DROP INDEX CONCURRENTLY IF EXISTS {name};',
+    )
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('llmApp', '0006_admin_search_indexes'),
+    ]
+
+    operations = [create_index(*index) for index in INDEXES]
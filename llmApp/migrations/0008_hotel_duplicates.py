@@ -0,0 +1,22 @@
+# llmApp/migrations/0008_hotel_duplicates.py
+from django.db import migrations
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('llmApp', '0007_work_discovery_indexes'),
+    ]
+
+    operations = [
+        # Set by dedup_hotels on near-duplicate listings; the index only
+        # holds those, which are the hotels content is copied to
+        migrations.RunSQL(
+            sql='''
+            ALTER TABLE hotels ADD COLUMN IF NOT EXISTS duplicate_of VARCHAR(50);
+            CREATE INDEX IF NOT EXISTS hotels_duplicate_of ON hotels (duplicate_of) WHERE duplicate_of IS NOT NULL;
+            ''',
+            reverse_sql='''
+            DROP INDEX IF EXISTS hotels_duplicate_of;
+            ALTER TABLE hotels DROP COLUMN IF EXISTS duplicate_of;
+            '''
+        ),
+    ]
@@ -0,0 +1,15 @@
+# llmApp/migrations/0009_generation_job_left_out.py
+from django.db import migrations, models
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('llmApp', '0008_hotel_duplicates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generationjob',
+            name='left_out',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
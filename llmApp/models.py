@@ -14,6 +14,12 @@ class Hotel(models.Model):
     image = models.URLField()
     local_image_path = models.CharField(max_length=255)
     description = models.TextField(null=True, blank=True)
+    # Generation bookkeeping, see llmApp.services.fingerprints
+    original_title = models.CharField(max_length=255, null=True, blank=True)  # Scraped title before any rewrite
+    title_fingerprint = models.CharField(max_length=32, null=True, blank=True)
+    description_fingerprint = models.CharField(max_length=32, null=True, blank=True)
+    # hotel_id of the listing whose content this near-duplicate shares, see llmApp.services.dedup
+    duplicate_of = models.CharField(max_length=50, null=True, blank=True)
 
     class Meta:
         db_table = 'hotels'
@@ -28,6 +34,7 @@ class PropertySummary(models.Model):
         related_name='summaries'
     )
     summary = models.TextField()
+    source_fingerprint = models.CharField(max_length=32, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -44,8 +51,72 @@ class PropertyReview(models.Model):
     )
     rating = models.FloatField()
     review = models.TextField()
+    source_fingerprint = models.CharField(max_length=32, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
-        db_table = 'property_reviews'
\ No newline at end of file
+        db_table = 'property_reviews'
+
+class GenerationJob(models.Model):
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_INCOMPLETE = 'incomplete'
+    STATUS_INTERRUPTED = 'interrupted'
+    STATUS_CHOICES = [
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_COMPLETED, 'Completed'),
+        (STATUS_INCOMPLETE, 'Completed with failed or pending tasks'),
+        (STATUS_INTERRUPTED, 'Interrupted'),
+    ]
+
+    command = models.CharField(max_length=50)
+    stages = models.CharField(max_length=100)  # Comma separated stage names
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_RUNNING)
+    options = models.JSONField(default=dict, blank=True)
+    # Tasks not seeded because the hotel had used up its attempts at the stage
+    left_out = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'generation_jobs'
+
+    def __str__(self):
+        return f"Job {self.pk} ({self.command}, {self.status})"
+
+class GenerationTask(models.Model):
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_SKIPPED = 'skipped'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCEEDED, 'Succeeded'),
+        (STATUS_FAILED, 'Failed'),
+        (STATUS_SKIPPED, 'Skipped'),
+    ]
+
+    job = models.ForeignKey(GenerationJob, on_delete=models.CASCADE, related_name='tasks')
+    hotel_id = models.CharField(max_length=50)  # Matches Hotel.hotel_id
+    stage = models.CharField(max_length=20)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+    lease_owner = models.CharField(max_length=100, blank=True, default='')  # Worker holding the task
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'generation_tasks'
+        constraints = [
+            models.UniqueConstraint(fields=['job', 'hotel_id', 'stage'], name='generation_tasks_unique_stage'),
+        ]
+        indexes = [
+            models.Index(fields=['job', 'status', 'hotel_id'], name='generation_tasks_runnable'),
+            models.Index(fields=['hotel_id', 'stage', 'status'], name='generation_tasks_hotel_stage'),
+        ]
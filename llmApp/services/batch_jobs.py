@@ -0,0 +1,117 @@
+# llmApp/services/batch_jobs.py
+"""
+Helpers for Gemini batch prediction files.
+
+Each request line carries a ``key`` of the form
+``<stage>:<fingerprint>:<hotel_id>`` and a GenerateContentRequest; result
+lines echo the key next to either a GenerateContentResponse or an error.
+The fingerprint is the stage's fingerprint of the hotel when the prompt was
+built, so a result whose inputs have changed since can be told apart. Jobs
+exported with ``--force`` mark their stage ``<stage>+force``, so the import
+replaces content that is not out of date too.
+"""
+import json
+from typing import IO, Iterable, Iterator, NamedTuple, Optional
+
+FORCE_SUFFIX = '+force'
+
+
+class JobKey(NamedTuple):
+    stage: str
+    hotel_id: str
+    fingerprint: str
+    force: bool = False
+
+
+def job_key(stage: str, hotel_id, fingerprint: str, force: bool = False) -> str:
+    return f"{stage}{FORCE_SUFFIX if force else ''}:{fingerprint}:{hotel_id}"
+
+
+def split_key(key: str) -> JobKey:
+    stage, _, rest = key.partition(':')
+    fingerprint, _, hotel_id = rest.partition(':')
+    force = stage.endswith(FORCE_SUFFIX)
+    if force:
+        stage = stage[:-len(FORCE_SUFFIX)]
+    if not stage or not fingerprint or not hotel_id:
+        raise ValueError(f"Invalid job key: {key!r}")
+    return JobKey(stage, hotel_id, fingerprint, force)
+
+
+def build_job(
+    stage: str,
+    hotel_id,
+    fingerprint: str,
+    prompt: str,
+    generation_config: Optional[dict] = None,
+    system: Optional[str] = None,
+    force: bool = False,
+) -> dict:
+    request = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+    if system:
+        request["systemInstruction"] = {"parts": [{"text": system}]}
+    if generation_config:
+        request["generationConfig"] = generation_config
+    return {"key": job_key(stage, hotel_id, fingerprint, force), "request": request}
+
+
+def response_text(result: dict) -> Optional[str]:
+    """
+    Extract the generated text from a batch result line, if any
+    """
+    response = result.get('response') or {}
+    try:
+        return response['candidates'][0]['content']['parts'][0]['text']
+    except (KeyError, IndexError, TypeError):
+        return None
+
+
+def read_jsonl(handle: IO) -> Iterator[dict]:
+    for line_number, line in enumerate(handle, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"Invalid JSON on line {line_number}: {str(e)}")
+
+
+def write_jsonl(handle: IO, lines: Iterable[dict]) -> int:
+    count = 0
+    for line in lines:
+        handle.write(json.dumps(line, ensure_ascii=False) + '\n')
+        count += 1
+    return count
+
+
+def fake_response_text(stage: str, hotel_id: str) -> str:
+    """
+    Deterministic stand-in for a model response, used to test offline
+    """
+    if stage == 'review':
+        result = {'rating': 4, 'review': f"A pleasant stay at hotel {hotel_id}, with friendly staff and clean rooms."}
+    elif stage == 'title':
+        result = {'title': f"Charming Retreat {hotel_id}"}
+    elif stage == 'summary':
+        result = {'summary': f"Hotel {hotel_id} offers comfortable rooms in a convenient location."}
+    else:
+        result = {'description': f"Hotel {hotel_id} welcomes guests with comfortable rooms, helpful staff and an excellent location."}
+    return json.dumps(result)
+
+
+def fake_results(jobs: Iterable[dict]) -> Iterator[dict]:
+    """
+    Produce a result line for every job line, as the batch API would
+    """
+    for job in jobs:
+        stage, hotel_id = split_key(job['key'])[:2]
+        yield {
+            "key": job['key'],
+            "response": {
+                "candidates": [{
+                    "content": {"role": "model", "parts": [{"text": fake_response_text(stage, hotel_id)}]},
+                    "finishReason": "STOP",
+                }]
+            },
+        }
@@ -0,0 +1,75 @@
+# llmApp/services/benchmark.py
+import random
+from typing import Iterator, Optional
+
+from llmApp.models import Hotel
+from llmApp.services.metrics import MetricsRegistry, merge_histograms
+
+# hotel_id prefix that marks rows created by the benchmark
+SYNTHETIC_PREFIX = 'bench-'
+
+CITIES = [
+    ('Dhaka', 23.81, 90.41), ('Chittagong', 22.36, 91.78), ('Paris', 48.86, 2.35),
+    ('London', 51.51, -0.13), ('Tokyo', 35.68, 139.69), ('New York', 40.71, -74.01),
+    ('Bangkok', 13.76, 100.50), ('Dubai', 25.20, 55.27), ('Sydney', -33.87, 151.21),
+    ('Cox\'s Bazar', 21.43, 92.01),
+]
+ROOM_TYPES = ['Standard Room', 'Deluxe Room', 'Suite', 'Family Room', 'Studio Apartment']
+ADJECTIVES = ['Grand', 'Royal', 'Cozy', 'Seaside', 'Central', 'Garden', 'Skyline', 'Harbour']
+NOUNS = ['Hotel', 'Inn', 'Residency', 'Suites', 'Lodge', 'Resort']
+
+
+def synthetic_hotels(count: int, seed: Optional[int] = None, with_descriptions: bool = False) -> Iterator[Hotel]:
+    """
+    Unsaved hotels that look like scraped ones, reproducible for a given seed
+    """
+    rng = random.Random(seed)
+    for number in range(1, count + 1):
+        city, latitude, longitude = rng.choice(CITIES)
+        title = f"{rng.choice(ADJECTIVES)} {city} {rng.choice(NOUNS)} {number}"
+        hotel = Hotel(
+            hotel_id=f"{SYNTHETIC_PREFIX}{number:07d}",
+            city_name=city,
+            property_title=title,
+            price=round(rng.uniform(20, 400), 2),
+            rating=round(rng.uniform(2.5, 5), 1),
+            address=f"{number} Example Road, {city}",
+            latitude=latitude + rng.uniform(-0.1, 0.1),
+            longitude=longitude + rng.uniform(-0.1, 0.1),
+            room_type=rng.choice(ROOM_TYPES),
+            image='',
+            local_image_path='',
+        )
+        if with_descriptions:
+            hotel.description = f"{title} offers comfortable rooms in the heart of {city}."
+        yield hotel
+
+
+def summarize_run(registry: MetricsRegistry, hotels: int, seconds: float) -> dict:
+    """
+    Throughput and Gemini latency of one benchmark run, from the metrics its
+    command (and any workers) flushed to ``registry``'s file
+    """
+    state = registry.read()
+    counters = state['counters']
+    processed = counters.get('hotels_processed_total', {})
+    latency = merge_histograms(state['histograms'].get('gemini_request_seconds', {}))
+    results = sum(counters.get('llm_results_total', {}).values())
+    malformed = sum(counters.get('llm_parse_failures_total', {}).values())
+    requests = sum(
+        value for key, value in counters.get('gemini_requests_total', {}).items()
+        if 'outcome="cache_hit"' not in key
+    )
+    return {
+        'hotels': hotels,
+        'seconds': round(seconds, 3),
+        'hotels_per_second': round(hotels / seconds, 3) if seconds > 0 else None,
+        'tasks_succeeded': sum(value for key, value in processed.items() if 'status="succeeded"' in key),
+        'tasks_failed': sum(value for key, value in processed.items() if 'status="failed"' in key),
+        'gemini_requests': requests,
+        'retries': sum(counters.get('gemini_retries_total', {}).values()),
+        'repairs': sum(counters.get('llm_repairs_total', {}).values()),
+        'waste_rate': round(malformed / results, 4) if results else None,
+        'latency_p50': registry.quantile(latency, 0.5) if latency else None,
+        'latency_p99': registry.quantile(latency, 0.99) if latency else None,
+    }
@@ -0,0 +1,89 @@
+# llmApp/services/canned_responses.py
+"""
+Plausible model answers built from a prompt alone, in the format it asks
+for. The fake Gemini server serves them and the planner answers the
+prompts it records with them, so neither calls a real model.
+"""
+import json
+import re
+from typing import Optional
+
+
+def _batch_hotels(prompt: str) -> list:
+    """
+    The hotels a batch prompt asks about, from its JSON "Hotels:" block (or
+    the "Hotels to fix" block of a repair prompt)
+    """
+    marker = 'Hotels to fix' if 'Hotels to fix' in prompt else 'Hotels:'
+    start = prompt.find('[', prompt.find(marker))
+    end = prompt.rfind(']', 0, prompt.find('Respond with'))
+    if start == -1 or end == -1:
+        return []
+    try:
+        hotels = json.loads(prompt[start:end + 1])
+    except ValueError:
+        return []
+    # Repair prompts wrap each hotel as {"hotel": {...}, "problems": {...}}
+    return [
+        hotel['hotel'] if isinstance(hotel.get('hotel'), dict) else hotel
+        for hotel in hotels if isinstance(hotel, dict)
+    ]
+
+
+def _field_value(field: str, hotel: dict):
+    name = hotel.get('current_title') or hotel.get('hotel') or hotel.get('name') or 'Hotel'
+    location = hotel.get('location') or 'the city'
+    values = {
+        'hotel_id': hotel.get('hotel_id'),
+        'title': f"{name} in {location}",
+        'description': f"{name} is a comfortable stay in {location}.",
+        'summary': f"{name}: a well rated stay in {location}.",
+        'rating': 4,
+        'review': f"Pleasant stay at {name}, friendly staff and a good location.",
+        'reviews': [
+            {'persona': persona, 'rating': 4, 'review': f"As a {persona}, I enjoyed my stay at {name}."}
+            for persona in hotel.get('personas') or ['guest']
+        ],
+    }
+    return values.get(field, f"{name} {field}")
+
+
+def _schema_response(prompt: str, schema: dict) -> str:
+    """
+    An answer matching a responseSchema (Gemini or JSON Schema spelling)
+    """
+    # A city shared by the whole prompt is stated once in its context
+    match = re.search(r'located in (.*)\.', prompt)
+    city = {'location': match.group(1).strip()} if match else {}
+    if str(schema.get('type', '')).upper() == 'ARRAY':
+        fields = list(schema.get('items', {}).get('properties', {}))
+        return json.dumps([
+            {field: _field_value(field, {**city, **hotel}) for field in fields}
+            for hotel in _batch_hotels(prompt)
+        ])
+    hotel = dict(city)
+    match = re.search(r'(?:Current Title|Hotel|Name): (.*)', prompt)
+    if match:
+        hotel['name'] = match.group(1).strip()
+    match = re.search(r'Location: (.*)', prompt)
+    if match:
+        hotel['location'] = match.group(1).strip()
+    match = re.search(r'Travellers: (.*)', prompt)
+    if match:
+        hotel['personas'] = [persona.strip() for persona in match.group(1).split(',')]
+    return json.dumps({field: _field_value(field, hotel) for field in schema.get('properties', {})})
+
+
+def canned_response(prompt: str, schema: Optional[dict] = None) -> str:
+    """
+    A plausible answer in the format the request asks for: matching its
+    response schema when it has one, else the format the prompt describes
+    """
+    if schema:
+        return _schema_response(prompt, schema)
+    if 'Respond with a JSON array' in prompt:
+        wanted = prompt[prompt.find('Respond with'):]
+        fields = [field for field in ('hotel_id', 'title', 'description', 'summary', 'rating', 'review')
+                  if field == 'hotel_id' or f'"{field}"' in wanted]
+        return json.dumps([{field: _field_value(field, hotel) for field in fields} for hotel in _batch_hotels(prompt)])
+    return "A comfortable hotel in a convenient location with friendly staff and good value for money."
@@ -0,0 +1,92 @@
+# llmApp/services/concurrency.py
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Any, Awaitable, Callable, Iterable, Iterator, List, Optional, Tuple
+
+
+def chunked(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """
+    Lazily split ``items`` into lists of at most ``size`` elements
+    """
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def chunked_by(
+    items: Iterable[Any], size: int, key: Callable[[Any], Any], max_waiting: Optional[int] = None
+) -> Iterator[List[Any]]:
+    """
+    Like chunked(), but each chunk only holds items with the same ``key``.
+    Items wait until their chunk is full; once ``max_waiting`` items (ten
+    chunks' worth by default) are waiting, the fullest chunk goes out
+    early, and the rest go out when ``items`` runs out.
+    """
+    max_waiting = max_waiting or size * 10
+    waiting = {}
+    count = 0
+    for item in items:
+        item_key = key(item)
+        chunk = waiting.setdefault(item_key, [])
+        chunk.append(item)
+        count += 1
+        if len(chunk) >= size:
+            count -= len(waiting.pop(item_key))
+            yield chunk
+        elif count >= max_waiting:
+            fullest = max(waiting, key=lambda chunk_key: len(waiting[chunk_key]))
+            chunk = waiting.pop(fullest)
+            count -= len(chunk)
+            yield chunk
+    yield from waiting.values()
+
+
+def run_concurrently(
+    items: Iterable[Any],
+    worker: Callable[[Any], Awaitable[Any]],
+    concurrency: int = 1,
+) -> Iterator[Tuple[Any, Any, Optional[BaseException]]]:
+    """
+    Run the ``worker`` coroutine over ``items`` with up to ``concurrency``
+    calls in flight, yielding ``(item, result, error)`` as each one finishes.
+
+    The event loop only runs while waiting for the next result, so ``items``
+    is consumed lazily and the caller can use the Django ORM between
+    iterations while the remaining requests keep running in their threads.
+    """
+    concurrency = max(1, concurrency)
+    loop = asyncio.new_event_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=concurrency))
+    iterator = iter(items)
+    pending = {}
+
+    def fill():
+        while len(pending) < concurrency:
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            pending[loop.create_task(worker(item))] = item
+
+    try:
+        fill()
+        while pending:
+            done, _ = loop.run_until_complete(
+                asyncio.wait(pending.keys(), return_when=asyncio.FIRST_COMPLETED)
+            )
+            for task in done:
+                item = pending.pop(task)
+                error = task.exception()
+                yield item, None if error else task.result(), error
+            fill()
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        loop.run_until_complete(loop.shutdown_default_executor())
+        loop.close()
@@ -0,0 +1,241 @@
+# llmApp/services/dedup.py
+"""
+Near-duplicate hotels: listings of the same property scraped more than once.
+
+Hotels in the same city with the same room type, titles that are nearly the
+same and coordinates within a few meters of each other form a cluster. The
+hotel with the lowest id represents it (``duplicate_of`` is NULL); every
+other member points at it with ``duplicate_of``. Stages with ``shared`` set
+generate content only for representatives and copy it to the members,
+with the representative's title swapped for the member's own.
+
+Titles are compared with MinHash signatures of their character shingles,
+and candidate pairs come from locality-sensitive hashing of the
+signatures within a lat/long grid, so a city is clustered in roughly linear
+time rather than comparing every pair of hotels.
+"""
+import hashlib
+import math
+import re
+import unicodedata
+from collections import defaultdict
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from django.db import transaction
+from llmApp.models import Hotel
+from llmApp.services.hotel_api import invalidate_hotels
+from llmApp.services.iteration import iter_keyset_pages
+
+NUM_PERM = 32
+# Signatures are split into BANDS bands of NUM_PERM // BANDS values; titles
+# whose similarity is s share at least one band with probability
+# 1 - (1 - s^4)^8, about 98% at s = 0.8 and 5% at s = 0.4
+BANDS = 8
+SHINGLE_SIZE = 3
+# Modulus and coefficients of the permutations h -> (a * h + b) mod P
+PRIME = (1 << 61) - 1
+PERMUTATIONS = [
+    (
+        int.from_bytes(hashlib.blake2b(f'a{number}'.encode(), digest_size=8).digest(), 'big') % (PRIME - 1) + 1,
+        int.from_bytes(hashlib.blake2b(f'b{number}'.encode(), digest_size=8).digest(), 'big') % PRIME,
+    )
+    for number in range(NUM_PERM)
+]
+METERS_PER_DEGREE = 111_320
+EARTH_RADIUS = 6_371_000
+
+DEFAULT_MAX_DISTANCE = 100
+DEFAULT_SIMILARITY = 0.8
+
+
+class Listing(NamedTuple):
+    id: int
+    hotel_id: str
+    title: str
+    room_type: str
+    latitude: float
+    longitude: float
+
+
+def normalize_title(title: str) -> str:
+    text = unicodedata.normalize('NFKD', title or '').encode('ascii', 'ignore').decode().lower()
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', text).split())
+
+
+def shingles(title: str, size: int = SHINGLE_SIZE) -> set:
+    text = normalize_title(title)
+    if len(text) <= size:
+        return {text}
+    return {text[start:start + size] for start in range(len(text) - size + 1)}
+
+
+def minhash(features: Iterable[str]) -> Tuple[int, ...]:
+    hashes = [
+        int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), 'big')
+        for feature in features
+    ] or [0]
+    return tuple(min((a * value + b) % PRIME for value in hashes) for a, b in PERMUTATIONS)
+
+
+def similarity(first: Tuple[int, ...], second: Tuple[int, ...]) -> float:
+    """
+    Estimated Jaccard similarity of the shingles behind two signatures
+    """
+    return sum(1 for a, b in zip(first, second) if a == b) / len(first)
+
+
+def distance(first: Listing, second: Listing) -> float:
+    """
+    Great-circle distance in meters
+    """
+    lat1, lat2 = math.radians(first.latitude), math.radians(second.latitude)
+    dlat = lat2 - lat1
+    dlon = math.radians(second.longitude - first.longitude)
+    h = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(h)))
+
+
+def find_clusters(
+    listings: List[Listing],
+    max_distance: float = DEFAULT_MAX_DISTANCE,
+    threshold: float = DEFAULT_SIMILARITY,
+) -> List[List[Listing]]:
+    """
+    Clusters of two or more near-duplicate listings of one city, each
+    sorted by id
+    """
+    if len(listings) < 2:
+        return []
+    # Grid cells at least max_distance wide everywhere in the city, so
+    # duplicates are always in the same or a neighbouring cell
+    lat_step = max(max_distance, 1) / METERS_PER_DEGREE
+    widest = max(abs(listing.latitude) for listing in listings)
+    lon_step = lat_step / max(math.cos(math.radians(min(widest, 89.0))), 0.01)
+
+    def cell(listing):
+        return math.floor(listing.latitude / lat_step), math.floor(listing.longitude / lon_step)
+
+    rows = NUM_PERM // BANDS
+    signatures = {}
+    buckets = defaultdict(list)
+    for listing in listings:
+        signature = minhash(shingles(listing.title))
+        signatures[listing.id] = signature
+        row, column = cell(listing)
+        for band in range(BANDS):
+            key = (listing.room_type.lower(), row, column, band, signature[band * rows:(band + 1) * rows])
+            buckets[key].append(listing)
+
+    parent = {listing.id: listing.id for listing in listings}
+
+    def root(node):
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for listing in listings:
+        signature = signatures[listing.id]
+        row, column = cell(listing)
+        seen = set()
+        for band in range(BANDS):
+            values = signature[band * rows:(band + 1) * rows]
+            for d_row in (-1, 0, 1):
+                for d_column in (-1, 0, 1):
+                    key = (listing.room_type.lower(), row + d_row, column + d_column, band, values)
+                    for other in buckets.get(key, ()):
+                        if other.id <= listing.id or other.id in seen:
+                            continue
+                        seen.add(other.id)
+                        if (
+                            distance(listing, other) <= max_distance
+                            and similarity(signature, signatures[other.id]) >= threshold
+                        ):
+                            first, second = root(listing.id), root(other.id)
+                            if first != second:
+                                parent[max(first, second)] = min(first, second)
+
+    clusters = defaultdict(list)
+    for listing in listings:
+        clusters[root(listing.id)].append(listing)
+    return [sorted(members) for members in clusters.values() if len(members) > 1]
+
+
+def iter_city_listings() -> Iterator[Tuple[str, List[Listing]]]:
+    """
+    The hotels of each city as listings, compared on their scraped titles
+    """
+    cities = list(Hotel.objects.order_by('city_name').values_list('city_name', flat=True).distinct())
+    for city in cities:
+        rows = Hotel.objects.filter(city_name=city).values_list(
+            'id', 'hotel_id', 'original_title', 'property_title', 'room_type', 'latitude', 'longitude'
+        )
+        yield city, [
+            Listing(id, hotel_id, original_title or property_title, room_type or '', latitude, longitude)
+            for id, hotel_id, original_title, property_title, room_type, latitude, longitude in rows.iterator()
+        ]
+
+
+def assign_duplicates(city: str, listings: List[Listing], clusters: List[List[Listing]], dry_run: bool = False) -> int:
+    """
+    Point each cluster member's duplicate_of at its representative and clear
+    it for every other hotel of the city, returning how many hotels changed
+    """
+    wanted = {}
+    for cluster in clusters:
+        for member in cluster[1:]:
+            wanted[member.hotel_id] = cluster[0].hotel_id
+    current = dict(
+        Hotel.objects.filter(city_name=city, duplicate_of__isnull=False).values_list('hotel_id', 'duplicate_of')
+    )
+    changed = [
+        Hotel(id=listing.id, hotel_id=listing.hotel_id, duplicate_of=wanted.get(listing.hotel_id))
+        for listing in listings
+        if current.get(listing.hotel_id) != wanted.get(listing.hotel_id)
+    ]
+    if not dry_run:
+        Hotel.objects.bulk_update(changed, ['duplicate_of'], batch_size=1000)
+    return len(changed)
+
+
+def adapt(text: Optional[str], source_title: str, target_title: str) -> Optional[str]:
+    """
+    A representative's content for a member: the representative's title is
+    replaced with the member's wherever it is mentioned
+    """
+    if not text or not source_title or source_title == target_title:
+        return text
+    return re.sub(re.escape(source_title), lambda match: target_title, text, flags=re.IGNORECASE)
+
+
+def share_from_duplicates(stage, force: bool = False, page_size: int = 500) -> int:
+    """
+    Copy ``stage``'s content from representatives to the cluster members
+    that need it, once the representative's own content is up to date.
+    Returns how many members got content, each a request not sent.
+    """
+    if not stage.shared:
+        return 0
+    members = stage.annotate(Hotel.objects.filter(duplicate_of__isnull=False)).filter(stage.stale(force))
+    shared = 0
+    for page in iter_keyset_pages(members, page_size, stage.fields):
+        representatives = (
+            stage.annotate(Hotel.objects.filter(hotel_id__in={hotel.duplicate_of for hotel in page}))
+            .exclude(stage.stale(force))
+            .only(*stage.fields)
+        )
+        representatives = {hotel.hotel_id: hotel for hotel in representatives}
+        contents = stage.current_content(list(representatives.values()))
+        results = []
+        for hotel in page:
+            representative = representatives.get(hotel.duplicate_of)
+            content = contents.get(hotel.duplicate_of)
+            if representative is None or not content:
+                # Waits until the representative has been generated
+                continue
+            results.append((hotel, adapt(content, representative.property_title, hotel.property_title)))
+        if results:
+            with transaction.atomic():
+                shared += stage.apply_many(results, force=force)
+            invalidate_hotels(hotel.hotel_id for hotel, _ in results)
+    return shared
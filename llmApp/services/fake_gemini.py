@@ -0,0 +1,249 @@
+# llmApp/services/fake_gemini.py
+"""
+Stand-in for the Gemini generateContent endpoint, for benchmarks and
+offline runs. Point GeminiService at it with GEMINI_BASE_URL. It also
+answers Ollama's /api/generate and /api/chat, for OLLAMA_HOST.
+
+Only the standard library is used so it runs anywhere the commands do.
+"""
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+from llmApp.services.canned_responses import canned_response
+from llmApp.services.gemini_service import estimate_tokens
+
+GENERATE_PATH = re.compile(r'^/v1beta/models/(?P<model>[^/:]+):generateContent$')
+OLLAMA_PATHS = ('/api/generate', '/api/chat')
+
+
+class LatencyModel:
+    """
+    Response delay in seconds drawn from a fixed, uniform or lognormal
+    distribution around ``median``. Lognormal gives the long tail real APIs
+    have; ``sigma`` controls how long.
+    """
+    DISTRIBUTIONS = ('fixed', 'uniform', 'lognormal')
+
+    def __init__(self, distribution: str = 'lognormal', median: float = 0.2, sigma: float = 0.5, maximum: Optional[float] = None):
+        if distribution not in self.DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution '{distribution}'")
+        self.distribution = distribution
+        self.median = max(0.0, median)
+        self.sigma = max(0.0, sigma)
+        self.maximum = maximum
+
+    def sample(self, rng: random.Random) -> float:
+        if self.distribution == 'fixed' or not self.median:
+            delay = self.median
+        elif self.distribution == 'uniform':
+            delay = rng.uniform(0, 2 * self.median)
+        else:
+            delay = rng.lognormvariate(0, self.sigma) * self.median
+        if self.maximum is not None:
+            delay = min(delay, self.maximum)
+        return delay
+
+
+def malform(text: str) -> str:
+    """
+    Blank the last field of a JSON answer (the first entry of an array), or
+    cut a plain text answer short
+    """
+    try:
+        answer = json.loads(text)
+    except ValueError:
+        return text[:len(text) // 2]
+    target = answer[0] if isinstance(answer, list) and answer else answer
+    if isinstance(target, dict) and target:
+        target[list(target)[-1]] = ''
+    return json.dumps(answer)
+
+
+class FakeGeminiServer:
+    """
+    Threaded HTTP server answering generateContent requests with canned
+    responses after a simulated delay.
+
+    ``rate_429`` and ``rate_500`` are the fractions of requests answered with
+    those errors instead (429s carry ``retry_after`` as a Retry-After header
+    when given), and ``rate_malformed`` the fraction of answers with a field
+    left empty, to exercise the repair path. ``responses`` maps a prompt substring to the text returned
+    for prompts containing it; other prompts get canned_response().
+    """
+
+    def __init__(
+        self,
+        host: str = '127.0.0.1',
+        port: int = 0,
+        latency: Optional[LatencyModel] = None,
+        rate_429: float = 0.0,
+        rate_500: float = 0.0,
+        rate_malformed: float = 0.0,
+        retry_after: Optional[float] = None,
+        responses: Optional[Dict[str, str]] = None,
+        seed: Optional[int] = None,
+    ):
+        self.latency = latency or LatencyModel()
+        self.rate_429 = rate_429
+        self.rate_500 = rate_500
+        self.rate_malformed = rate_malformed
+        self.retry_after = retry_after
+        self.responses = responses or {}
+        self.stats = {'requests': 0, 'responses': 0, 'throttled': 0, 'errors': 0, 'malformed': 0}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+
+    @property
+    def root_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def base_url(self) -> str:
+        return f"{self.root_url}/v1beta/models"
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        """
+        Serve from a background thread
+        """
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def respond(self, prompt: str, schema: Optional[dict] = None) -> str:
+        for needle, text in self.responses.items():
+            if needle in prompt:
+                return text
+        return canned_response(prompt, schema)
+
+    def plan(self):
+        """
+        Pick the delay and outcome of one request
+        """
+        with self._lock:
+            self.stats['requests'] += 1
+            delay = self.latency.sample(self._rng)
+            roll = self._rng.random()
+            if roll < self.rate_429:
+                self.stats['throttled'] += 1
+                return delay, 429
+            if roll < self.rate_429 + self.rate_500:
+                self.stats['errors'] += 1
+                return delay, 500
+            self.stats['responses'] += 1
+            if roll < self.rate_429 + self.rate_500 + self.rate_malformed:
+                self.stats['malformed'] += 1
+                return delay, 'malformed'
+            return delay, 200
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out in separate writes; without this the
+            # delayed ACK adds ~40ms to every keep-alive response
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def send_json(self, status, body, headers=None):
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                raw = self.rfile.read(length)
+                path = self.path.split('?', 1)[0]
+                if not GENERATE_PATH.match(path) and path not in OLLAMA_PATHS:
+                    self.send_json(404, {'error': {'code': 404, 'message': 'Not found'}})
+                    return
+                try:
+                    payload = json.loads(raw or b'{}')
+                    if path in OLLAMA_PATHS:
+                        schema = payload.get('format') if isinstance(payload.get('format'), dict) else None
+                    else:
+                        schema = (payload.get('generationConfig') or {}).get('responseSchema')
+                    # The system instruction counts as part of the prompt
+                    if path == '/api/generate':
+                        prompt = '\n'.join(filter(None, [payload.get('system'), payload.get('prompt', '')]))
+                    elif path == '/api/chat':
+                        prompt = '\n'.join(message.get('content', '') for message in payload.get('messages', []))
+                    else:
+                        system = (payload.get('systemInstruction') or {}).get('parts', [])
+                        prompt = '\n'.join(
+                            part.get('text', '')
+                            for part in system + [
+                                part for content in payload.get('contents', []) for part in content.get('parts', [])
+                            ]
+                        )
+                except (ValueError, AttributeError):
+                    self.send_json(400, {'error': {'code': 400, 'message': 'Invalid JSON payload'}})
+                    return
+
+                delay, status = server.plan()
+                time.sleep(delay)
+                if status == 429:
+                    headers = {}
+                    if server.retry_after is not None:
+                        headers['Retry-After'] = str(server.retry_after)
+                    self.send_json(429, {'error': {'code': 429, 'message': 'Resource exhausted'}}, headers)
+                    return
+                if status == 500:
+                    self.send_json(500, {'error': {'code': 500, 'message': 'Internal error'}})
+                    return
+
+                text = server.respond(prompt, schema)
+                if status == 'malformed':
+                    text = malform(text)
+                prompt_tokens, response_tokens = estimate_tokens(prompt), estimate_tokens(text)
+                if path in OLLAMA_PATHS:
+                    body = {'model': payload.get('model'), 'done': True,
+                            'prompt_eval_count': prompt_tokens, 'eval_count': response_tokens}
+                    if path == '/api/chat':
+                        body['message'] = {'role': 'assistant', 'content': text}
+                    else:
+                        body['response'] = text
+                    self.send_json(200, body)
+                    return
+                self.send_json(200, {
+                    'candidates': [{'content': {'parts': [{'text': text}], 'role': 'model'}, 'finishReason': 'STOP'}],
+                    'usageMetadata': {
+                        'promptTokenCount': prompt_tokens,
+                        'candidatesTokenCount': response_tokens,
+                        'totalTokenCount': prompt_tokens + response_tokens,
+                    },
+                })
+
+        return Handler
@@ -0,0 +1,73 @@
+# llmApp/services/fingerprints.py
+"""
+Fingerprints of the hotel fields a piece of generated content was built from.
+
+The same fingerprint can be computed in Python from a loaded hotel and in SQL
+as a query expression, so the database can find stale content without loading
+every hotel. Floats are compared at a fixed precision (``scale``) so both
+sides render them the same way.
+"""
+import hashlib
+import math
+from typing import Iterable, Optional
+
+from django.db.models import CharField, F, Func, IntegerField, Value
+from django.db.models.functions import MD5, Cast, Coalesce, Floor
+
+SEPARATOR = '\x1f'
+
+
+class Join(Func):
+    """
+    Flat ``a || b || c`` string concatenation. Concat() nests one
+    expression per pair, which long fingerprints turn into very deep SQL.
+    """
+    arg_joiner = ' || '
+    template = '(%(expressions)s)'
+    output_field = CharField()
+
+
+class Source:
+    """
+    One hotel field that feeds a prompt, optionally falling back to another
+    field while it is empty
+    """
+
+    def __init__(self, field: str, scale: Optional[int] = None, fallback: Optional[str] = None):
+        self.field = field
+        self.scale = scale
+        self.fallback = fallback
+
+    def value(self, hotel) -> str:
+        value = getattr(hotel, self.field)
+        if value is None and self.fallback:
+            value = getattr(hotel, self.fallback)
+        if value is None:
+            return ''
+        if self.scale:
+            return str(math.floor(value * self.scale))
+        return str(value)
+
+    def expression(self, ref=F):
+        expression = ref(self.field)
+        if self.fallback:
+            expression = Coalesce(expression, ref(self.fallback))
+        if self.scale:
+            expression = Cast(Floor(expression * self.scale), IntegerField())
+        return Coalesce(Cast(expression, CharField()), Value(''))
+
+
+def fingerprint(prefix: str, values: Iterable[str]) -> str:
+    text = prefix + ''.join(SEPARATOR + value for value in values)
+    return hashlib.md5(text.encode('utf-8')).hexdigest()
+
+
+def fingerprint_expression(prefix: str, sources: Iterable[Source], ref=F):
+    """
+    SQL counterpart of fingerprint() over the given sources. Pass
+    ``ref=OuterRef`` to compute it inside a subquery from the outer hotel.
+    """
+    parts = [Value(prefix)]
+    for source in sources:
+        parts.extend([Value(SEPARATOR), source.expression(ref)])
+    return MD5(Join(*parts))
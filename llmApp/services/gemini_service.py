@@ -1,126 +1,998 @@
 # llmApp/services/gemini_service.py
+import asyncio
 import os
+import random
+import re
+import threading
+import time
 import requests
-from typing import Optional, Tuple
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
 import json
+from llmApp.services.llm_backends import LLMBackend, get_backend
+from llmApp.services.metrics import MetricsRegistry, get_registry
+from llmApp.services.rate_limiter import RateLimiter
+from llmApp.services.response_cache import ResponseCache
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+EXPECTED_OUTPUT_TOKENS = 512
+# maxOutputTokens per hotel of each stage, a few times the typical answer so
+# only runaway responses are cut; LLM_MAX_OUTPUT_TOKENS overrides them
+STAGE_MAX_OUTPUT_TOKENS = {'title': 128, 'description': 1024, 'summary': 384, 'review': 768}
+# Extra output per hotel of a batch prompt, for its hotel_id and JSON punctuation
+BATCH_ENTRY_TOKENS = 16
+# Token budget for the free text a stage's prompt embeds (the description in
+# summary prompts); LLM_INPUT_BUDGETS overrides it
+INPUT_TOKEN_BUDGETS = {'summary': 512}
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+# Fields each stage asks the model for, with their responseSchema types
+STAGE_FIELDS = {
+    'title': {'title': 'STRING'},
+    'description': {'description': 'STRING'},
+    'summary': {'summary': 'STRING'},
+    'review': {'rating': 'NUMBER', 'review': 'STRING'},
+    # Several reviews of one hotel, see generate_property_review_set
+    'reviews': {'reviews': 'REVIEWS'},
+}
+FIELD_PROBLEMS = {
+    'STRING': 'must be a non-empty string',
+    'NUMBER': 'must be a number between 1 and 5',
+    'REVIEWS': 'must be a list of reviews, each with a rating between 1 and 5 and review text',
+}
+# Static instructions of each single-hotel prompt. They go out as the
+# system instruction, ahead of the city context, so every prompt for a city
+# starts with the same prefix and the prompt itself only carries the hotel.
+SYSTEM_INSTRUCTIONS = {
+    'title': """You rewrite hotel property titles to be more engaging and descriptive.
+
+Rules:
+1. Keep it concise but descriptive
+2. Include the location if relevant
+3. Highlight any unique features
+4. Maintain professionalism
+5. Respond with a JSON object with "title" set to the new title only""",
+    'description': """You write engaging hotel descriptions: 2-3 paragraphs highlighting
+location, amenities, and value proposition.
+Respond with a JSON object with "description" set to the description text.""",
+    'summary': """You write brief hotel summaries: a concise 2-3 sentence summary
+highlighting key features.
+Respond with a JSON object with "summary" set to the summary text.""",
+    'review': """You write hotel guest reviews.
+Respond with a JSON object with "rating" set to a single number between 1 and 5
+and "review" set to the detailed review text.""",
+    'reviews': """You write sets of different guest reviews of a hotel, one for each
+traveller you are given. Each rating should reflect that traveller's
+experience, so they need not all be the same, but should stay close to the
+hotel's current rating overall.
+Respond with a JSON object with "reviews" set to an array with one object per
+traveller, each with "persona", "rating" set to a single number between 1 and 5
+and "review" set to the detailed review text.""",
+}
+# Travellers the reviews of one hotel are written by, so they differ
+PERSONAS = [
+    'solo business traveller',
+    'family with young children',
+    'couple on a weekend break',
+    'backpacker on a budget',
+    'retired couple',
+    'group of friends',
+    'remote worker on a long stay',
+    'honeymooners',
+]
+
+
+class Review(NamedTuple):
+    rating: float
+    review: str
+
+
+class Reply(NamedTuple):
+    """
+    A model's answer to one prompt, with the HTTP attempts it took (0 when
+    it came from the response cache)
+    """
+    text: Optional[str]
+    attempts: int
+
+
+def field_schema(kind: str) -> dict:
+    if kind == 'REVIEWS':
+        return {"type": "ARRAY", "items": object_schema({'persona': 'STRING', 'rating': 'NUMBER', 'review': 'STRING'})}
+    return {"type": kind}
+
+
+def object_schema(fields: Dict[str, str]) -> dict:
+    return {
+        "type": "OBJECT",
+        "properties": {name: field_schema(kind) for name, kind in fields.items()},
+        "required": list(fields),
+    }
+
+
+def pick_personas(hotel_id, count: int) -> List[str]:
+    """
+    ``count`` personas for a hotel, starting at a place fixed by its
+    hotel_id so the prompt (and its cache key) is stable across runs
+    """
+    start = sum(ord(char) for char in str(hotel_id)) % len(PERSONAS)
+    return [PERSONAS[(start + offset) % len(PERSONAS)] for offset in range(count)]
+
+
+def response_config(stage: str, fields: Optional[Dict[str, str]] = None, batch: bool = False) -> dict:
+    """
+    generationConfig asking for JSON matching the stage's fields (or just
+    ``fields``), as one object or, with ``batch``, an array of them keyed by
+    hotel_id
+    """
+    fields = fields or STAGE_FIELDS[stage]
+    if batch:
+        schema = {"type": "ARRAY", "items": object_schema({'hotel_id': 'STRING', **fields})}
+    else:
+        schema = object_schema(fields)
+    return {"responseMimeType": "application/json", "responseSchema": schema}
+
+
+def city_context(city_name: str) -> str:
+    """
+    Location context shared by every prompt about hotels in ``city_name``
+    """
+    return f"All hotels in this request are located in {city_name}."
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count for budgeting, about four characters per token
+    """
+    return len(text) // 4 + 1
+
+
+def parse_stage_limits(value: Optional[str]) -> Dict[str, int]:
+    """
+    Parse ``stage=tokens`` pairs separated by commas, e.g.
+    ``title=64,summary=256``; 0 lifts a stage's limit
+    """
+    limits = {}
+    for pair in (value or '').split(','):
+        if not pair.strip():
+            continue
+        stage, separator, tokens = pair.partition('=')
+        if not separator or not stage.strip() or not tokens.strip().isdigit():
+            raise ValueError(f"Expected stage=tokens, got '{pair.strip()}'")
+        limits[stage.strip()] = int(tokens)
+    return limits
+
+
+def fit_to_budget(text: Optional[str], budget: int) -> Optional[str]:
+    """
+    Shorten ``text`` to about ``budget`` tokens. Whitespace is collapsed and
+    repeated sentences are dropped; then the opening sentences of every
+    paragraph are kept ahead of later ones, so each paragraph stays
+    represented. A single sentence over budget is cut at a word.
+    """
+    if not text or budget <= 0 or estimate_tokens(text) <= budget:
+        return text
+    # Longest text estimate_tokens() still counts as within budget
+    limit = (budget - 1) * 4
+    sentences, seen = [], set()
+    for paragraph in re.split(r'\n\s*\n', text):
+        rank = 0
+        for sentence in SENTENCE_END.split(' '.join(paragraph.split())):
+            if not sentence or sentence.lower() in seen:
+                continue
+            seen.add(sentence.lower())
+            sentences.append((rank, len(sentences), sentence))
+            rank += 1
+
+    kept, length = [], -1
+    for rank, order, sentence in sorted(sentences):
+        if length + 1 + len(sentence) <= limit:
+            kept.append((order, sentence))
+            length += 1 + len(sentence)
+    if not kept:
+        collapsed = ' '.join(text.split())
+        return collapsed[:limit + 1].rsplit(' ', 1)[0][:limit]
+    return ' '.join(sentence for order, sentence in sorted(kept))
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a Retry-After header given either as seconds or as an HTTP date
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def _strip_fence(text: str) -> str:
+    text = text.strip()
+    if text.startswith('```'):
+        # Strip a markdown code fence around the JSON
+        text = text.split('\n', 1)[-1].rsplit('```', 1)[0]
+    return text.strip()
+
+
+def parse_batch_response(text: Optional[str]) -> Dict[str, dict]:
+    """
+    Parse a JSON array of per-hotel objects into a dict keyed by hotel_id.
+    Entries without a hotel_id are dropped; invalid JSON yields an empty dict.
+    """
+    if not text:
+        return {}
+    try:
+        items = json.loads(_strip_fence(text))
+    except ValueError:
+        return {}
+    if isinstance(items, dict):
+        items = items.get('hotels', [])
+    if not isinstance(items, list):
+        return {}
+    return {
+        str(item['hotel_id']): item
+        for item in items
+        if isinstance(item, dict) and item.get('hotel_id') is not None
+    }
+
+
+def _clean_text(value) -> Optional[str]:
+    if isinstance(value, str) and value.strip():
+        return value.strip()
+    return None
+
+
+def _parse_rating(value) -> Optional[float]:
+    try:
+        return min(max(float(value), 1), 5)  # Ensure rating is between 1 and 5
+    except (TypeError, ValueError):
+        return None
+
+
+def validate_fields(stage: str, item, fields: Optional[Dict[str, str]] = None) -> Tuple[dict, Dict[str, str]]:
+    """
+    Check a parsed object against the stage's fields (or just ``fields``),
+    returning the clean values and a problem description per bad field
+    """
+    fields = fields or STAGE_FIELDS[stage]
+    values, problems = {}, {}
+    for name, kind in fields.items():
+        raw = item.get(name) if isinstance(item, dict) else None
+        if kind == 'REVIEWS':
+            value = _parse_reviews(raw)
+        elif kind == 'NUMBER':
+            value = _parse_rating(raw)
+        else:
+            value = _clean_text(raw)
+        if value is None:
+            problems[name] = FIELD_PROBLEMS[kind]
+        else:
+            values[name] = value
+    return values, problems
+
+
+def _parse_reviews(value) -> Optional[List[Review]]:
+    """
+    The valid entries of a list of reviews; None when there are none
+    """
+    if not isinstance(value, list):
+        return None
+    reviews = []
+    for item in value:
+        values, problems = validate_fields('review', item)
+        if not problems:
+            reviews.append(build_result('review', values))
+    return reviews or None
+
+
+def build_result(stage: str, values: dict):
+    """
+    The typed result of a stage: a Review for reviews, a list of them for a
+    review set, text otherwise
+    """
+    if stage == 'review':
+        return Review(values['rating'], values['review'])
+    if stage == 'reviews':
+        return values['reviews']
+    return values[next(iter(STAGE_FIELDS[stage]))]
+
+
+def build_repair_prompt(prompt: str, answer: Optional[str], problems: Dict[str, str]) -> str:
+    problem_lines = '\n'.join(f"- {name}: {problem}" for name, problem in problems.items())
+    wanted = ', '.join(f'"{name}"' for name in problems)
+    return f"""Your previous answer to the request below could not be used.
+
+        Request:
+        {prompt}
+
+        Previous answer:
+        {answer or '(empty)'}
+
+        Problems:
+        {problem_lines}
+
+        Respond with a JSON object containing only the corrected fields: {wanted}.
+        """
+
 
 class GeminiService:
-    def __init__(self):
-        self.api_key = os.getenv('GEMINI_API_KEY')
-        self.base_url = "https://generativelanguage.googleapis.com/v1beta/models"
-        self.model = "gemini-1.5-flash"
-        
-    def _make_request(self, prompt: str) -> Optional[str]:
+    def __init__(
+        self,
+        pool_size: Optional[int] = None,
+        timeout: Optional[Tuple[float, float]] = None,
+        max_retries: Optional[int] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        cache: Optional[ResponseCache] = None,
+        use_cache: bool = True,
+        refresh_cache: bool = False,
+        metrics: Optional[MetricsRegistry] = None,
+        backend: Optional[LLMBackend] = None,
+        stage_backends: Optional[Dict[str, LLMBackend]] = None,
+        max_output_tokens: Optional[Dict[str, int]] = None,
+        input_budgets: Optional[Dict[str, int]] = None,
+    ):
+        # Prompts go to ``backend`` (LLM_BACKEND, Gemini by default) unless
+        # their stage is routed elsewhere in ``stage_backends``
+        self.backend = backend or get_backend()
+        self.stage_backends = stage_backends or {}
+        # Per-stage token limits: the defaults, then the environment, then
+        # the given overrides
+        self.max_output_tokens = {
+            **STAGE_MAX_OUTPUT_TOKENS,
+            **parse_stage_limits(os.getenv('LLM_MAX_OUTPUT_TOKENS')),
+            **(max_output_tokens or {}),
+        }
+        self.input_budgets = {
+            **INPUT_TOKEN_BUDGETS,
+            **parse_stage_limits(os.getenv('LLM_INPUT_BUDGETS')),
+            **(input_budgets or {}),
+        }
+
+        # Connection pool and retry policy, overridable from the environment
+        self.pool_size = pool_size or int(os.getenv('GEMINI_POOL_SIZE', '10'))
+        self.timeout = timeout or (
+            float(os.getenv('GEMINI_CONNECT_TIMEOUT', '5')),
+            float(os.getenv('GEMINI_READ_TIMEOUT', '60')),
+        )
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv('GEMINI_MAX_RETRIES', '5'))
+        self.backoff_base = float(os.getenv('GEMINI_BACKOFF_BASE', '1'))
+        self.backoff_max = float(os.getenv('GEMINI_BACKOFF_MAX', '60'))
+
+        self.rate_limiter = rate_limiter or RateLimiter.for_backends(
+            [self.backend, *self.stage_backends.values()]
+        )
+        # Responses for identical prompts are reused unless caching is off;
+        # refresh_cache skips lookups but still stores the new responses
+        if use_cache:
+            self.cache = cache if cache is not None else ResponseCache.from_env()
+        else:
+            self.cache = None
+        self.refresh_cache = refresh_cache
+        self.metrics = metrics if metrics is not None else get_registry()
+        self.session = self._build_session()
+        self.stats = {'requests': 0, 'attempts': 0, 'retries': 0, 'failures': 0, 'batch_fallbacks': 0}
+        self._stats_lock = threading.Lock()
+
+    def _build_session(self) -> requests.Session:
         """
-        Make a request to the Gemini API
+        Build a keep-alive session so connections are reused across prompts
         """
-        try:
-            url = f"{self.base_url}/{self.model}:generateContent?key={self.api_key}"
-            
-            payload = {
-                "contents": [{
-                    "parts": [{"text": prompt}]
-                }]
-            }
-            
-            headers = {
-                'Content-Type': 'application/json'
-            }
-            
-            response = requests.post(url, headers=headers, json=payload)
-            response.raise_for_status()
-            
-            result = response.json()
-            
-            # Extract the generated text from the response
-            if 'candidates' in result and len(result['candidates']) > 0:
-                return result['candidates'][0]['content']['parts'][0]['text']
+        session = requests.Session()
+        # One pool per host, so stages on different backends keep their connections
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size, max_retries=0)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update({'Content-Type': 'application/json'})
+        return session
+
+    def close(self):
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
+
+    def _record_call(self, attempts: int, success: bool, stage: str = 'unknown', started: Optional[float] = None):
+        with self._stats_lock:
+            self.stats['requests'] += 1
+            self.stats['attempts'] += attempts
+            self.stats['retries'] += attempts - 1
+            if not success:
+                self.stats['failures'] += 1
+        self.metrics.inc('gemini_requests_total', stage=stage, outcome='success' if success else 'failure')
+        if attempts > 1:
+            self.metrics.inc('gemini_retries_total', attempts - 1, stage=stage)
+        if started is not None:
+            self.metrics.observe('gemini_request_seconds', time.monotonic() - started, stage=stage)
+
+    def _retry_delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """
+        Exponential backoff with full jitter, never shorter than Retry-After
+        """
+        backoff = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+        server_delay = parse_retry_after(retry_after)
+        if server_delay is not None:
+            return max(server_delay, backoff)
+        return backoff
+
+    def backend_for(self, stage: str) -> LLMBackend:
+        # Review sets go wherever single reviews go
+        stage = 'review' if stage == 'reviews' else stage
+        return self.stage_backends.get(stage, self.backend)
+
+    def output_limit(self, stage: str, per_hotel: int = 1, hotels: Optional[int] = None) -> Optional[int]:
+        """
+        maxOutputTokens for ``per_hotel`` results of the stage for one hotel,
+        or for each of ``hotels`` in a batch prompt; None when unlimited
+        """
+        # Review sets are capped per review
+        limit = self.max_output_tokens.get('review' if stage == 'reviews' else stage)
+        if not limit:
             return None
-            
+        if hotels is None:
+            return limit * per_hotel
+        return (limit * per_hotel + BATCH_ENTRY_TOKENS) * hotels
+
+    def generation_config(
+        self,
+        stage: str,
+        fields: Optional[Dict[str, str]] = None,
+        per_hotel: int = 1,
+        hotels: Optional[int] = None,
+    ) -> dict:
+        """
+        response_config() for the stage, capped at its maxOutputTokens
+        """
+        config = response_config(stage, fields, batch=hotels is not None)
+        limit = self.output_limit(stage, per_hotel, hotels)
+        if limit:
+            config["maxOutputTokens"] = limit
+        return config
+
+    def fit_input(self, stage: str, text: Optional[str]) -> Optional[str]:
+        """
+        Shorten free text embedded in the stage's prompts to its input budget
+        """
+        fitted = fit_to_budget(text, self.input_budgets.get(stage, 0))
+        if fitted != text:
+            self.metrics.inc('llm_inputs_trimmed_total', stage=stage)
+        return fitted
+
+    def _make_request(
+        self,
+        prompt: str,
+        generation_config: Optional[dict] = None,
+        stage: str = 'unknown',
+        validate: Optional[Callable[[str], bool]] = None,
+        system: Optional[str] = None,
+    ) -> Optional[str]:
+        return self.send(prompt, generation_config, stage, validate, system).text
+
+    def send(
+        self,
+        prompt: str,
+        generation_config: Optional[dict] = None,
+        stage: str = 'unknown',
+        validate: Optional[Callable[[str], bool]] = None,
+        system: Optional[str] = None,
+    ) -> Reply:
+        """
+        Send a prompt to the stage's backend, retrying throttled and failed
+        calls, and return the text with the attempts it took. ``stage``
+        picks the backend and labels the call in the metrics; responses
+        failing ``validate`` are returned but not cached. ``system`` is sent
+        as the system instruction.
+        """
+        backend = self.backend_for(stage)
+        payload = backend.build_payload(prompt, generation_config, system)
+
+        cache_key = None
+        if self.cache is not None:
+            # The output cap is left out of the key: a response that fit
+            # one cap is as good under another, and cut off responses fail
+            # validation and are never cached
+            config = {key: value for key, value in (generation_config or {}).items() if key != 'maxOutputTokens'}
+            params = {"generationConfig": config} if config else {}
+            if system:
+                params["systemInstruction"] = system
+            cache_key = ResponseCache.make_key(backend.cache_model, prompt, params)
+            if not self.refresh_cache:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    self.metrics.inc('gemini_requests_total', stage=stage, outcome='cache_hit')
+                    return Reply(cached, 0)
+
+        expected_output = min(EXPECTED_OUTPUT_TOKENS, (generation_config or {}).get('maxOutputTokens') or EXPECTED_OUTPUT_TOKENS)
+        estimated_tokens = estimate_tokens(prompt) + estimate_tokens(system or '') + expected_output
+        started = time.monotonic()
+        attempts = 0
+        text = None
+        try:
+            while True:
+                attempts += 1
+                if backend.rate_limited:
+                    self.rate_limiter.acquire(estimated_tokens)
+                try:
+                    response = self.session.post(
+                        backend.url(), params=backend.params(), json=payload, timeout=self.timeout
+                    )
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                    if attempts > self.max_retries:
+                        raise
+                    delay = self._retry_delay(attempts)
+                    print(f"Request failed ({str(e)}), retrying in {delay:.1f}s")
+                    time.sleep(delay)
+                    continue
+
+                if response.status_code == 429:
+                    if backend.rate_limited:
+                        self.rate_limiter.record_throttle()
+                    self.metrics.inc('gemini_throttled_total', stage=stage)
+
+                if response.status_code in RETRY_STATUS_CODES and attempts <= self.max_retries:
+                    delay = self._retry_delay(attempts, response.headers.get('Retry-After'))
+                    print(f"{backend.name} returned {response.status_code}, retrying in {delay:.1f}s")
+                    time.sleep(delay)
+                    continue
+
+                response.raise_for_status()
+                text, usage = backend.parse_response(response.json())
+                if backend.rate_limited:
+                    self.rate_limiter.record_success()
+                    if usage['total']:
+                        self.rate_limiter.adjust_tokens(usage['total'] - estimated_tokens)
+                self.metrics.inc('gemini_prompt_tokens_total', usage['prompt'], stage=stage)
+                self.metrics.inc('gemini_response_tokens_total', usage['response'], stage=stage)
+                if usage.get('cached'):
+                    self.metrics.inc('gemini_cached_tokens_total', usage['cached'], stage=stage)
+
+                if cache_key is not None and text and (validate is None or validate(text)):
+                    self.cache.set(cache_key, text)
+                return Reply(text, attempts)
+
         except requests.exceptions.RequestException as e:
             print(f"Error making request: {str(e)}")
-            return None
+            return Reply(None, attempts)
         except Exception as e:
             print(f"Unexpected error: {str(e)}")
-            return None
+            return Reply(None, attempts)
+        finally:
+            self._record_call(attempts, text is not None, stage, started)
 
-    def rewrite_property_title(self, hotel) -> Optional[str]:
-        prompt = f"""Rewrite this hotel property title to be more engaging and descriptive:
-        Current Title: {hotel.property_title}
-        Location: {hotel.city_name}
+    def system_instruction(self, stage: str, city_name: Optional[str] = None) -> str:
+        """
+        The stage's instructions followed by the city's context: the same for
+        every hotel in a city, so backends that cache prompt prefixes (Gemini's
+        implicit caching, Ollama's loaded context) reuse it across calls
+        """
+        instructions = SYSTEM_INSTRUCTIONS[stage]
+        if city_name:
+            instructions = f"{instructions}\n\n{city_context(city_name)}"
+        return instructions
+
+    def build_title_prompt(self, hotel) -> str:
+        return f"""Current Title: {hotel.property_title}
         Room Type: {hotel.room_type}
         Rating: {hotel.rating}/5
-        
-        Rules:
-        1. Keep it concise but descriptive
-        2. Include the location if relevant
-        3. Highlight any unique features
-        4. Maintain professionalism
-        5. Return only the new title, no additional text
-        """
-        return self._make_request(prompt)
-    
-    def generate_property_description(self, property_data) -> Optional[str]:
-        prompt = f"""Generate an engaging hotel description:
-        Hotel: {property_data['property_title']}
-        Location: {property_data['city_name']}
+        """
+
+    def build_description_prompt(self, property_data) -> str:
+        return f"""Hotel: {property_data['property_title']}
         Room Type: {property_data['room_type']}
         Rating: {property_data['rating']}/5
         Price: ${property_data['price']} per night
-
-        Write 2-3 paragraphs highlighting location, amenities, and value proposition.
         """
-        return self._make_request(prompt)
 
-    def generate_property_summary(self, property_data) -> Optional[str]:
-        prompt = f"""Create a brief summary for this hotel:
-        Name: {property_data['property_title']}
-        Location: {property_data['city_name']}
+    def build_summary_prompt(self, property_data) -> str:
+        return f"""Name: {property_data['property_title']}
         Price: ${property_data['price']}
         Rating: {property_data['rating']}/5
-        Description: {property_data.get('description', 'Not available')}
+        Description: {self.fit_input('summary', property_data.get('description', 'Not available'))}
+        """
 
-        Create a concise 2-3 sentence summary highlighting key features.
+    def build_review_prompt(self, property_data) -> str:
+        return f"""Name: {property_data['property_title']}
+        Price: ${property_data['price']}
+        Current Rating: {property_data['rating']}/5
         """
-        return self._make_request(prompt)
 
-    def generate_property_review(self, property_data) -> Tuple[Optional[float], Optional[str]]:
-        prompt = f"""Generate a hotel review:
-        Name: {property_data['property_title']}
-        Location: {property_data['city_name']}
+    def build_review_set_prompt(self, property_data, count: int) -> str:
+        personas = pick_personas(property_data['hotel_id'], count)
+        return f"""Name: {property_data['property_title']}
         Price: ${property_data['price']}
         Current Rating: {property_data['rating']}/5
+        Travellers: {', '.join(personas)}
+        """
 
-        Format your response EXACTLY like this:
-        RATING: [single number 1-5]
-        REVIEW: [detailed review text]
+    def _parse_legacy_review(self, text: str) -> Optional[dict]:
+        """
+        Read the RATING:/REVIEW: format reviews were asked for before
+        structured output
+        """
+        parts = text.split('\n', 1)
+        if len(parts) != 2:
+            return None
+        return {
+            'rating': parts[0].replace('RATING:', '').strip(),
+            'review': parts[1].replace('REVIEW:', '').strip(),
+        }
 
-        Note: The rating should be just a single number between 1 and 5.
+    def check_response(self, stage: str, text: Optional[str], fields: Optional[Dict[str, str]] = None) -> Tuple[dict, Dict[str, str]]:
         """
-        
-        response = self._make_request(prompt)
-        if not response:
-            return None, None
+        Validate the response to a single-hotel prompt, returning the clean
+        values and the problems with the remaining fields.
 
-        try:
-            # Split the response into rating and review
-            parts = response.split('\n', 1)
-            if len(parts) != 2:
-                return None, None
-                
-            # Extract rating
-            rating_part = parts[0].replace('RATING:', '').strip()
+        Plain text is still accepted the way the prompts used to ask for it
+        (a bare title, RATING:/REVIEW: lines), so cached responses and
+        older batch results keep working.
+        """
+        fields = fields or STAGE_FIELDS[stage]
+        item = None
+        if text and text.strip():
+            body = _strip_fence(text)
             try:
-                rating = float(rating_part)
-                rating = min(max(rating, 1), 5)  # Ensure rating is between 1 and 5
+                item = json.loads(body)
             except ValueError:
-                return None, None
+                if not body.startswith(('{', '[')):
+                    item = body
+            if isinstance(item, str):
+                if len(fields) == 1:
+                    item = {next(iter(fields)): item}
+                elif stage == 'review':
+                    item = self._parse_legacy_review(item)
+        return validate_fields(stage, item, fields)
 
-            # Extract review
-            review = parts[1].replace('REVIEW:', '').strip()
-            
-            return rating, review
+    def parse_review_response(self, response: Optional[str]) -> Tuple[Optional[float], Optional[str]]:
+        values, problems = self.check_response('review', response)
+        if problems:
+            return None, None
+        return build_result('review', values)
 
-        except Exception as e:
-            print(f"Error parsing response: {str(e)}")
-            return None, None
\ No newline at end of file
+    def parse_result(self, stage: str, text: Optional[str]):
+        """
+        Typed result of a stage from response text, or None if it is unusable
+        """
+        values, problems = self.check_response(stage, text)
+        return None if problems else build_result(stage, values)
+
+    def _is_usable(self, stage: str):
+        # Malformed responses are not cached, so a rerun asks again
+        return lambda text: not self.check_response(stage, text)[1]
+
+    def _generate(self, stage: str, prompt: str, system: Optional[str] = None, per_hotel: int = 1):
+        """
+        Ask for one hotel's structured result; if some fields come back
+        malformed, ask again for just those fields
+        """
+        self.metrics.inc('llm_results_total', stage=stage)
+        text = self._make_request(
+            prompt, self.generation_config(stage, per_hotel=per_hotel), stage=stage,
+            validate=self._is_usable(stage), system=system,
+        )
+        if text is None:
+            return None
+        values, problems = self.check_response(stage, text)
+        if not problems:
+            return build_result(stage, values)
+
+        self.metrics.inc('llm_parse_failures_total', stage=stage)
+        fields = {name: STAGE_FIELDS[stage][name] for name in problems}
+        repair_text = self._make_request(
+            build_repair_prompt(prompt, text, problems), self.generation_config(stage, fields, per_hotel),
+            stage=stage, system=system,
+        )
+        repaired, problems = self.check_response(stage, repair_text, fields)
+        self.metrics.inc('llm_repairs_total', stage=stage, outcome='failure' if problems else 'success')
+        if problems:
+            return None
+        return build_result(stage, {**values, **repaired})
+
+    def rewrite_property_title(self, hotel) -> Optional[str]:
+        return self._generate(
+            'title', self.build_title_prompt(hotel), self.system_instruction('title', hotel.city_name)
+        )
+    
+    def generate_property_description(self, property_data) -> Optional[str]:
+        return self._generate(
+            'description', self.build_description_prompt(property_data),
+            self.system_instruction('description', property_data['city_name']),
+        )
+
+    def generate_property_summary(self, property_data) -> Optional[str]:
+        return self._generate(
+            'summary', self.build_summary_prompt(property_data),
+            self.system_instruction('summary', property_data['city_name']),
+        )
+
+    def generate_property_review(self, property_data) -> Tuple[Optional[float], Optional[str]]:
+        result = self._generate(
+            'review', self.build_review_prompt(property_data),
+            self.system_instruction('review', property_data['city_name']),
+        )
+        return result or (None, None)
+
+    def generate_property_review_set(self, property_data, count: int) -> Optional[List[Review]]:
+        """
+        Several reviews of one hotel by different personas, in one request
+        """
+        return self._generate(
+            'reviews', self.build_review_set_prompt(property_data, count),
+            self.system_instruction('reviews', property_data['city_name']),
+            per_hotel=count,
+        )
+
+    def _make_batch_request(
+        self,
+        items: List,
+        entry: Callable[[object], dict],
+        instructions: str,
+        output_fields: str,
+        fallback: Callable[[object], object],
+        stage: str,
+        per_hotel: int = 1,
+    ) -> Dict[str, object]:
+        """
+        Generate content for several hotels with a single prompt.
+
+        The model is asked for a JSON array keyed by hotel_id, matching a
+        response schema. ``instructions`` go out as the system instruction,
+        with the city's context when every hotel is in the same city (their
+        entries then leave out the location). Hotels whose entries are
+        missing or malformed are re-asked together in one repair prompt for
+        just the bad fields, and whatever is still unusable is regenerated
+        one at a time with ``fallback``. The output is capped at
+        ``per_hotel`` results' worth of tokens per hotel. Returns results
+        keyed by hotel_id.
+        """
+        entries = [entry(item) for item in items]
+        system = instructions
+        prompt_entries = entries
+        cities = {item_entry.get('location') for item_entry in entries}
+        if len(cities) == 1 and None not in cities:
+            system = f"{instructions}\n\n{city_context(cities.pop())}"
+            prompt_entries = [
+                {key: value for key, value in item_entry.items() if key != 'location'} for item_entry in entries
+            ]
+        prompt = f"""Hotels:
+        {json.dumps(prompt_entries, ensure_ascii=False)}
+
+        Respond with a JSON array containing exactly one object per hotel, with
+        "hotel_id" copied from the input and {output_fields}.
+        """
+
+        def usable(text):
+            parsed = parse_batch_response(text)
+            return all(
+                not validate_fields(stage, parsed.get(str(item_entry['hotel_id'])))[1]
+                for item_entry in entries
+            )
+
+        self.metrics.inc('llm_results_total', len(items), stage=stage)
+        text = self._make_request(
+            prompt, self.generation_config(stage, per_hotel=per_hotel, hotels=len(items)), stage=stage,
+            validate=usable, system=system,
+        )
+        parsed = parse_batch_response(text)
+
+        results, broken = {}, {}
+        for item, item_entry in zip(items, entries):
+            hotel_id = str(item_entry['hotel_id'])
+            values, problems = validate_fields(stage, parsed.get(hotel_id))
+            if problems:
+                broken[hotel_id] = (item, item_entry, values, problems)
+            else:
+                results[hotel_id] = build_result(stage, values)
+
+        if broken and text:
+            self.metrics.inc('llm_parse_failures_total', len(broken), stage=stage)
+            repaired = self._repair_batch(stage, system, text, broken, per_hotel)
+            for hotel_id, (item, item_entry, values, problems) in broken.items():
+                values, problems = validate_fields(stage, {**values, **repaired.get(hotel_id, {})})
+                self.metrics.inc('llm_repairs_total', stage=stage, outcome='failure' if problems else 'success')
+                if not problems:
+                    results[hotel_id] = build_result(stage, values)
+
+        for item, item_entry in zip(items, entries):
+            hotel_id = str(item_entry['hotel_id'])
+            if hotel_id not in results:
+                with self._stats_lock:
+                    self.stats['batch_fallbacks'] += 1
+                self.metrics.inc('gemini_batch_fallbacks_total', stage=stage)
+                results[hotel_id] = fallback(item)
+        return results
+
+    def _repair_batch(
+        self, stage: str, system: str, answer: str, broken: Dict[str, tuple], per_hotel: int = 1
+    ) -> Dict[str, dict]:
+        """
+        Ask once for the bad fields of every broken hotel in a batch
+        """
+        fields = {}
+        to_fix = []
+        for hotel_id, (item, item_entry, values, problems) in broken.items():
+            fields.update({name: STAGE_FIELDS[stage][name] for name in problems})
+            to_fix.append({'hotel': item_entry, 'problems': problems})
+        schema = {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {name: field_schema(kind) for name, kind in {'hotel_id': 'STRING', **fields}.items()},
+                "required": ['hotel_id'],
+            },
+        }
+        prompt = f"""Your previous answer left some hotels missing or invalid.
+
+        Previous answer:
+        {answer}
+
+        Hotels to fix, with what was wrong:
+        {json.dumps(to_fix, ensure_ascii=False)}
+
+        Respond with a JSON array containing one object per hotel to fix, with
+        "hotel_id" copied from the input and only the fields named in its problems.
+        """
+        config = {"responseMimeType": "application/json", "responseSchema": schema}
+        limit = self.output_limit(stage, per_hotel, len(broken))
+        if limit:
+            config["maxOutputTokens"] = limit
+        text = self._make_request(prompt, config, stage=stage, system=system)
+        return parse_batch_response(text)
+
+    def rewrite_property_titles(self, hotels) -> Dict[str, Optional[str]]:
+        return self._make_batch_request(
+            hotels,
+            lambda hotel: {
+                'hotel_id': hotel.hotel_id,
+                'current_title': hotel.property_title,
+                'location': hotel.city_name,
+                'room_type': hotel.room_type,
+                'rating': f"{hotel.rating}/5",
+            },
+            """Rewrite each hotel property title below to be more engaging and descriptive.
+        Keep it concise but descriptive, include the location if relevant,
+        highlight any unique features and maintain professionalism.""",
+            '"title" set to the new title only',
+            self.rewrite_property_title,
+            stage='title',
+        )
+
+    def generate_property_descriptions(self, properties) -> Dict[str, Optional[str]]:
+        return self._make_batch_request(
+            properties,
+            lambda data: {
+                'hotel_id': data['hotel_id'],
+                'hotel': data['property_title'],
+                'location': data['city_name'],
+                'room_type': data['room_type'],
+                'rating': f"{data['rating']}/5",
+                'price': f"${data['price']} per night",
+            },
+            """Generate an engaging description for each hotel below.
+        Write 2-3 paragraphs highlighting location, amenities, and value proposition.""",
+            '"description" set to the description text',
+            self.generate_property_description,
+            stage='description',
+        )
+
+    def generate_property_summaries(self, properties) -> Dict[str, Optional[str]]:
+        return self._make_batch_request(
+            properties,
+            lambda data: {
+                'hotel_id': data['hotel_id'],
+                'name': data['property_title'],
+                'location': data['city_name'],
+                'price': f"${data['price']}",
+                'rating': f"{data['rating']}/5",
+                'description': self.fit_input('summary', data.get('description', 'Not available')),
+            },
+            """Create a brief summary for each hotel below.
+        Create a concise 2-3 sentence summary highlighting key features.""",
+            '"summary" set to the summary text',
+            self.generate_property_summary,
+            stage='summary',
+        )
+
+    def generate_property_reviews(self, properties) -> Dict[str, Tuple[Optional[float], Optional[str]]]:
+        return self._make_batch_request(
+            properties,
+            lambda data: {
+                'hotel_id': data['hotel_id'],
+                'name': data['property_title'],
+                'location': data['city_name'],
+                'price': f"${data['price']}",
+                'current_rating': f"{data['rating']}/5",
+            },
+            "Generate a hotel review for each hotel below.",
+            '"rating" set to a single number between 1 and 5 and "review" set to the detailed review text',
+            self.generate_property_review,
+            stage='review',
+        )
+
+    def generate_property_review_sets(self, properties, count: int) -> Dict[str, Optional[List[Review]]]:
+        return self._make_batch_request(
+            properties,
+            lambda data: {
+                'hotel_id': data['hotel_id'],
+                'name': data['property_title'],
+                'location': data['city_name'],
+                'price': f"${data['price']}",
+                'current_rating': f"{data['rating']}/5",
+                'personas': pick_personas(data['hotel_id'], count),
+            },
+            f"""Generate {count} different guest reviews for each hotel below, one
+        for each of its listed travellers. Each rating should reflect that
+        traveller's experience but stay close to the hotel's current rating overall.""",
+            '"reviews" set to an array with one object per listed traveller, each with '
+            '"persona", "rating" set to a single number between 1 and 5 and "review" set to the review text',
+            lambda data: self.generate_property_review_set(data, count),
+            stage='reviews',
+            per_hotel=count,
+        )
+
+
+class AsyncGeminiService:
+    """
+    Asyncio variant of GeminiService.
+
+    Each generate_* coroutine runs the blocking request in a worker thread,
+    and a bounded semaphore keeps at most ``concurrency`` requests in flight.
+    """
+
+    def __init__(self, service: Optional[GeminiService] = None, concurrency: int = 1):
+        self.service = service or GeminiService()
+        self.concurrency = max(1, concurrency)
+        self._semaphore = None
+        self._loop = None
+
+    def _get_semaphore(self) -> asyncio.BoundedSemaphore:
+        # Semaphores are bound to the loop they are first used on
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.BoundedSemaphore(self.concurrency)
+            self._loop = loop
+        return self._semaphore
+
+    async def _call(self, func, *args, **kwargs):
+        async with self._get_semaphore():
+            return await asyncio.to_thread(func, *args, **kwargs)
+
+    async def send(self, prompt: str, **kwargs) -> Reply:
+        return await self._call(self.service.send, prompt, **kwargs)
+
+    async def rewrite_property_title(self, hotel) -> Optional[str]:
+        return await self._call(self.service.rewrite_property_title, hotel)
+
+    async def generate_property_description(self, property_data) -> Optional[str]:
+        return await self._call(self.service.generate_property_description, property_data)
+
+    async def generate_property_summary(self, property_data) -> Optional[str]:
+        return await self._call(self.service.generate_property_summary, property_data)
+
+    async def generate_property_review(self, property_data) -> Tuple[Optional[float], Optional[str]]:
+        return await self._call(self.service.generate_property_review, property_data)
+
+    async def rewrite_property_titles(self, hotels) -> Dict[str, Optional[str]]:
+        return await self._call(self.service.rewrite_property_titles, hotels)
+
+    async def generate_property_descriptions(self, properties) -> Dict[str, Optional[str]]:
+        return await self._call(self.service.generate_property_descriptions, properties)
+
+    async def generate_property_summaries(self, properties) -> Dict[str, Optional[str]]:
+        return await self._call(self.service.generate_property_summaries, properties)
+
+    async def generate_property_reviews(self, properties) -> Dict[str, Tuple[Optional[float], Optional[str]]]:
+        return await self._call(self.service.generate_property_reviews, properties)
+
+    async def generate_property_review_set(self, property_data, count: int) -> Optional[List[Review]]:
+        return await self._call(self.service.generate_property_review_set, property_data, count)
+
+    async def generate_property_review_sets(self, properties, count: int) -> Dict[str, Optional[List[Review]]]:
+        return await self._call(self.service.generate_property_review_sets, properties, count)
@@ -0,0 +1,147 @@
+# llmApp/services/hotel_api.py
+"""
+Documents served by the read API: a hotel with its latest summary and
+its reviews, built with a fixed number of queries however many hotels are
+asked for and cached per hotel until a command writes to that hotel.
+"""
+import base64
+import hashlib
+import json
+import time
+from typing import Dict, Iterable, List, Optional
+
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+from llmApp.models import Hotel, PropertyReview, PropertySummary
+
+CACHE_ALIAS = 'hotels'
+# Bump when the document layout changes so stale entries are ignored
+DOCUMENT_VERSION = 1
+HOTEL_FIELDS = (
+    'id', 'hotel_id', 'city_name', 'property_title', 'price', 'rating', 'address',
+    'latitude', 'longitude', 'room_type', 'image', 'description',
+)
+# Newest reviews included in a hotel's document
+REVIEW_LIMIT = 10
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def hotel_cache():
+    return caches[CACHE_ALIAS]
+
+
+def cache_key(hotel_id: str) -> str:
+    return f'hotel:v{DOCUMENT_VERSION}:{hotel_id}'
+
+
+def invalidate_hotels(hotel_ids: Iterable[str]):
+    """
+    Drop the cached documents of hotels whose content was just written
+    """
+    keys = [cache_key(hotel_id) for hotel_id in set(hotel_ids)]
+    if keys:
+        hotel_cache().delete_many(keys)
+
+
+def hotels_with_content():
+    """
+    Hotels with their summaries and reviews prefetched, newest first: three
+    queries for any number of hotels
+    """
+    return Hotel.objects.only(*HOTEL_FIELDS).prefetch_related(
+        Prefetch('summaries', queryset=PropertySummary.objects.order_by('-updated_at', '-id')),
+        Prefetch('reviews', queryset=PropertyReview.objects.order_by('-created_at', '-id')),
+    )
+
+
+def build_document(hotel) -> dict:
+    summaries = list(hotel.summaries.all())
+    reviews = list(hotel.reviews.all())
+    document = {field: getattr(hotel, field) for field in HOTEL_FIELDS if field != 'id'}
+    document['summary'] = summaries[0].summary if summaries else None
+    document['review_count'] = len(reviews)
+    document['review_rating'] = (
+        round(sum(review.rating for review in reviews) / len(reviews), 2) if reviews else None
+    )
+    document['reviews'] = [
+        {'rating': review.rating, 'review': review.review, 'created_at': review.created_at}
+        for review in reviews[:REVIEW_LIMIT]
+    ]
+    return json.loads(json.dumps(document, cls=DjangoJSONEncoder))
+
+
+def make_entry(document: dict) -> dict:
+    """
+    A cache entry: the document, its ETag and when it was built, which
+    serves as Last-Modified since every write drops the entry
+    """
+    body = json.dumps(document, sort_keys=True).encode()
+    return {
+        'document': document,
+        'etag': hashlib.md5(body).hexdigest(),
+        'last_modified': int(time.time()),
+    }
+
+
+def get_entries(hotel_ids: List[str]) -> Dict[str, dict]:
+    """
+    Cache entries for the given hotels, building and caching the missing
+    ones in one pass. Hotels that do not exist are left out.
+    """
+    cache = hotel_cache()
+    cached = cache.get_many([cache_key(hotel_id) for hotel_id in hotel_ids])
+    entries = {}
+    missing = []
+    for hotel_id in hotel_ids:
+        entry = cached.get(cache_key(hotel_id))
+        if entry is None:
+            missing.append(hotel_id)
+        else:
+            entries[hotel_id] = entry
+    if missing:
+        built = {
+            hotel.hotel_id: make_entry(build_document(hotel))
+            for hotel in hotels_with_content().filter(hotel_id__in=missing)
+        }
+        cache.set_many({cache_key(hotel_id): entry for hotel_id, entry in built.items()})
+        entries.update(built)
+    return entries
+
+
+def get_entry(hotel_id: str) -> Optional[dict]:
+    return get_entries([hotel_id]).get(hotel_id)
+
+
+def summary_document(document: dict) -> dict:
+    """
+    A hotel as listed: everything but the reviews themselves
+    """
+    return {key: value for key, value in document.items() if key != 'reviews'}
+
+
+def encode_cursor(last_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({'after': last_id}).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return int(data['after'])
+    except (ValueError, TypeError, KeyError):
+        raise InvalidCursor('Invalid cursor')
+
+
+def page_ids(queryset, after: Optional[int], limit: int):
+    """
+    hotel_ids of one page ordered by id after the cursor position, and the
+    cursor of the next page if there is one
+    """
+    if after is not None:
+        queryset = queryset.filter(id__gt=after)
+    rows = list(queryset.order_by('id').values_list('id', 'hotel_id')[:limit + 1])
+    next_cursor = encode_cursor(rows[limit - 1][0]) if len(rows) > limit else None
+    return [hotel_id for _, hotel_id in rows[:limit]], next_cursor
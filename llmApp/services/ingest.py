@@ -0,0 +1,274 @@
+# llmApp/services/ingest.py
+"""
+Bulk loading of scraped hotels into the hotels table.
+
+Records are read lazily from JSONL or CSV files (or another Postgres
+database), validated, and written a chunk at a time. On PostgreSQL each
+chunk is COPYed into a temporary staging table and merged into hotels with
+one INSERT ... ON CONFLICT (hotel_id) DO UPDATE; other databases fall back
+to bulk_create with update_conflicts. Memory use depends on the chunk size,
+not the size of the input.
+"""
+import csv
+import gzip
+import io
+import json
+import sys
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.db import connection as default_connection, transaction
+from llmApp.models import Hotel
+from llmApp.services.hotel_api import invalidate_hotels
+
+# Scraped columns written by the loader; generated content and its
+# fingerprints are left alone
+COLUMNS = (
+    'hotel_id', 'city_name', 'property_title', 'price', 'rating', 'address',
+    'latitude', 'longitude', 'room_type', 'image', 'local_image_path',
+)
+REQUIRED = ('hotel_id', 'city_name', 'property_title', 'price', 'rating', 'latitude', 'longitude')
+NUMERIC = ('price', 'rating', 'latitude', 'longitude')
+STAGING_TABLE = 'hotels_ingest'
+FORMATS = ('jsonl', 'csv')
+
+
+class InvalidRecord(ValueError):
+    pass
+
+
+def max_lengths() -> Dict[str, int]:
+    return {
+        column: Hotel._meta.get_field(column).max_length
+        for column in COLUMNS
+        if getattr(Hotel._meta.get_field(column), 'max_length', None)
+    }
+
+
+def clean_record(record: dict, lengths: Optional[Dict[str, int]] = None) -> tuple:
+    """
+    The values of COLUMNS for one input record, raising InvalidRecord when
+    a required field is missing or a value does not fit its column
+    """
+    if not isinstance(record, dict):
+        raise InvalidRecord('Expected an object')
+    lengths = max_lengths() if lengths is None else lengths
+    values = []
+    for column in COLUMNS:
+        value = record.get(column)
+        if isinstance(value, str):
+            value = value.strip()
+        if value is None or value == '':
+            if column in REQUIRED:
+                raise InvalidRecord(f"{column} is required")
+            value = ''
+        elif column in NUMERIC:
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                raise InvalidRecord(f"{column} must be a number, got {value!r}")
+        else:
+            value = str(value)
+            if column in lengths and len(value) > lengths[column]:
+                raise InvalidRecord(f"{column} is longer than {lengths[column]} characters")
+        values.append(value)
+    return tuple(values)
+
+
+def open_source(path: str) -> IO:
+    """
+    Open an input file as text; '-' is stdin and .gz files are decompressed
+    """
+    if path == '-':
+        return sys.stdin
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, encoding='utf-8', newline='')
+
+
+def detect_format(path: str) -> str:
+    name = path[:-3] if path.endswith('.gz') else path
+    return 'csv' if name.endswith('.csv') else 'jsonl'
+
+
+def iter_records(handle: IO, format: str) -> Iterator[Tuple[int, object]]:
+    """
+    Yield (line number, record) pairs; unparsable JSON lines are yielded as
+    InvalidRecord so the caller can count them and carry on
+    """
+    if format == 'csv':
+        reader = csv.DictReader(handle)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line_number, line in enumerate(handle, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError as e:
+            yield line_number, InvalidRecord(f"Invalid JSON: {e}")
+
+
+def iter_postgres_records(dsn: str, table: str, chunk_size: int = 10000) -> Iterator[Tuple[int, dict]]:
+    """
+    Stream hotels from another PostgreSQL database through a server-side cursor
+    """
+    import psycopg2
+    from psycopg2 import sql
+
+    source = psycopg2.connect(dsn)
+    try:
+        with source.cursor(name='fetch_data') as cursor:
+            cursor.itersize = chunk_size
+            query = sql.SQL('SELECT {} FROM {}').format(
+                sql.SQL(', ').join(map(sql.Identifier, COLUMNS)),
+                sql.Identifier(*table.split('.')),
+            )
+            cursor.execute(query)
+            for number, row in enumerate(cursor, start=1):
+                yield number, dict(zip(COLUMNS, row))
+    finally:
+        source.close()
+
+
+def to_csv(rows: Iterable[tuple]) -> io.StringIO:
+    """
+    Rows as CSV for COPY, each prefixed with its position so the last copy
+    of a repeated hotel_id wins
+    """
+    buffer = io.StringIO()
+    # Quoted, so empty strings are not read back as NULL
+    writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC)
+    for number, row in enumerate(rows):
+        writer.writerow((number,) + row)
+    buffer.seek(0)
+    return buffer
+
+
+def copy_from(cursor, statement: str, data: IO):
+    """
+    Run COPY ... FROM STDIN with psycopg2 or psycopg 3
+    """
+    if hasattr(cursor, 'copy_expert'):
+        cursor.copy_expert(statement, data)
+        return
+    with cursor.copy(statement) as copy:
+        while True:
+            block = data.read(65536)
+            if not block:
+                break
+            copy.write(block)
+
+
+class HotelLoader:
+    """
+    Upsert cleaned hotel rows by hotel_id.
+
+    Rewritten titles survive a reload: for a hotel whose title has been
+    rewritten (original_title is set), the scraped title goes to
+    original_title and the rewrite stays, so the title is only regenerated
+    when the scraped title actually changed.
+    """
+
+    def __init__(self, connection=None):
+        self.connection = connection or default_connection
+
+    @property
+    def uses_copy(self) -> bool:
+        return self.connection.vendor == 'postgresql'
+
+    def load(self, rows: List[tuple]) -> Dict[str, int]:
+        """
+        Write one chunk in its own transaction, returning how many hotels
+        were inserted, updated and left unchanged
+        """
+        if not rows:
+            return {'inserted': 0, 'updated': 0, 'unchanged': 0}
+        with transaction.atomic(using=self.connection.alias):
+            if self.uses_copy:
+                inserted, updated = self._load_copy(rows)
+            else:
+                inserted, updated = self._load_orm(rows)
+        if updated:
+            invalidate_hotels(row[0] for row in rows)
+        return {'inserted': inserted, 'updated': updated, 'unchanged': len(rows) - inserted - updated}
+
+    def _create_staging(self, cursor):
+        # Lives for the session; emptied before each chunk
+        column_types = ', '.join(
+            f'{column} double precision' if column in NUMERIC else f'{column} text'
+            for column in COLUMNS
+        )
+        cursor.execute(f'CREATE TEMPORARY TABLE IF NOT EXISTS {STAGING_TABLE} (seq bigint, {column_types})')
+        cursor.execute(f'TRUNCATE {STAGING_TABLE}')
+
+    def merge_sql(self) -> str:
+        columns = ', '.join(COLUMNS)
+        scraped = [column for column in COLUMNS if column not in ('hotel_id', 'property_title')]
+        assignments = ',\n                '.join(f'{column} = EXCLUDED.{column}' for column in scraped)
+        current = ', '.join(f'hotels.{column}' for column in scraped)
+        incoming = ', '.join(f'EXCLUDED.{column}' for column in scraped)
+        return f"""
+            WITH upserted AS (
+                INSERT INTO hotels ({columns})
+                SELECT DISTINCT ON (hotel_id) {columns}
+                FROM {STAGING_TABLE}
+                ORDER BY hotel_id, seq DESC
+                ON CONFLICT (hotel_id) DO UPDATE SET
+                {assignments},
+                property_title = CASE WHEN hotels.original_title IS NULL
+                    THEN EXCLUDED.property_title ELSE hotels.property_title END,
+                original_title = CASE WHEN hotels.original_title IS NULL
+                    THEN NULL ELSE EXCLUDED.property_title END
+                WHERE ({current}, COALESCE(hotels.original_title, hotels.property_title))
+                    IS DISTINCT FROM ({incoming}, EXCLUDED.property_title)
+                RETURNING (xmax = 0) AS inserted
+            )
+            SELECT COUNT(*) FILTER (WHERE inserted), COUNT(*) FILTER (WHERE NOT inserted) FROM upserted
+        """
+
+    def _load_copy(self, rows) -> Tuple[int, int]:
+        with self.connection.cursor() as cursor:
+            self._create_staging(cursor)
+            copy_from(
+                cursor,
+                f"COPY {STAGING_TABLE} (seq, {', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+                to_csv(rows),
+            )
+            cursor.execute(self.merge_sql())
+            inserted, updated = cursor.fetchone()
+        return inserted, updated
+
+    def _load_orm(self, rows) -> Tuple[int, int]:
+        # The last copy of a repeated hotel_id wins, as with COPY
+        incoming = {row[0]: dict(zip(COLUMNS, row)) for row in rows}
+        existing = {
+            hotel.hotel_id: hotel
+            for hotel in Hotel.objects.using(self.connection.alias)
+            .filter(hotel_id__in=list(incoming))
+            .only(*COLUMNS, 'original_title')
+        }
+        hotels, inserted, updated = [], 0, 0
+        for hotel_id, values in incoming.items():
+            current = existing.get(hotel_id)
+            hotel = Hotel(**values)
+            if current is None:
+                inserted += 1
+            else:
+                if current.original_title is not None:
+                    hotel.original_title = values['property_title']
+                    hotel.property_title = current.property_title
+                scraped = current.original_title if current.original_title is not None else current.property_title
+                if all(getattr(current, column) == values[column] for column in COLUMNS if column != 'property_title') \
+                        and scraped == values['property_title']:
+                    continue
+                updated += 1
+            hotels.append(hotel)
+        Hotel.objects.using(self.connection.alias).bulk_create(
+            hotels,
+            update_conflicts=True,
+            unique_fields=['hotel_id'],
+            update_fields=[column for column in COLUMNS if column != 'hotel_id'] + ['original_title'],
+        )
+        return inserted, updated
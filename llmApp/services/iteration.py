@@ -0,0 +1,47 @@
+# llmApp/services/iteration.py
+from typing import Iterable, Iterator, List, Optional
+
+from django.db.models import QuerySet
+
+
+def iter_keyset_pages(
+    queryset: QuerySet,
+    page_size: int = 500,
+    fields: Optional[Iterable[str]] = None,
+) -> Iterator[List]:
+    """
+    Walk ``queryset`` in primary key order, one page at a time.
+
+    Each page is fetched with ``id > last_id`` instead of an OFFSET, so rows
+    that drop out of the filter while earlier pages are processed do not
+    shift later pages, and every page query costs the same regardless of
+    how deep into the table it is. ``fields`` limits the columns loaded.
+    """
+    page_size = max(1, page_size)
+    queryset = queryset.order_by('pk')
+    if fields:
+        queryset = queryset.only(*fields)
+
+    last_pk = None
+    while True:
+        page_query = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        # iterator() streams the rows through a server-side cursor on Postgres
+        page = list(page_query[:page_size].iterator(chunk_size=page_size))
+        if not page:
+            return
+        last_pk = page[-1].pk
+        yield page
+        if len(page) < page_size:
+            return
+
+
+def iter_keyset(
+    queryset: QuerySet,
+    page_size: int = 500,
+    fields: Optional[Iterable[str]] = None,
+) -> Iterator:
+    """
+    Flat variant of iter_keyset_pages yielding one object at a time
+    """
+    for page in iter_keyset_pages(queryset, page_size, fields):
+        yield from page
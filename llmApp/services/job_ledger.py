@@ -0,0 +1,320 @@
+# llmApp/services/job_ledger.py
+import os
+import socket
+import uuid
+from datetime import timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Q, QuerySet, Sum
+from django.utils import timezone
+from llmApp.models import GenerationJob, GenerationTask, Hotel
+from llmApp.services.iteration import iter_keyset_pages
+
+
+def poison_hotel_ids(stage: str, max_attempts: int, exclude_job: Optional[GenerationJob] = None) -> QuerySet:
+    """
+    hotel_ids that have failed ``stage`` at least ``max_attempts`` times
+    since they last succeeded at it, not counting attempts made in
+    ``exclude_job``
+    """
+    later_success = GenerationTask.objects.filter(
+        hotel_id=OuterRef('hotel_id'),
+        stage=stage,
+        status=GenerationTask.STATUS_SUCCEEDED,
+        updated_at__gt=OuterRef('updated_at'),
+    )
+    tasks = GenerationTask.objects.filter(stage=stage, status=GenerationTask.STATUS_FAILED).filter(~Exists(later_success))
+    if exclude_job is not None:
+        tasks = tasks.exclude(job=exclude_job)
+    return (
+        tasks
+        .values('hotel_id')
+        .annotate(total_attempts=Sum('attempts'))
+        .filter(total_attempts__gte=max(1, max_attempts))
+        .values('hotel_id')
+    )
+
+
+class JobLedger:
+    """
+    Durable record of one generation run: a GenerationTask row per
+    (hotel_id, stage) with its status, attempt count and last error.
+
+    A run that dies part way can be picked up with ``resume(job_id)``, which
+    only loads hotels that still have runnable tasks. Failed tasks are
+    retried only when ``retry_failed`` is set, and hotels that have failed a
+    stage ``max_attempts`` times across earlier jobs are left out of new
+    jobs, so a poison hotel stops burning quota on every run.
+
+    Several workers, on one host or many, can share a job: each claims a
+    page of hotels with ``SELECT ... FOR UPDATE SKIP LOCKED`` and leases
+    their tasks for ``lease_seconds``. Tasks under a live lease are left
+    alone by other workers; if a worker dies, its tasks become claimable
+    again once the lease runs out. Leases are renewed whenever the worker
+    flushes outcomes, outcomes are only written to tasks it still holds,
+    and results are only saved for those (see lock_leased), so a worker
+    that stalls past its lease cannot overwrite the one that took over.
+    """
+
+    def __init__(
+        self,
+        job: GenerationJob,
+        max_attempts: int = 3,
+        retry_failed: bool = False,
+        flush_size: int = 100,
+        lease_seconds: float = 1800,
+        worker_id: Optional[str] = None,
+    ):
+        self.job = job
+        self.max_attempts = max(1, max_attempts)
+        self.retry_failed = retry_failed
+        self.flush_size = max(1, flush_size)
+        self.lease = timedelta(seconds=lease_seconds)
+        self.worker_id = worker_id or self.make_worker_id()
+        # Tasks that failed after this point are not retried by this worker
+        self.started_at = timezone.now()
+        self._dirty = {}
+
+    @staticmethod
+    def make_worker_id() -> str:
+        return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    @classmethod
+    def start(cls, command: str, stages: Iterable[str], options: Optional[dict] = None, **kwargs) -> 'JobLedger':
+        job = GenerationJob.objects.create(
+            command=command,
+            stages=','.join(stages),
+            options=options or {},
+        )
+        return cls(job, **kwargs)
+
+    @classmethod
+    def resume(cls, job: GenerationJob, **kwargs) -> 'JobLedger':
+        """
+        Reopen an earlier job
+        """
+        job.status = GenerationJob.STATUS_RUNNING
+        job.finished_at = None
+        job.save(update_fields=['status', 'finished_at', 'updated_at'])
+        return cls(job, **kwargs)
+
+    @property
+    def stage_names(self) -> List[str]:
+        return [name for name in self.job.stages.split(',') if name]
+
+    def runnable_tasks(self) -> QuerySet:
+        """
+        Tasks this worker may claim: pending ones, running ones whose lease
+        has run out and, with retry_failed, failed ones with attempts left
+        """
+        now = timezone.now()
+        runnable = (
+            Q(status=GenerationTask.STATUS_PENDING)
+            | Q(status=GenerationTask.STATUS_RUNNING, lease_expires_at__isnull=True)
+            | Q(status=GenerationTask.STATUS_RUNNING, lease_expires_at__lt=now)
+        )
+        if self.retry_failed:
+            # Each task gets at most max_attempts tries per job, and one per run
+            runnable |= Q(
+                status=GenerationTask.STATUS_FAILED,
+                attempts__lt=self.max_attempts,
+                updated_at__lt=self.started_at,
+            )
+        return self.job.tasks.filter(runnable)
+
+    def poison_hotel_ids(self, stage: str) -> QuerySet:
+        """
+        hotel_ids that have used up their attempts at ``stage`` in earlier jobs
+        """
+        return poison_hotel_ids(stage, self.max_attempts, exclude_job=self.job)
+
+    def seed(self, hotels: QuerySet, stages: Iterable[str], page_size: int = 1000) -> int:
+        """
+        Create a pending task for every hotel in ``hotels`` and stage, skipping
+        poison hotels unless retry_failed is set. Returns the tasks created;
+        the ones skipped are counted in the job's ``left_out``.
+        """
+        # Tasks that already exist are dropped by ignore_conflicts, so the
+        # tasks created are counted from the table rather than the batches
+        existing = self.job.tasks.count()
+        left_out = 0
+        for stage in stages:
+            stage_hotels = hotels
+            if not self.retry_failed:
+                left_out += hotels.filter(hotel_id__in=self.poison_hotel_ids(stage)).count()
+                stage_hotels = stage_hotels.exclude(hotel_id__in=self.poison_hotel_ids(stage))
+            for page in iter_keyset_pages(stage_hotels, page_size, ['hotel_id']):
+                tasks = [GenerationTask(job=self.job, hotel_id=hotel.hotel_id, stage=stage) for hotel in page]
+                GenerationTask.objects.bulk_create(tasks, ignore_conflicts=True)
+        if left_out:
+            self.job.left_out = left_out
+            self.job.save(update_fields=['left_out', 'updated_at'])
+        return self.job.tasks.count() - existing
+
+    def hotels(self, queryset: Optional[QuerySet] = None) -> QuerySet:
+        """
+        Narrow ``queryset`` (all hotels by default) to those with runnable tasks
+        """
+        queryset = Hotel.objects.all() if queryset is None else queryset
+        return queryset.filter(Exists(self.runnable_tasks().filter(hotel_id=OuterRef('hotel_id'))))
+
+    def claim(self, queryset: QuerySet, limit: int, fields: Optional[Iterable[str]] = None) -> List:
+        """
+        Lease the runnable tasks of up to ``limit`` hotels from ``queryset``,
+        returning the hotels with their leased tasks attached as
+        ``hotel.generation_tasks`` keyed by stage name. An empty list means
+        there is nothing left to claim.
+        """
+        while True:
+            found, claimed = self._claim_page(queryset, limit, fields)
+            # A page can come back empty when other workers took every task
+            # on it between our select and update; try the next one
+            if claimed or not found:
+                return claimed
+
+    def _claim_page(self, queryset, limit, fields):
+        with transaction.atomic():
+            hotels = self.hotels(queryset).order_by('pk')
+            if fields:
+                hotels = hotels.only(*fields)
+            # Hotels another worker is claiming right now are skipped, not waited on
+            hotels = list(hotels.select_for_update(skip_locked=True, of=('self',))[:max(1, limit)])
+            if not hotels:
+                return False, []
+            hotel_ids = [hotel.hotel_id for hotel in hotels]
+            now = timezone.now()
+            self.runnable_tasks().filter(hotel_id__in=hotel_ids).update(
+                status=GenerationTask.STATUS_RUNNING,
+                lease_owner=self.worker_id,
+                lease_expires_at=now + self.lease,
+                updated_at=now,
+            )
+            tasks: Dict[str, Dict[str, GenerationTask]] = {}
+            leased = self.job.tasks.filter(
+                hotel_id__in=hotel_ids,
+                status=GenerationTask.STATUS_RUNNING,
+                lease_owner=self.worker_id,
+            )
+            for task in leased:
+                tasks.setdefault(task.hotel_id, {})[task.stage] = task
+
+        claimed = []
+        for hotel in hotels:
+            if hotel.hotel_id in tasks:
+                hotel.generation_tasks = tasks[hotel.hotel_id]
+                claimed.append(hotel)
+        return True, claimed
+
+    def iter_pages(self, queryset: QuerySet, page_size: int = 500, fields: Optional[Iterable[str]] = None) -> Iterator[List]:
+        """
+        Claim and yield pages of hotels until none with runnable tasks are left
+        """
+        while True:
+            page = self.claim(queryset, page_size, fields)
+            if not page:
+                return
+            yield page
+
+    def get_task(self, hotel, stage: str) -> Optional[GenerationTask]:
+        return getattr(hotel, 'generation_tasks', {}).get(stage)
+
+    def has_failures(self, hotel) -> bool:
+        return any(
+            task.status == GenerationTask.STATUS_FAILED
+            for task in getattr(hotel, 'generation_tasks', {}).values()
+        )
+
+    def mark(self, hotel, stage: str, status: str, error: str = '') -> bool:
+        """
+        Record the outcome of a task; returns False if the hotel has no task
+        for this stage in the job. Nothing is written until flush(), so this
+        is safe to call from the pipeline's event loop.
+        """
+        task = self.get_task(hotel, stage)
+        if task is None:
+            return False
+        if status in (GenerationTask.STATUS_SUCCEEDED, GenerationTask.STATUS_FAILED):
+            task.attempts += 1
+        task.status = status
+        task.last_error = error
+        task.updated_at = timezone.now()
+        self._dirty[task.pk] = task
+        return True
+
+    def held_tasks(self) -> QuerySet:
+        """
+        Running tasks still leased by this worker
+        """
+        return self.job.tasks.filter(status=GenerationTask.STATUS_RUNNING, lease_owner=self.worker_id)
+
+    def renew_leases(self) -> int:
+        now = timezone.now()
+        return self.held_tasks().update(lease_expires_at=now + self.lease, updated_at=now)
+
+    def lock_leased(self, pairs: Iterable[Tuple[str, str]]) -> Set[Tuple[str, str]]:
+        """
+        The (hotel_id, stage) ``pairs`` whose tasks this worker still holds,
+        locked until the surrounding transaction ends so no other worker
+        can take them over while their results are saved
+        """
+        pairs = set(pairs)
+        held = (
+            self.held_tasks()
+            .filter(hotel_id__in={hotel_id for hotel_id, _ in pairs})
+            .select_for_update()
+            .values_list('hotel_id', 'stage')
+        )
+        return pairs & set(held)
+
+    def flush(self, full_only: bool = False) -> int:
+        """
+        Write the recorded outcomes of tasks this worker still holds and
+        renew its leases; with ``full_only`` only once ``flush_size`` of
+        them are waiting. Returns the outcomes written.
+        """
+        if not self._dirty or (full_only and len(self._dirty) < self.flush_size):
+            return 0
+        tasks, self._dirty = list(self._dirty.values()), {}
+        # Tasks another worker took over after our lease ran out keep its outcome
+        written = GenerationTask.objects.filter(lease_owner=self.worker_id).bulk_update(
+            tasks, ['status', 'attempts', 'last_error', 'updated_at']
+        )
+        self.renew_leases()
+        return written
+
+    def skip_remaining(self, still_needed: QuerySet) -> int:
+        """
+        Mark pending tasks as skipped when their hotel is no longer in
+        ``still_needed``, e.g. because it was filled in some other way
+        """
+        self.flush()
+        return (
+            self.job.tasks
+            .filter(status=GenerationTask.STATUS_PENDING)
+            .exclude(hotel_id__in=still_needed.values('hotel_id'))
+            .update(status=GenerationTask.STATUS_SKIPPED, updated_at=timezone.now())
+        )
+
+    def counts(self) -> Dict[str, int]:
+        counts = {status: 0 for status, _ in GenerationTask.STATUS_CHOICES}
+        for row in self.job.tasks.values('status').annotate(total=Count('id')).order_by():
+            counts[row['status']] = row['total']
+        return counts
+
+    def finish(self, interrupted: bool = False) -> Dict[str, int]:
+        self.flush()
+        counts = self.counts()
+        if interrupted:
+            status = GenerationJob.STATUS_INTERRUPTED
+        elif (
+            counts[GenerationTask.STATUS_PENDING] or counts[GenerationTask.STATUS_RUNNING]
+            or counts[GenerationTask.STATUS_FAILED] or self.job.left_out
+        ):
+            status = GenerationJob.STATUS_INCOMPLETE
+        else:
+            status = GenerationJob.STATUS_COMPLETED
+        self.job.status = status
+        self.job.finished_at = timezone.now()
+        self.job.save(update_fields=['status', 'finished_at', 'updated_at'])
+        return counts
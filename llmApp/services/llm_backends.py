@@ -0,0 +1,232 @@
+# llmApp/services/llm_backends.py
+"""
+Model servers GeminiService can send prompts to.
+
+A backend turns a prompt into an HTTP request and the response back into
+text and token usage; retries, rate limiting, caching and metrics stay in
+GeminiService. Backends are named by a spec string such as ``gemini``,
+``gemini:gemini-1.5-pro``, ``ollama:llama3.2`` or ``ollama-chat:qwen2.5``.
+"""
+import os
+from typing import Dict, Optional, Tuple
+
+GEMINI_DEFAULT_MODEL = 'gemini-1.5-flash'
+OLLAMA_DEFAULT_MODEL = 'llama3.2'
+
+
+def json_schema(schema: dict) -> dict:
+    """
+    Convert a Gemini responseSchema (upper case OpenAPI types) to JSON Schema
+    """
+    converted = {}
+    for key, value in schema.items():
+        if key == 'type' and isinstance(value, str):
+            converted[key] = value.lower()
+        elif key == 'properties':
+            converted[key] = {name: json_schema(field) for name, field in value.items()}
+        elif key == 'items':
+            converted[key] = json_schema(value)
+        else:
+            converted[key] = value
+    return converted
+
+
+class LLMBackend:
+    name = None
+    # Whether calls go through the shared Gemini rate limiter
+    rate_limited = True
+
+    def __init__(self, model: str):
+        self.model = model
+
+    def __repr__(self) -> str:
+        return f"{self.name}:{self.model}"
+
+    @property
+    def cache_model(self) -> str:
+        """
+        Model name used in response cache keys
+        """
+        return f"{self.name}:{self.model}"
+
+    def url(self) -> str:
+        raise NotImplementedError
+
+    def params(self) -> dict:
+        """
+        Query string parameters sent with every request
+        """
+        return {}
+
+    def build_payload(self, prompt: str, generation_config: Optional[dict] = None, system: Optional[str] = None) -> dict:
+        raise NotImplementedError
+
+    def parse_response(self, result: dict) -> Tuple[Optional[str], Dict[str, int]]:
+        """
+        Return the generated text and the token usage as ``prompt``,
+        ``response`` and ``total`` counts, plus ``cached`` prompt tokens the
+        server reused from an earlier request
+        """
+        raise NotImplementedError
+
+
+class GeminiBackend(LLMBackend):
+    name = 'gemini'
+
+    def __init__(self, model: Optional[str] = None, base_url: Optional[str] = None, api_key: Optional[str] = None):
+        super().__init__(model or os.getenv('GEMINI_MODEL', GEMINI_DEFAULT_MODEL))
+        # GEMINI_BASE_URL points the service elsewhere, e.g. at llmApp.services.fake_gemini
+        self.base_url = base_url or os.getenv('GEMINI_BASE_URL', "https://generativelanguage.googleapis.com/v1beta/models")
+        self.api_key = api_key or os.getenv('GEMINI_API_KEY')
+
+    @property
+    def cache_model(self) -> str:
+        # Plain model name, so responses cached before backends existed still match
+        return self.model
+
+    def url(self) -> str:
+        return f"{self.base_url}/{self.model}:generateContent"
+
+    def params(self) -> dict:
+        return {'key': self.api_key}
+
+    def build_payload(self, prompt, generation_config=None, system=None):
+        payload = {
+            "contents": [{
+                "parts": [{"text": prompt}]
+            }]
+        }
+        if system:
+            payload["systemInstruction"] = {"parts": [{"text": system}]}
+        if generation_config:
+            payload["generationConfig"] = generation_config
+        return payload
+
+    def parse_response(self, result):
+        text = None
+        if 'candidates' in result and len(result['candidates']) > 0:
+            text = result['candidates'][0]['content']['parts'][0]['text']
+        usage = result.get('usageMetadata') or {}
+        return text, {
+            'prompt': usage.get('promptTokenCount', 0),
+            'response': usage.get('candidatesTokenCount', 0),
+            'total': usage.get('totalTokenCount', 0),
+            'cached': usage.get('cachedContentTokenCount', 0),
+        }
+
+
+class OllamaBackend(LLMBackend):
+    """
+    A local Ollama server, through /api/generate or, with ``chat``, /api/chat.
+
+    ``keep_alive`` keeps the model loaded between requests so bulk runs do not
+    pay the load time again, and ``options`` are passed through as Ollama
+    model options (e.g. num_ctx, num_batch, num_predict). Requests run in
+    parallel up to the command's --concurrency; the server's
+    OLLAMA_NUM_PARALLEL decides how many it decodes at once.
+    """
+    name = 'ollama'
+    rate_limited = False
+
+    def __init__(
+        self,
+        model: Optional[str] = None,
+        base_url: Optional[str] = None,
+        chat: bool = False,
+        keep_alive: Optional[str] = None,
+        options: Optional[dict] = None,
+    ):
+        super().__init__(model or os.getenv('OLLAMA_MODEL', OLLAMA_DEFAULT_MODEL))
+        self.base_url = (base_url or os.getenv('OLLAMA_HOST', 'http://localhost:11434')).rstrip('/')
+        self.chat = chat
+        self.keep_alive = keep_alive or os.getenv('OLLAMA_KEEP_ALIVE', '30m')
+        self.options = options if options is not None else self.options_from_env()
+
+    @staticmethod
+    def options_from_env() -> dict:
+        options = {}
+        for option in ('num_ctx', 'num_batch', 'num_predict'):
+            value = os.getenv(f'OLLAMA_{option.upper()}')
+            if value:
+                options[option] = int(value)
+        return options
+
+    @property
+    def cache_model(self) -> str:
+        return f"{self.name}-{'chat' if self.chat else 'generate'}:{self.model}"
+
+    def url(self) -> str:
+        return f"{self.base_url}/api/{'chat' if self.chat else 'generate'}"
+
+    def build_payload(self, prompt, generation_config=None, system=None):
+        payload = {'model': self.model, 'stream': False, 'keep_alive': self.keep_alive}
+        if self.chat:
+            payload['messages'] = [{'role': 'user', 'content': prompt}]
+            if system:
+                payload['messages'].insert(0, {'role': 'system', 'content': system})
+        else:
+            payload['prompt'] = prompt
+            if system:
+                payload['system'] = system
+        options = dict(self.options)
+        generation_config = generation_config or {}
+        if generation_config.get('responseSchema'):
+            # Ollama constrains the output to a JSON schema given as format
+            payload['format'] = json_schema(generation_config['responseSchema'])
+        elif generation_config.get('responseMimeType') == 'application/json':
+            payload['format'] = 'json'
+        if 'temperature' in generation_config:
+            options['temperature'] = generation_config['temperature']
+        if 'maxOutputTokens' in generation_config:
+            options['num_predict'] = generation_config['maxOutputTokens']
+        if options:
+            payload['options'] = options
+        return payload
+
+    def parse_response(self, result):
+        if self.chat:
+            text = (result.get('message') or {}).get('content')
+        else:
+            text = result.get('response')
+        prompt_tokens = result.get('prompt_eval_count', 0)
+        response_tokens = result.get('eval_count', 0)
+        return text or None, {
+            'prompt': prompt_tokens,
+            'response': response_tokens,
+            'total': prompt_tokens + response_tokens,
+            'cached': 0,
+        }
+
+
+BACKENDS = {
+    'gemini': GeminiBackend,
+    'ollama': OllamaBackend,
+    'ollama-chat': lambda model=None: OllamaBackend(model, chat=True),
+}
+
+
+def get_backend(spec: Optional[str] = None) -> LLMBackend:
+    """
+    Build a backend from ``name[:model]``, defaulting to LLM_BACKEND or Gemini
+    """
+    spec = (spec or os.getenv('LLM_BACKEND') or 'gemini').strip()
+    name, _, model = spec.partition(':')
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown LLM backend '{name}'; choose from {', '.join(BACKENDS)}")
+    return BACKENDS[name](model or None)
+
+
+def parse_stage_backends(value: Optional[str]) -> Dict[str, LLMBackend]:
+    """
+    Parse ``stage=spec`` pairs separated by commas, e.g.
+    ``title=ollama:llama3.2,review=gemini``
+    """
+    backends = {}
+    for pair in (value or '').split(','):
+        if not pair.strip():
+            continue
+        stage, separator, spec = pair.partition('=')
+        if not separator or not stage.strip() or not spec.strip():
+            raise ValueError(f"Expected stage=backend, got '{pair.strip()}'")
+        backends[stage.strip()] = get_backend(spec)
+    return backends
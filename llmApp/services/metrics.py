@@ -0,0 +1,265 @@
+# llmApp/services/metrics.py
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+# Latency buckets in seconds, shared by every histogram
+DEFAULT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+METRICS = {
+    'gemini_requests_total': ('counter', 'Gemini generateContent calls by stage and outcome'),
+    'gemini_request_seconds': ('histogram', 'Time spent on a Gemini call, retries and rate limiting included'),
+    'gemini_retries_total': ('counter', 'Gemini HTTP attempts that were retried'),
+    'gemini_throttled_total': ('counter', 'Gemini responses with status 429'),
+    'gemini_prompt_tokens_total': ('counter', 'Prompt tokens reported in usageMetadata'),
+    'gemini_response_tokens_total': ('counter', 'Response tokens reported in usageMetadata'),
+    'gemini_cached_tokens_total': ('counter', 'Prompt tokens the backend served from its context cache'),
+    'gemini_batch_fallbacks_total': ('counter', 'Hotels regenerated one at a time after a batch prompt missed them'),
+    'llm_results_total': ('counter', 'Hotel results requested from the model'),
+    'llm_parse_failures_total': ('counter', 'Hotel results that were missing, unparsable or failed validation'),
+    'llm_repairs_total': ('counter', 'Malformed results re-asked with a repair prompt, by outcome'),
+    'llm_inputs_trimmed_total': ('counter', "Prompt inputs shortened to their stage's token budget"),
+    'hotels_processed_total': ('counter', 'Hotels processed by stage and status'),
+    'llm_calls_saved_total': ('counter', 'Hotels that copied content from a near-duplicate instead of calling the model'),
+    'db_flush_seconds': ('histogram', 'Time spent writing one flush of generated content'),
+    'db_rows_written_total': ('counter', 'Rows of generated content written'),
+}
+
+
+def format_labels(labels: Dict[str, str]) -> str:
+    return ','.join(f'{key}="{value}"' for key, value in sorted(labels.items()))
+
+
+def merge_histograms(series: Dict[str, dict]) -> Optional[dict]:
+    """
+    Add up one histogram's series across all their label sets
+    """
+    merged = None
+    for histogram in series.values():
+        if merged is None:
+            merged = {'buckets': list(histogram['buckets']), 'sum': histogram['sum'], 'count': histogram['count']}
+            continue
+        merged['buckets'] = [a + b for a, b in zip(merged['buckets'], histogram['buckets'])]
+        merged['sum'] += histogram['sum']
+        merged['count'] += histogram['count']
+    return merged
+
+
+class MetricsRegistry:
+    """
+    Counters and histograms for Gemini calls and database writes.
+
+    Each process records into its own registry, which keeps totals for the
+    end-of-run summary and merges what it recorded since the last flush()
+    into a JSON file shared by every command on the host (guarded by a file
+    lock, like the rate limiter). The /metrics view renders that file in
+    the Prometheus text format.
+    """
+
+    def __init__(self, path: Optional[str] = None, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.path = path or os.path.join(tempfile.gettempdir(), 'gemini_metrics.json')
+        self.buckets = tuple(buckets)
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+        self._totals = self._empty()
+        self._unflushed = self._empty()
+
+    @classmethod
+    def from_env(cls) -> 'MetricsRegistry':
+        return cls(path=os.getenv('GEMINI_METRICS_FILE'))
+
+    @staticmethod
+    def _empty() -> dict:
+        return {'counters': {}, 'histograms': {}}
+
+    def _new_histogram(self) -> dict:
+        return {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = format_labels(labels)
+        with self._lock:
+            for state in (self._totals, self._unflushed):
+                series = state['counters'].setdefault(name, {})
+                series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = format_labels(labels)
+        with self._lock:
+            for state in (self._totals, self._unflushed):
+                histogram = state['histograms'].setdefault(name, {}).setdefault(key, self._new_histogram())
+                for index, bound in enumerate(self.buckets):
+                    if value <= bound:
+                        histogram['buckets'][index] += 1
+                histogram['sum'] += value
+                histogram['count'] += 1
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, time.monotonic() - started, **labels)
+
+    def counter_total(self, name: str) -> float:
+        with self._lock:
+            return sum(self._totals['counters'].get(name, {}).values())
+
+    def quantile(self, histogram: dict, q: float) -> Optional[float]:
+        """
+        Estimate a quantile from bucket counts, interpolating within the bucket
+        """
+        if not histogram['count']:
+            return None
+        rank = q * histogram['count']
+        lower, previous = 0.0, 0
+        for bound, cumulative in zip(self.buckets, histogram['buckets']):
+            if cumulative >= rank:
+                in_bucket = cumulative - previous
+                fraction = (rank - previous) / in_bucket if in_bucket else 1
+                return lower + (bound - lower) * fraction
+            lower, previous = bound, cumulative
+        return self.buckets[-1]
+
+    def summary(self) -> dict:
+        """
+        Totals recorded by this process, for the end-of-run JSON report
+        """
+        with self._lock:
+            totals = json.loads(json.dumps(self._totals))
+        elapsed = time.monotonic() - self.started
+        histograms = {}
+        for name, series in totals['histograms'].items():
+            histograms[name] = {
+                key: {
+                    'count': histogram['count'],
+                    'sum': round(histogram['sum'], 3),
+                    'p50': self.quantile(histogram, 0.5),
+                    'p99': self.quantile(histogram, 0.99),
+                }
+                for key, histogram in series.items()
+            }
+        hotels = sum(totals['counters'].get('hotels_processed_total', {}).values())
+        results = sum(totals['counters'].get('llm_results_total', {}).values())
+        malformed = sum(totals['counters'].get('llm_parse_failures_total', {}).values())
+        return {
+            'elapsed_seconds': round(elapsed, 3),
+            'hotels_per_second': round(hotels / elapsed, 3) if elapsed > 0 else None,
+            # Share of results that came back unusable and needed another call
+            'waste_rate': round(malformed / results, 4) if results else None,
+            'counters': totals['counters'],
+            'histograms': histograms,
+        }
+
+    @contextmanager
+    def _locked_file(self):
+        with open(self.path, 'a+') as handle:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                handle.seek(0)
+                try:
+                    state = json.loads(handle.read() or '{}')
+                except ValueError:
+                    state = {}
+                state.setdefault('counters', {})
+                state.setdefault('histograms', {})
+                yield state, handle
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def flush(self):
+        """
+        Add everything recorded since the last flush to the shared file
+        """
+        with self._lock:
+            unflushed, self._unflushed = self._unflushed, self._empty()
+        if not unflushed['counters'] and not unflushed['histograms']:
+            return
+        with self._locked_file() as (state, handle):
+            for name, series in unflushed['counters'].items():
+                target = state['counters'].setdefault(name, {})
+                for key, value in series.items():
+                    target[key] = target.get(key, 0) + value
+            for name, series in unflushed['histograms'].items():
+                target = state['histograms'].setdefault(name, {})
+                for key, histogram in series.items():
+                    merged = target.setdefault(key, self._new_histogram())
+                    if len(merged['buckets']) != len(histogram['buckets']):
+                        # Bucket layout changed; start the series over
+                        merged = target[key] = self._new_histogram()
+                    merged['buckets'] = [a + b for a, b in zip(merged['buckets'], histogram['buckets'])]
+                    merged['sum'] += histogram['sum']
+                    merged['count'] += histogram['count']
+            handle.seek(0)
+            handle.truncate()
+            handle.write(json.dumps(state))
+            handle.flush()
+
+    def read(self) -> dict:
+        """
+        Everything flushed to the shared file by any process
+        """
+        if not os.path.exists(self.path):
+            return self._empty()
+        with self._locked_file() as (state, handle):
+            return state
+
+    def render(self, state: Optional[dict] = None) -> str:
+        """
+        Render the shared metrics in the Prometheus text exposition format
+        """
+        state = self.read() if state is None else state
+        lines = []
+        for name, (kind, help_text) in METRICS.items():
+            series = state[f'{kind}s'].get(name)
+            if not series:
+                continue
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for key, value in sorted(series.items()):
+                if kind == 'counter':
+                    lines.append(f'{name}{{{key}}} {value}' if key else f'{name} {value}')
+                    continue
+                separator = ',' if key else ''
+                for bound, count in zip(self.buckets, value['buckets']):
+                    lines.append(f'{name}_bucket{{{key}{separator}le="{bound}"}} {count}')
+                lines.append(f'{name}_bucket{{{key}{separator}le="+Inf"}} {value["count"]}')
+                lines.append(f'{name}_sum{{{key}}} {value["sum"]}' if key else f'{name}_sum {value["sum"]}')
+                lines.append(f'{name}_count{{{key}}} {value["count"]}' if key else f'{name}_count {value["count"]}')
+        return '\n'.join(lines) + '\n'
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> MetricsRegistry:
+    """
+    Process-wide registry, configured from the environment on first use
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = MetricsRegistry.from_env()
+        return _registry
+
+
+def reset_registry():
+    """
+    Start a fresh registry, e.g. in a forked worker so it does not report
+    its parent's numbers again
+    """
+    global _registry
+    with _registry_lock:
+        _registry = None
@@ -0,0 +1,176 @@
+# llmApp/services/pipeline.py
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple, Union
+
+from llmApp.services.gemini_service import AsyncGeminiService
+from llmApp.services.stages import STAGES, Stage
+
+# Stages that can start once the key stage is done for a hotel. Reviews only
+# need the final title, summaries need the description.
+DEPENDENTS = {
+    None: ['title'],
+    'title': ['description', 'review'],
+    'description': ['summary'],
+    'summary': [],
+    'review': [],
+}
+
+
+class EnrichmentPipeline:
+    """
+    Streams hotels through title -> description -> summary, with reviews
+    starting as soon as the title is ready.
+
+    Each stage has its own bounded queue and pool of worker coroutines, so
+    a hotel moves on the moment its dependencies are done instead of
+    waiting for a whole stage to finish for every hotel. Results are
+    yielded to the caller in its own thread, where it can save them with
+    the Django ORM.
+
+    ``stages`` are stage names or Stage instances, e.g. a ReviewStage with
+    its own number of reviews per hotel. ``should_run(hotel, stage)``
+    replaces the default ``stage.needs`` check when given, e.g. to only run
+    the stages a job ledger still has open. Stages that depend on a failed
+    or invalid result are not run for that hotel; ``on_skip(hotel, stage)``
+    is called for each of them.
+    """
+
+    def __init__(
+        self,
+        service: AsyncGeminiService,
+        stages: Optional[List[Union[str, Stage]]] = None,
+        queue_size: int = 10,
+        workers_per_stage: Optional[int] = None,
+        force: bool = False,
+        should_run: Optional[Callable[[Any, Stage], bool]] = None,
+        on_skip: Optional[Callable[[Any, Stage], None]] = None,
+    ):
+        self.service = service
+        stages = [STAGES[stage] if isinstance(stage, str) else stage for stage in (stages or STAGES)]
+        self.stages = {stage.name: stage for stage in stages}
+        self.queue_size = max(1, queue_size)
+        self.workers_per_stage = workers_per_stage or service.concurrency
+        self.force = force
+        self.should_run = should_run or (
+            lambda hotel, stage: stage.needs(hotel, force=self.force) and not stage.copies_duplicate(hotel)
+        )
+        self.on_skip = on_skip
+
+    async def _dispatch(self, hotel, completed: Optional[str]):
+        """
+        Queue the stages that were waiting on ``completed`` for this hotel;
+        stages that are disabled or not needed are passed straight through
+        """
+        for name in DEPENDENTS[completed]:
+            stage = self.stages.get(name)
+            try:
+                run = stage is not None and self.should_run(hotel, stage)
+            except Exception as e:
+                # Report it as the stage's error rather than losing the worker
+                self._outputs.append((hotel, stage, None, e))
+                self._wakeup.set()
+                continue
+            if run:
+                self._active += 1
+                await self._queues[name].put(hotel)
+            else:
+                await self._dispatch(hotel, name)
+
+    def _skip_dependents(self, hotel, failed: str):
+        """
+        Skip the stages waiting on ``failed`` for this hotel, directly or
+        through a stage that is disabled
+        """
+        for name in DEPENDENTS[failed]:
+            stage = self.stages.get(name)
+            if stage is not None and self.on_skip is not None:
+                self.on_skip(hotel, stage)
+            self._skip_dependents(hotel, name)
+
+    async def _worker(self, stage: Stage):
+        queue = self._queues[stage.name]
+        while True:
+            hotel = await queue.get()
+            try:
+                result, error = await stage.generate(self.service, hotel), None
+            except Exception as e:
+                result, error = None, e
+            self._outputs.append((hotel, stage, result, error))
+            self._wakeup.set()
+            try:
+                # Stages built on a failed result are skipped for this hotel:
+                # they would be built from inputs that change once it is
+                # retried, and have to be generated again then
+                if error is None and stage.is_valid(result):
+                    stage.carry_forward(hotel, result)
+                    await self._dispatch(hotel, stage.name)
+                else:
+                    self._skip_dependents(hotel, stage.name)
+            finally:
+                self._active -= 1
+                queue.task_done()
+                if self._active == 0:
+                    self._wakeup.set()
+
+    async def _feed(self, hotels: List[Any]):
+        for hotel in hotels:
+            await self._dispatch(hotel, None)
+        self._wakeup.set()
+
+    async def _wait(self):
+        await self._wakeup.wait()
+        self._wakeup.clear()
+
+    def run(self, pages: Iterable[List[Any]]) -> Iterator[Tuple[Any, Stage, Any, Optional[BaseException]]]:
+        """
+        Push pages of hotels through the pipeline, yielding
+        ``(hotel, stage, result, error)`` for every stage that ran.
+
+        The next page is only fetched once the previous one has been queued,
+        so at most one page plus the queue contents are held in memory.
+        """
+        loop = asyncio.new_event_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=self.service.concurrency))
+        self._queues = {name: asyncio.Queue(maxsize=self.queue_size) for name in self.stages}
+        self._outputs = []
+        self._wakeup = asyncio.Event()
+        self._active = 0
+        workers = [
+            loop.create_task(self._worker(stage))
+            for stage in self.stages.values()
+            for _ in range(self.workers_per_stage)
+        ]
+        pages = iter(pages)
+        feeder = None
+        exhausted = False
+
+        try:
+            while True:
+                if not exhausted and (feeder is None or feeder.done()):
+                    if feeder is not None:
+                        feeder.result()
+                    page = next(pages, None)
+                    if page is None:
+                        exhausted = True
+                    else:
+                        feeder = loop.create_task(self._feed(page))
+
+                if self._outputs:
+                    outputs, self._outputs = self._outputs, []
+                    yield from outputs
+                    continue
+
+                if exhausted and (feeder is None or feeder.done()) and self._active == 0:
+                    if feeder is not None:
+                        feeder.result()
+                    return
+
+                loop.run_until_complete(self._wait())
+        finally:
+            tasks = workers + ([feeder] if feeder is not None else [])
+            for task in tasks:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            loop.run_until_complete(loop.shutdown_default_executor())
+            loop.close()
@@ -0,0 +1,197 @@
+# llmApp/services/planner.py
+"""
+Dry-run estimates for a generation run: how many requests and tokens the
+pending hotels need, what they cost and how long the run takes under the
+configured rate limits and concurrency.
+
+Prompts are built with the real templates in GeminiService for a sample
+of the pending hotels, but never sent.
+"""
+import asyncio
+import math
+import os
+from typing import Dict, List, Optional
+
+from llmApp.services.canned_responses import canned_response
+from llmApp.services.concurrency import chunked_by
+from llmApp.services.gemini_service import AsyncGeminiService, GeminiService, Reply, estimate_tokens
+from llmApp.services.llm_backends import LLMBackend
+from llmApp.services.metrics import MetricsRegistry, merge_histograms
+from llmApp.services.rate_limiter import RateLimiter
+
+# Typical answer length in tokens per hotel: a short title, 2-3 paragraphs
+# of description, 2-3 sentences of summary and one detailed review
+RESPONSE_TOKENS = {'title': 25, 'description': 250, 'summary': 80, 'review': 180}
+# Seconds per request assumed when no earlier run recorded any
+DEFAULT_LATENCY = 2.0
+# USD per million prompt and response tokens; GEMINI_PRICE_INPUT and
+# GEMINI_PRICE_OUTPUT override them for other models or price changes
+PRICES = {
+    'gemini-1.5-flash': (0.075, 0.30),
+    'gemini-1.5-flash-8b': (0.0375, 0.15),
+    'gemini-1.5-pro': (1.25, 5.00),
+    'gemini-2.0-flash': (0.10, 0.40),
+}
+
+
+class PromptRecorder(GeminiService):
+    """
+    GeminiService that records the prompts it would send and answers them
+    with canned responses, so the stages' own generate methods can be run
+    without calling the API
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('rate_limiter', RateLimiter(rpm=0))
+        kwargs.setdefault('metrics', MetricsRegistry())
+        super().__init__(use_cache=False, **kwargs)
+        self.prompts = []
+
+    def send(self, prompt, generation_config=None, stage='unknown', validate=None, system=None):
+        self.prompts.append((stage, prompt, system))
+        return Reply(canned_response(prompt, (generation_config or {}).get('responseSchema')), 0)
+
+
+def observed_latency(registry: Optional[MetricsRegistry] = None) -> Optional[float]:
+    """
+    Median request time recorded by earlier runs in the shared metrics file
+    """
+    registry = registry or MetricsRegistry.from_env()
+    histogram = merge_histograms(registry.read()['histograms'].get('gemini_request_seconds', {}))
+    if not histogram or not histogram['count']:
+        return None
+    return registry.quantile(histogram, 0.5)
+
+
+def prices(backend: LLMBackend):
+    """
+    (prompt, response) USD per million tokens for a backend, or None when unknown
+    """
+    if not backend.rate_limited:
+        # Local model servers cost nothing per token
+        return 0.0, 0.0
+    price_input, price_output = os.getenv('GEMINI_PRICE_INPUT'), os.getenv('GEMINI_PRICE_OUTPUT')
+    if price_input and price_output:
+        return float(price_input), float(price_output)
+    return PRICES.get(backend.model)
+
+
+class StagePlan:
+    """
+    Estimated work for one stage: ``hotels`` pending hotels sent in
+    ``requests`` prompts of about ``prompt_tokens`` and ``response_tokens``
+    tokens each
+    """
+
+    def __init__(self, stage: str, hotels: int, requests: int, prompt_tokens: float, response_tokens: float, backend: LLMBackend):
+        self.stage = stage
+        self.hotels = hotels
+        self.requests = requests
+        self.prompt_tokens = prompt_tokens
+        self.response_tokens = response_tokens
+        self.backend = backend
+
+    @property
+    def total_prompt_tokens(self) -> int:
+        return round(self.requests * self.prompt_tokens)
+
+    @property
+    def total_response_tokens(self) -> int:
+        return round(self.requests * self.response_tokens)
+
+    @property
+    def cost(self) -> Optional[float]:
+        price = prices(self.backend)
+        if price is None:
+            return None
+        return (self.total_prompt_tokens * price[0] + self.total_response_tokens * price[1]) / 1_000_000
+
+    def as_dict(self) -> dict:
+        return {
+            'stage': self.stage,
+            'backend': repr(self.backend),
+            'hotels': self.hotels,
+            'requests': self.requests,
+            'prompt_tokens': self.total_prompt_tokens,
+            'response_tokens': self.total_response_tokens,
+            'cost_usd': round(self.cost, 4) if self.cost is not None else None,
+        }
+
+
+def plan_stage(stage, hotels: int, sample: List, service: PromptRecorder, prompt_batch: int = 1) -> StagePlan:
+    """
+    Estimate one stage for ``hotels`` pending hotels from the prompts built
+    for ``sample``, a few of those hotels
+    """
+    prompt_batch = max(1, prompt_batch)
+    requests = math.ceil(hotels / prompt_batch)
+    backend = service.backend_for(stage.name)
+    # Reviews may come several to a hotel; answers stop at the stage's maxOutputTokens
+    response_tokens = RESPONSE_TOKENS.get(stage.name, 100)
+    response_tokens = min(response_tokens, service.output_limit(stage.name) or response_tokens)
+    response_tokens *= getattr(stage, 'per_hotel', None) or 1
+    response_tokens *= hotels / requests if requests else 0
+    if not sample:
+        return StagePlan(stage.name, hotels, requests, 0, response_tokens, backend)
+
+    async def build():
+        async_service = AsyncGeminiService(service)
+        if prompt_batch > 1:
+            for group in chunked_by(sample, prompt_batch, key=lambda hotel: hotel.city_name):
+                await stage.generate_batch(async_service, group)
+        else:
+            for hotel in sample:
+                await stage.generate(async_service, hotel)
+
+    service.prompts = []
+    asyncio.run(build())
+    prompts = service.prompts
+    prompt_tokens = sum(
+        estimate_tokens(prompt) + estimate_tokens(system or '') for _, prompt, system in prompts
+    ) / len(prompts)
+    # Batches of the sample may be smaller than prompt_batch; scale to full ones
+    hotels_per_prompt = len(sample) / len(prompts)
+    if prompt_batch > 1:
+        prompt_tokens *= prompt_batch / hotels_per_prompt
+    return StagePlan(stage.name, hotels, requests, prompt_tokens, response_tokens, backend)
+
+
+def project_seconds(
+    plans: List[StagePlan],
+    concurrency: int = 1,
+    workers: int = 1,
+    latency: float = DEFAULT_LATENCY,
+    rpm: float = 0,
+    tpm: float = 0,
+) -> Dict[str, Optional[float]]:
+    """
+    Project the run's duration: requests go out ``concurrency`` at a time in
+    each of ``workers`` processes, each taking ``latency`` seconds, and
+    requests to rate limited backends share the rpm/tpm quota. Returns the
+    seconds and which of concurrency, rpm or tpm is the bottleneck.
+    """
+    requests = sum(plan.requests for plan in plans)
+    if not requests:
+        return {'seconds': 0.0, 'bottleneck': None}
+    in_flight = max(1, concurrency) * max(1, workers)
+    seconds_by = {'concurrency': requests * latency / in_flight}
+
+    limited = [plan for plan in plans if plan.backend.rate_limited]
+    if rpm > 0 and limited:
+        seconds_by['rpm'] = sum(plan.requests for plan in limited) / rpm * 60
+    if tpm > 0 and limited:
+        tokens = sum(plan.total_prompt_tokens + plan.total_response_tokens for plan in limited)
+        seconds_by['tpm'] = tokens / tpm * 60
+    bottleneck = max(seconds_by, key=seconds_by.get)
+    return {'seconds': seconds_by[bottleneck], 'bottleneck': bottleneck}
+
+
+def format_duration(seconds: float) -> str:
+    seconds = round(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}h {minutes:02d}m"
+    if minutes:
+        return f"{minutes}m {seconds:02d}s"
+    return f"{seconds}s"
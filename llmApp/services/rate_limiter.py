@@ -0,0 +1,196 @@
+# llmApp/services/rate_limiter.py
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterable, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+# Published paid-tier requests and tokens per minute; GEMINI_RPM and
+# GEMINI_TPM override them for other tiers or models
+QUOTAS = {
+    'gemini-1.5-flash': (2000, 4_000_000),
+    'gemini-1.5-flash-8b': (4000, 4_000_000),
+    'gemini-1.5-pro': (1000, 4_000_000),
+    'gemini-2.0-flash': (2000, 4_000_000),
+}
+
+
+class RateLimiter:
+    """
+    Token-bucket limiter enforcing requests-per-minute and tokens-per-minute
+    budgets for the Gemini API.
+
+    The bucket state lives in a small JSON file guarded by an exclusive file
+    lock, so every command running on the same host draws from one shared
+    quota. The effective rate is halved whenever the API answers 429 and
+    creeps back up after a run of successful requests.
+    """
+
+    def __init__(
+        self,
+        rpm: float,
+        tpm: float = 0,
+        state_path: Optional[str] = None,
+        burst_seconds: float = 10,
+        min_scale: float = 0.05,
+        recovery_step: float = 0.1,
+        recovery_after: int = 20,
+    ):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.state_path = state_path or os.path.join(tempfile.gettempdir(), 'gemini_rate_limit.json')
+        self.burst_seconds = burst_seconds
+        self.min_scale = min_scale
+        self.recovery_step = recovery_step
+        self.recovery_after = recovery_after
+        self._thread_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, models: Iterable[str] = ()) -> 'RateLimiter':
+        """
+        Build the limiter from GEMINI_RPM / GEMINI_TPM, falling back to the
+        smallest published quota of ``models``. With neither the limiter is off.
+        """
+        quotas = [QUOTAS[model] for model in models if model in QUOTAS]
+        rpm, tpm = map(min, zip(*quotas)) if quotas else (0, 0)
+        return cls(
+            rpm=float(os.getenv('GEMINI_RPM', rpm)),
+            tpm=float(os.getenv('GEMINI_TPM', tpm)),
+            state_path=os.getenv('GEMINI_RATE_LIMIT_FILE'),
+        )
+
+    @classmethod
+    def for_backends(cls, backends) -> 'RateLimiter':
+        """
+        The limiter shared by the rate limited ones among ``backends``
+        """
+        return cls.from_env(backend.model for backend in backends if backend.rate_limited)
+
+    @property
+    def enabled(self) -> bool:
+        return self.rpm > 0 or self.tpm > 0
+
+    @contextmanager
+    def _locked_state(self):
+        """
+        Load the shared state under an exclusive lock and write it back on exit
+        """
+        with self._thread_lock, open(self.state_path, 'a+') as handle:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                handle.seek(0)
+                try:
+                    state = json.loads(handle.read() or '{}')
+                except ValueError:
+                    state = {}
+                state.setdefault('scale', 1.0)
+                state.setdefault('successes', 0)
+                yield state
+                handle.seek(0)
+                handle.truncate()
+                handle.write(json.dumps(state))
+                handle.flush()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _capacity(self, per_minute: float, scale: float) -> float:
+        return max(1.0, per_minute * scale * self.burst_seconds / 60)
+
+    def _refill(self, state: dict, now: float):
+        scale = state['scale']
+        elapsed = max(0.0, now - state.get('updated', now))
+        for key, per_minute in (('requests', self.rpm), ('tokens', self.tpm)):
+            if per_minute <= 0:
+                continue
+            capacity = self._capacity(per_minute, scale)
+            level = state.get(key, capacity)
+            state[key] = min(capacity, level + elapsed * per_minute * scale / 60)
+        state['updated'] = now
+
+    def _wait_time(self, state: dict, tokens: float) -> float:
+        scale = state['scale']
+        wait = 0.0
+        for key, per_minute, needed in (('requests', self.rpm, 1), ('tokens', self.tpm, tokens)):
+            if per_minute <= 0:
+                continue
+            needed = min(needed, self._capacity(per_minute, scale))
+            deficit = needed - state[key]
+            if deficit > 0:
+                wait = max(wait, deficit * 60 / (per_minute * scale))
+        return wait
+
+    def acquire(self, tokens: float = 0) -> float:
+        """
+        Block until one request and ``tokens`` tokens fit within the budget.
+        Returns the number of seconds spent waiting.
+        """
+        if not self.enabled:
+            return 0.0
+
+        waited = 0.0
+        while True:
+            with self._locked_state() as state:
+                now = time.time()
+                self._refill(state, now)
+                wait = self._wait_time(state, tokens)
+                if wait <= 0:
+                    if self.rpm > 0:
+                        state['requests'] -= 1
+                    if self.tpm > 0:
+                        state['tokens'] -= min(tokens, self._capacity(self.tpm, state['scale']))
+                    return waited
+            time.sleep(wait)
+            waited += wait
+
+    def adjust_tokens(self, delta: float):
+        """
+        Charge (or refund) the difference between estimated and actual usage
+        """
+        if self.tpm <= 0 or not delta:
+            return
+        with self._locked_state() as state:
+            self._refill(state, time.time())
+            state['tokens'] -= delta
+
+    def record_throttle(self):
+        """
+        Halve the shared rate after a 429 response
+        """
+        if not self.enabled:
+            return
+        with self._locked_state() as state:
+            self._refill(state, time.time())
+            state['scale'] = max(self.min_scale, state['scale'] / 2)
+            state['successes'] = 0
+            # Drain the buckets so every process backs off immediately
+            state['requests'] = min(state.get('requests', 0), 0)
+
+    def record_success(self):
+        """
+        Step the shared rate back up after enough successful requests
+        """
+        if not self.enabled:
+            return
+        with self._locked_state() as state:
+            if state['scale'] >= 1:
+                return
+            state['successes'] += 1
+            if state['successes'] >= self.recovery_after:
+                state['scale'] = min(1.0, state['scale'] + self.recovery_step)
+                state['successes'] = 0
+
+    @property
+    def scale(self) -> float:
+        if not self.enabled:
+            return 1.0
+        with self._locked_state() as state:
+            return state['scale']
@@ -0,0 +1,132 @@
+# llmApp/services/response_cache.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+DEFAULT_CACHE_PATH = Path(__file__).resolve().parent.parent.parent / 'gemini_cache.sqlite3'
+# Sets between sweeps for expired entries. Other processes add to the same
+# file, so the entry count is also re-read then.
+EVICT_INTERVAL = 1000
+
+
+class ResponseCache:
+    """
+    Persistent prompt -> response cache backed by a local SQLite file.
+
+    Entries are content-addressed by model, prompt and generation params,
+    expire after ``ttl`` seconds and the least recently used ones are evicted
+    once the cache holds more than ``max_entries`` responses. Eviction runs
+    every EVICT_INTERVAL sets or when a running count of entries goes over
+    the limit, and then makes room for a tenth of the limit, so sets do not
+    scan the table.
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl: float = 30 * 24 * 3600, max_entries: int = 200000):
+        self.path = str(path or DEFAULT_CACHE_PATH)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute(
+            '''
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            '''
+        )
+        self._connection.execute(
+            'CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses(accessed_at)'
+        )
+        self._connection.execute(
+            'CREATE INDEX IF NOT EXISTS responses_created_at ON responses(created_at)'
+        )
+        self._connection.commit()
+        (self._count,) = self._connection.execute('SELECT COUNT(*) FROM responses').fetchone()
+        self._sets_since_evict = 0
+
+    @classmethod
+    def from_env(cls) -> 'ResponseCache':
+        return cls(
+            path=os.getenv('GEMINI_CACHE_PATH'),
+            ttl=float(os.getenv('GEMINI_CACHE_TTL', 30 * 24 * 3600)),
+            max_entries=int(os.getenv('GEMINI_CACHE_MAX_ENTRIES', '200000')),
+        )
+
+    @staticmethod
+    def make_key(model: str, prompt: str, params: Optional[dict] = None) -> str:
+        prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        material = json.dumps([model, prompt_hash, params or {}], sort_keys=True)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT response, created_at FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._connection.execute('DELETE FROM responses WHERE key = ?', (key,))
+                    self._connection.commit()
+                    self._count -= 1
+                self.misses += 1
+                return None
+            self._connection.execute(
+                'UPDATE responses SET accessed_at = ? WHERE key = ?', (now, key)
+            )
+            self._connection.commit()
+            self.hits += 1
+            return row[0]
+
+    def set(self, key: str, response: str):
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO responses (key, response, created_at, accessed_at) VALUES (?, ?, ?, ?)',
+                (key, response, now, now)
+            )
+            # Replacing an entry also counts, so the count can only run high
+            self._count += 1
+            self._sets_since_evict += 1
+            if self._count > self.max_entries or self._sets_since_evict >= EVICT_INTERVAL:
+                self._evict()
+            self._connection.commit()
+
+    def _evict(self):
+        """
+        Drop expired entries and, over the limit, the least recently used
+        ones until a tenth of the limit is free
+        """
+        self._connection.execute(
+            'DELETE FROM responses WHERE created_at < ?', (time.time() - self.ttl,)
+        )
+        (count,) = self._connection.execute('SELECT COUNT(*) FROM responses').fetchone()
+        if count > self.max_entries:
+            keep = self.max_entries - self.max_entries // 10
+            self._connection.execute(
+                'DELETE FROM responses WHERE key IN '
+                '(SELECT key FROM responses ORDER BY accessed_at LIMIT ?)',
+                (count - keep,)
+            )
+            count = keep
+        self._count = count
+        self._sets_since_evict = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,536 @@
+# llmApp/services/stages.py
+from functools import reduce
+from operator import or_
+from types import SimpleNamespace
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db.models import Count, Exists, F, OuterRef, Q, QuerySet, Subquery
+from django.db.models.functions import Coalesce
+from llmApp.models import Hotel, PropertyReview, PropertySummary
+from llmApp.services.fingerprints import Source, fingerprint, fingerprint_expression
+
+
+class Stage:
+    """
+    One kind of generated content: which hotels still need it, how its
+    prompt is built from a hotel, how the response is parsed and how the
+    result is written back.
+
+    Every result is stored with a fingerprint of its ``sources`` and the
+    stage's ``template_version``, so a hotel only needs the stage again when
+    one of those inputs changed. Bump ``template_version`` when the prompt
+    changes enough that existing content should be regenerated.
+    """
+    name = None
+    template_version = 1
+    # Hotel fields the prompt is built from
+    sources = ()
+    # Hotel columns read by needs(), the prompt and apply()
+    fields = ()
+    # Hotel columns apply() writes, which later stages may be built from
+    outputs = ()
+    # Whether near-duplicate hotels copy this content from their cluster's
+    # representative instead of generating it (see llmApp.services.dedup)
+    shared = False
+
+    @property
+    def fingerprint_prefix(self) -> str:
+        return f"{self.name}:v{self.template_version}"
+
+    def fingerprint(self, hotel) -> str:
+        return fingerprint(self.fingerprint_prefix, [source.value(hotel) for source in self.sources])
+
+    def fingerprint_expression(self, ref=F):
+        return fingerprint_expression(self.fingerprint_prefix, self.sources, ref)
+
+    def annotate(self, queryset: QuerySet) -> QuerySet:
+        """
+        Add whatever annotations stale() and needs() read
+        """
+        return queryset
+
+    def stale(self, force: bool = False) -> Q:
+        """
+        Filter for annotated hotels whose content is missing or out of date,
+        or with ``force``, every hotel the stage can run for
+        """
+        raise NotImplementedError
+
+    def stale_after_adopt(self, force: bool = False) -> Q:
+        """
+        stale() as it will be once adopt() has stamped the content generated
+        before fingerprints, without writing anything
+        """
+        return self.stale(force)
+
+    def generated_here(self) -> Q:
+        """
+        Filter for hotels that get this stage from the model rather than
+        from a duplicate
+        """
+        return Q(duplicate_of__isnull=True) if self.shared else Q()
+
+    def copies_duplicate(self, hotel) -> bool:
+        return self.shared and getattr(hotel, 'duplicate_of', None) is not None
+
+    def pending(self, force: bool = False, assume_adopted: bool = False) -> QuerySet:
+        """
+        Hotels that need the stage; with ``assume_adopted``, as if adopt()
+        had run, for estimates that must not write
+        """
+        stale = self.stale_after_adopt(force) if assume_adopted else self.stale(force)
+        return self.annotate(Hotel.objects.all()).filter(stale & self.generated_here())
+
+    def adopt(self) -> int:
+        """
+        Stamp content generated before fingerprints existed with the current
+        fingerprint, so it is kept rather than regenerated wholesale
+        """
+        return 0
+
+    def needs(self, hotel, force: bool = False) -> bool:
+        """
+        Whether this hotel still needs the stage, judged from the hotel
+        itself (see annotate_progress) rather than a query per hotel
+        """
+        raise NotImplementedError
+
+    def property_data(self, hotel):
+        raise NotImplementedError
+
+    def build_prompt(self, service, hotel) -> str:
+        raise NotImplementedError
+
+    def system_instruction(self, service, hotel) -> str:
+        """
+        The system instruction sent with build_prompt()'s prompt
+        """
+        return service.system_instruction(self.name, hotel.city_name)
+
+    def parse(self, service, text: Optional[str]):
+        return service.parse_result(self.name, text)
+
+    async def generate(self, service, hotel):
+        raise NotImplementedError
+
+    async def generate_batch(self, service, hotels) -> Dict[str, object]:
+        raise NotImplementedError
+
+    def is_valid(self, result) -> bool:
+        return bool(result)
+
+    def carry_forward(self, hotel, result):
+        """
+        Copy a result onto the in-memory hotel so later stages build on it
+        """
+
+    def current_content(self, hotels) -> Dict[str, object]:
+        """
+        The stored content of up-to-date hotels keyed by hotel_id, as
+        accepted by apply_many; used to share it with their duplicates
+        """
+        raise NotImplementedError
+
+    def apply(self, hotel, result, force: bool = False) -> bool:
+        """
+        Save a single result, returning False when there was nothing to save
+        """
+        return self.apply_many([(hotel, result)], force=force) > 0
+
+    def apply_many(self, results: Iterable[Tuple[Hotel, object]], force: bool = False) -> int:
+        """
+        Save several results at once, returning how many were written
+        """
+        raise NotImplementedError
+
+
+def stale_fingerprint(field: str, expression) -> Q:
+    return Q(**{f'{field}__isnull': True}) | ~Q(**{field: expression})
+
+
+# stale() with force: content is regenerated whether or not it is up to date
+EVERY_HOTEL = Q(pk__isnull=False)
+
+
+class TitleStage(Stage):
+    name = 'title'
+    # Titles are always rewritten from the scraped title, never from an
+    # earlier rewrite, so repeated runs do not drift
+    sources = (
+        Source('original_title', fallback='property_title'),
+        Source('city_name'),
+        Source('room_type'),
+        Source('rating', scale=10),
+    )
+    fields = ('hotel_id', 'property_title', 'original_title', 'title_fingerprint', 'city_name', 'room_type', 'rating')
+    outputs = ('property_title',)
+
+    def stale(self, force=False):
+        if force:
+            return EVERY_HOTEL
+        return stale_fingerprint('title_fingerprint', self.fingerprint_expression())
+
+    def needs(self, hotel, force=False):
+        return force or hotel.title_fingerprint != self.fingerprint(hotel)
+
+    def property_data(self, hotel):
+        return SimpleNamespace(
+            hotel_id=hotel.hotel_id,
+            property_title=hotel.original_title if hotel.original_title is not None else hotel.property_title,
+            city_name=hotel.city_name,
+            room_type=hotel.room_type,
+            rating=hotel.rating,
+        )
+
+    def build_prompt(self, service, hotel):
+        return service.build_title_prompt(self.property_data(hotel))
+
+    async def generate(self, service, hotel):
+        return await service.rewrite_property_title(self.property_data(hotel))
+
+    async def generate_batch(self, service, hotels):
+        return await service.rewrite_property_titles([self.property_data(hotel) for hotel in hotels])
+
+    def keep_original(self, hotel):
+        if hotel.original_title is None:
+            hotel.original_title = hotel.property_title
+
+    def carry_forward(self, hotel, new_title):
+        if new_title:
+            self.keep_original(hotel)
+            hotel.property_title = new_title
+            hotel.title_fingerprint = self.fingerprint(hotel)
+
+    def apply_many(self, results, force=False):
+        hotels = []
+        for hotel, new_title in results:
+            if new_title:
+                self.carry_forward(hotel, new_title)
+                hotels.append(hotel)
+        Hotel.objects.bulk_update(hotels, ['property_title', 'original_title', 'title_fingerprint'])
+        return len(hotels)
+
+
+class DescriptionStage(Stage):
+    name = 'description'
+    sources = (
+        Source('property_title'),
+        Source('city_name'),
+        Source('room_type'),
+        Source('price', scale=100),
+        Source('rating', scale=10),
+    )
+    fields = (
+        'hotel_id', 'property_title', 'city_name', 'room_type', 'price', 'rating',
+        'description', 'description_fingerprint', 'duplicate_of',
+    )
+    outputs = ('description',)
+    shared = True
+
+    def stale(self, force=False):
+        if force:
+            return EVERY_HOTEL
+        return Q(description__isnull=True) | stale_fingerprint('description_fingerprint', self.fingerprint_expression())
+
+    def adopt(self):
+        return Hotel.objects.filter(
+            description__isnull=False, description_fingerprint__isnull=True
+        ).update(description_fingerprint=self.fingerprint_expression())
+
+    def stale_after_adopt(self, force=False):
+        if force:
+            return self.stale(force)
+        return self.stale(force) & ~Q(description__isnull=False, description_fingerprint__isnull=True)
+
+    def needs(self, hotel, force=False):
+        return force or hotel.description is None or hotel.description_fingerprint != self.fingerprint(hotel)
+
+    def property_data(self, hotel):
+        return {
+            'hotel_id': hotel.hotel_id,
+            'property_title': hotel.property_title,
+            'city_name': hotel.city_name,
+            'room_type': hotel.room_type,
+            'price': str(hotel.price),
+            'rating': str(hotel.rating)
+        }
+
+    def build_prompt(self, service, hotel):
+        return service.build_description_prompt(self.property_data(hotel))
+
+    async def generate(self, service, hotel):
+        return await service.generate_property_description(self.property_data(hotel))
+
+    async def generate_batch(self, service, hotels):
+        return await service.generate_property_descriptions([self.property_data(hotel) for hotel in hotels])
+
+    def current_content(self, hotels):
+        return {hotel.hotel_id: hotel.description for hotel in hotels}
+
+    def carry_forward(self, hotel, description):
+        if description:
+            hotel.description = description
+            hotel.description_fingerprint = self.fingerprint(hotel)
+
+    def apply_many(self, results, force=False):
+        hotels = []
+        for hotel, description in results:
+            if description:
+                self.carry_forward(hotel, description)
+                hotels.append(hotel)
+        Hotel.objects.bulk_update(hotels, ['description', 'description_fingerprint'])
+        return len(hotels)
+
+
+class GeneratedRowsStage(Stage):
+    """
+    Stages whose results are rows of their own (summaries, reviews) rather
+    than hotel columns. The fingerprint of the newest row is annotated onto
+    the hotel as ``<name>_fingerprint``; new rows replace the old ones.
+    """
+    model = None
+
+    @property
+    def annotation(self) -> str:
+        return f'{self.name}_fingerprint'
+
+    def annotate(self, queryset):
+        latest = self.model.objects.filter(property=OuterRef('hotel_id')).order_by('-id')
+        return queryset.annotate(**{self.annotation: Subquery(latest.values('source_fingerprint')[:1])})
+
+    def stale(self, force=False):
+        if force:
+            return EVERY_HOTEL
+        # An anti-join on (property_id, source_fingerprint): no row built
+        # from the hotel's current inputs. Rows are replaced as a whole, so
+        # this matches comparing the newest row's fingerprint, without
+        # finding the newest row for every hotel first.
+        current = self.model.objects.filter(
+            property_id=OuterRef('hotel_id'),
+            source_fingerprint=self.fingerprint_expression(ref=OuterRef),
+        )
+        return ~Exists(current)
+
+    def adopt(self):
+        hotel = Hotel.objects.filter(hotel_id=OuterRef('property_id'))
+        fingerprints = hotel.annotate(current_fingerprint=self.fingerprint_expression())
+        return self.model.objects.filter(source_fingerprint__isnull=True).update(
+            source_fingerprint=Subquery(fingerprints.values('current_fingerprint')[:1])
+        )
+
+    def stale_after_adopt(self, force=False):
+        # adopt() stamps unstamped rows with the current fingerprint, so a
+        # hotel with any of them is up to date afterwards
+        if force:
+            return self.stale(force)
+        unstamped = self.model.objects.filter(property_id=OuterRef('hotel_id'), source_fingerprint__isnull=True)
+        return self.stale(force) & ~Exists(unstamped)
+
+    def needs(self, hotel, force=False):
+        return force or getattr(hotel, self.annotation) != self.fingerprint(hotel)
+
+    def build_rows(self, hotel, result, source_fingerprint) -> list:
+        raise NotImplementedError
+
+    def apply_many(self, results, force=False):
+        hotels = []
+        rows = []
+        for hotel, result in results:
+            if self.is_valid(result):
+                source_fingerprint = self.fingerprint(hotel)
+                rows.extend(self.build_rows(hotel, result, source_fingerprint))
+                setattr(hotel, self.annotation, source_fingerprint)
+                hotels.append(hotel)
+        # Regenerated content replaces what was built from the old inputs
+        self.model.objects.filter(property_id__in=[hotel.hotel_id for hotel in hotels]).delete()
+        self.model.objects.bulk_create(rows)
+        return len(hotels)
+
+
+class SummaryStage(GeneratedRowsStage):
+    name = 'summary'
+    model = PropertySummary
+    sources = (
+        Source('property_title'),
+        Source('city_name'),
+        Source('price', scale=100),
+        Source('rating', scale=10),
+        Source('description'),
+    )
+    fields = ('hotel_id', 'property_title', 'city_name', 'price', 'rating', 'description', 'duplicate_of')
+    shared = True
+
+    def stale(self, force=False):
+        # Summaries are built from descriptions, so those must exist first
+        return Q(description__isnull=False) & super().stale(force)
+
+    def needs(self, hotel, force=False):
+        return bool(hotel.description) and super().needs(hotel, force)
+
+    def property_data(self, hotel):
+        return {
+            'hotel_id': hotel.hotel_id,
+            'property_title': hotel.property_title,
+            'city_name': hotel.city_name,
+            'price': f"{hotel.price:.2f}" if hotel.price is not None else "N/A",
+            'rating': f"{hotel.rating:.1f}" if hotel.rating is not None else "N/A",
+            'description': hotel.description or "Not available"
+        }
+
+    def build_prompt(self, service, hotel):
+        return service.build_summary_prompt(self.property_data(hotel))
+
+    async def generate(self, service, hotel):
+        return await service.generate_property_summary(self.property_data(hotel))
+
+    async def generate_batch(self, service, hotels):
+        return await service.generate_property_summaries([self.property_data(hotel) for hotel in hotels])
+
+    def current_content(self, hotels):
+        # Newest first, so the latest summary of each hotel wins
+        summaries = PropertySummary.objects.filter(
+            property_id__in=[hotel.hotel_id for hotel in hotels]
+        ).order_by('property_id', '-id').values_list('property_id', 'summary')
+        content = {}
+        for hotel_id, summary in summaries:
+            content.setdefault(hotel_id, summary)
+        return content
+
+    def build_rows(self, hotel, summary, source_fingerprint):
+        return [PropertySummary(property=hotel, summary=summary, source_fingerprint=source_fingerprint)]
+
+
+class ReviewStage(GeneratedRowsStage):
+    name = 'review'
+    model = PropertyReview
+    sources = (
+        Source('property_title'),
+        Source('city_name'),
+        Source('price', scale=100),
+        Source('rating', scale=10),
+    )
+    fields = ('hotel_id', 'property_title', 'city_name', 'price', 'rating')
+
+    def __init__(self, per_hotel: Optional[int] = None):
+        # Several reviews per hotel are asked for as one set, by different
+        # personas, in a single request. Without a number, regenerated
+        # reviews keep as many as the hotel has, so sets stay sets.
+        self.per_hotel = max(1, per_hotel) if per_hotel else None
+
+    def annotate(self, queryset):
+        counts = (
+            self.model.objects.filter(property=OuterRef('hotel_id'))
+            .order_by().values('property').annotate(total=Count('pk')).values('total')
+        )
+        return super().annotate(queryset).annotate(review_count=Coalesce(Subquery(counts), 0))
+
+    def reviews_wanted(self, hotel) -> int:
+        return self.per_hotel or max(1, getattr(hotel, 'review_count', 0) or 0)
+
+    def property_data(self, hotel):
+        return {
+            'hotel_id': hotel.hotel_id,
+            'property_title': hotel.property_title,
+            'city_name': hotel.city_name,
+            'price': f"{hotel.price:.2f}" if hotel.price is not None else "N/A",
+            'rating': f"{hotel.rating:.1f}" if hotel.rating is not None else "3.0"  # Default rating
+        }
+
+    def build_prompt(self, service, hotel):
+        return service.build_review_prompt(self.property_data(hotel))
+
+    async def generate(self, service, hotel):
+        count = self.reviews_wanted(hotel)
+        if count > 1:
+            return await service.generate_property_review_set(self.property_data(hotel), count)
+        return await service.generate_property_review(self.property_data(hotel))
+
+    async def generate_batch(self, service, hotels):
+        # One request per number of reviews wanted, as a prompt asks for one
+        by_count: Dict[int, list] = {}
+        for hotel in hotels:
+            by_count.setdefault(self.reviews_wanted(hotel), []).append(self.property_data(hotel))
+        results = {}
+        for count, properties in by_count.items():
+            if count > 1:
+                results.update(await service.generate_property_review_sets(properties, count))
+            else:
+                results.update(await service.generate_property_reviews(properties))
+        return results
+
+    def is_valid(self, result):
+        if isinstance(result, list):
+            return bool(result)
+        rating, review = result or (None, None)
+        return rating is not None and bool(review)
+
+    def build_rows(self, hotel, result, source_fingerprint):
+        # A set of reviews or a single (rating, review) pair
+        reviews = result if isinstance(result, list) else [result]
+        return [
+            PropertyReview(property=hotel, rating=rating, review=review, source_fingerprint=source_fingerprint)
+            for rating, review in reviews
+        ]
+
+
+def annotate_progress(queryset: QuerySet, stages: Optional[Iterable[Stage]] = None) -> QuerySet:
+    """
+    Add the annotations Stage.needs reads for the given (default all) stages
+    """
+    for stage in (STAGES.values() if stages is None else stages):
+        queryset = stage.annotate(queryset)
+    return queryset
+
+
+def pending_any(stages: Iterable[Stage], force: bool = False, assume_adopted: bool = False) -> QuerySet:
+    """
+    Hotels that need at least one of the given stages (see Stage.pending)
+    """
+    stages = list(stages)
+    hotels = annotate_progress(Hotel.objects.all(), stages)
+    return hotels.filter(reduce(or_, [
+        (stage.stale_after_adopt(force) if assume_adopted else stage.stale(force)) & stage.generated_here()
+        for stage in stages
+    ]))
+
+
+STAGES = {stage.name: stage for stage in (TitleStage(), DescriptionStage(), SummaryStage(), ReviewStage())}
+
+
+def stage_fields(stages: Iterable[Stage]) -> List[str]:
+    """
+    Union of the hotel columns the given stages need
+    """
+    fields = []
+    for stage in stages:
+        fields.extend(field for field in stage.fields if field not in fields)
+    return fields
+
+
+def upstream(stage: Stage, stages: Iterable[Stage]) -> List[Stage]:
+    """
+    ``stage`` and the stages among ``stages`` whose output its prompt is
+    built from, directly or through another of them. In a pipeline run a
+    hotel needs ``stage`` whenever it needs any of these.
+    """
+    stages = list(stages)
+    earlier_stages = stages[:stages.index(stage)] if stage in stages else stages
+    feeding = [stage]
+    sources = {source.field for source in stage.sources}
+    for earlier in reversed(earlier_stages):
+        if sources & set(earlier.outputs):
+            feeding.insert(0, earlier)
+            sources |= {source.field for source in earlier.sources}
+    return feeding
+
+
+def get_stages(names: Optional[List[str]] = None) -> List[Stage]:
+    """
+    Look up stages by name, keeping pipeline order
+    """
+    if not names:
+        return list(STAGES.values())
+    unknown = set(names) - set(STAGES)
+    if unknown:
+        raise ValueError(f"Unknown stage(s): {', '.join(sorted(unknown))}")
+    return [stage for name, stage in STAGES.items() if name in names]
@@ -0,0 +1,125 @@
+# llmApp/services/write_buffer.py
+import time
+from typing import Callable, List, Optional, Tuple
+
+from django.db import transaction
+from llmApp.services.metrics import MetricsRegistry
+
+
+class WriteBuffer:
+    """
+    Write-behind buffer for generated content.
+
+    Results are collected per stage and written with the stage's bulk
+    apply_many (bulk_update / bulk_create) in one transaction per flush, once
+    ``flush_size`` results are waiting or ``flush_interval`` seconds have
+    passed since the last flush. If a bulk flush fails, its results are
+    retried one by one so a single bad row does not lose the whole flush.
+
+    ``on_flush`` is called with the ``(stage, items)`` written, inside the
+    flush transaction, so bookkeeping such as the job ledger commits
+    together with the content it describes. ``guard``, when given, is called
+    in the same transaction before anything is written and returns the
+    ``(stage, items)`` that may still be written.
+    """
+
+    def __init__(
+        self,
+        flush_size: int = 100,
+        flush_interval: float = 5.0,
+        force: bool = False,
+        on_saved: Optional[Callable] = None,
+        on_error: Optional[Callable] = None,
+        on_flush: Optional[Callable] = None,
+        metrics: Optional[MetricsRegistry] = None,
+        guard: Optional[Callable] = None,
+    ):
+        self.flush_size = max(1, flush_size)
+        self.flush_interval = flush_interval
+        self.force = force
+        self.on_saved = on_saved
+        self.on_error = on_error
+        self.on_flush = on_flush
+        self.metrics = metrics
+        self.guard = guard
+        self.stats = {'flushes': 0, 'written': 0, 'failed': 0, 'flush_seconds': 0.0}
+        self._pending = {}
+        self._count = 0
+        self._last_flush = time.monotonic()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+    def add(self, hotel, stage, result):
+        self._pending.setdefault(stage.name, (stage, []))[1].append((hotel, result))
+        self._count += 1
+        if self._count >= self.flush_size or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> int:
+        """
+        Write everything buffered so far, returning the number of rows written
+        """
+        if not self._pending:
+            self._last_flush = time.monotonic()
+            return 0
+
+        pending, self._pending, self._count = self._pending, {}, 0
+        started = time.monotonic()
+        try:
+            saved = list(pending.values())
+            with transaction.atomic():
+                if self.guard is not None:
+                    saved = self.guard(saved)
+                written = sum(stage.apply_many(items, force=self.force) for stage, items in saved)
+                if self.on_flush is not None:
+                    self.on_flush(saved)
+            failed = []
+        except Exception:
+            written, saved, failed = self._flush_one_by_one(pending)
+
+        self._last_flush = time.monotonic()
+        self.stats['flushes'] += 1
+        self.stats['written'] += written
+        self.stats['failed'] += len(failed)
+        self.stats['flush_seconds'] += self._last_flush - started
+        if self.metrics is not None:
+            self.metrics.observe('db_flush_seconds', self._last_flush - started)
+            self.metrics.inc('db_rows_written_total', written)
+
+        if self.on_saved is not None:
+            for stage, items in saved:
+                for hotel, result in items:
+                    self.on_saved(hotel, stage, result)
+        if self.on_error is not None:
+            for hotel, stage, error in failed:
+                self.on_error(hotel, stage, error)
+        return written
+
+    def _flush_one_by_one(self, pending) -> Tuple[int, List, List]:
+        written = 0
+        saved = []
+        failed = []
+        for stage, items in pending.values():
+            stage_saved = []
+            for hotel, result in items:
+                try:
+                    with transaction.atomic():
+                        single = [(stage, [(hotel, result)])]
+                        if self.guard is not None and not any(kept for _, kept in self.guard(single)):
+                            continue
+                        count = stage.apply_many([(hotel, result)], force=self.force)
+                        if self.on_flush is not None:
+                            self.on_flush(single)
+                    written += count
+                    stage_saved.append((hotel, result))
+                except Exception as e:
+                    failed.append((hotel, stage, e))
+            saved.append((stage, stage_saved))
+        return written, saved, failed
@@ -0,0 +1,47 @@
+# llmApp/tests/helpers.py
+"""
+Factories and base classes shared by the test modules
+"""
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+from django.db import DatabaseError, connection
+from llmApp.services.stages import STAGES
+
+
+def make_hotel(hotel_id='H1', done=(), summaries=(), reviews=(), **fields):
+    """
+    A stand-in for a Hotel row with every field the stages, prompts and API
+    documents read; ``fields`` override the defaults. Stages in ``done`` are
+    up to date with the hotel's fields.
+    """
+    hotel = SimpleNamespace(
+        id=hotel_id, hotel_id=str(hotel_id), property_title=f'Hotel {hotel_id}', original_title=None,
+        city_name='Dhaka', room_type='Double', price=120.5, rating=4.3, description=None,
+        address='1 Road', latitude=23.8, longitude=90.4, image='',
+        title_fingerprint=None, description_fingerprint=None, summary_fingerprint=None, review_fingerprint=None,
+        summaries=MagicMock(all=MagicMock(return_value=list(summaries))),
+        reviews=MagicMock(all=MagicMock(return_value=list(reviews))),
+    )
+    for name, value in fields.items():
+        setattr(hotel, name, value)
+    for name in done:
+        setattr(hotel, f'{name}_fingerprint', STAGES[name].fingerprint(hotel))
+    return hotel
+
+
+class PostgresTestCase(unittest.TestCase):
+    """
+    Tests run against the configured PostgreSQL database; skipped when there
+    is none. They clean up the rows they write themselves.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        if connection.vendor != 'postgresql':
+            raise unittest.SkipTest('Only run on PostgreSQL')
+        try:
+            connection.ensure_connection()
+        except DatabaseError as e:
+            raise unittest.SkipTest(f'No database to test against: {e}')
@@ -0,0 +1,69 @@
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+from django.contrib.admin.sites import site
+from django.core.exceptions import FieldDoesNotExist
+from llmApp.admin import PREVIEW_LENGTH, EstimatedCountPaginator, HotelAdmin
+from llmApp.models import Hotel, PropertyReview, PropertySummary
+
+class FakeQuerySet:
+    db = 'default'
+    model = Hotel
+
+    def __init__(self, where=None):
+        self.query = SimpleNamespace(where=where)
+
+    def count(self):
+        return 42
+
+class TestEstimatedCount(unittest.TestCase):
+    def make_connection(self, estimate, vendor='postgresql'):
+        connection = MagicMock(vendor=vendor)
+        connection.cursor.return_value.__enter__.return_value.fetchone.return_value = (estimate,)
+        return connection
+
+    @patch('llmApp.admin.connections')
+    def test_unfiltered_large_table_uses_estimate(self, mock_connections):
+        connection = self.make_connection(250000)
+        mock_connections.__getitem__.return_value = connection
+
+        self.assertEqual(EstimatedCountPaginator(FakeQuerySet(), 100).count, 250000)
+        cursor = connection.cursor.return_value.__enter__.return_value
+        self.assertEqual(cursor.execute.call_args[0][1], ['hotels'])
+
+    @patch('llmApp.admin.connections')
+    def test_small_or_unanalyzed_tables_are_counted(self, mock_connections):
+        for estimate in (500, -1):
+            mock_connections.__getitem__.return_value = self.make_connection(estimate)
+            self.assertEqual(EstimatedCountPaginator(FakeQuerySet(), 100).count, 42)
+
+    @patch('llmApp.admin.connections')
+    def test_filtered_lists_are_counted(self, mock_connections):
+        self.assertEqual(EstimatedCountPaginator(FakeQuerySet(where=['city']), 100).count, 42)
+        mock_connections.__getitem__.assert_not_called()
+
+class TestAdmin(unittest.TestCase):
+    def test_previews_are_truncated(self):
+        admin = HotelAdmin(Hotel, site)
+
+        self.assertEqual(admin.description_preview(SimpleNamespace(description_preview='Short')), 'Short')
+        long = admin.description_preview(SimpleNamespace(description_preview='x' * (PREVIEW_LENGTH + 1)))
+        self.assertEqual(long, 'x' * PREVIEW_LENGTH + '…')
+        self.assertIsNone(admin.description_preview(SimpleNamespace(description_preview=None)))
+
+    def test_search_fields_exist(self):
+        for model in (Hotel, PropertySummary, PropertyReview):
+            for field in site._registry[model].search_fields:
+                path = field.lstrip('=^@').split('__')
+                if path[-1] == 'exact':
+                    path = path[:-1]
+                opts = model._meta
+                try:
+                    for name in path:
+                        target = opts.get_field(name)
+                        opts = target.related_model._meta if target.is_relation else opts
+                except FieldDoesNotExist:
+                    self.fail(f"{model.__name__} searches missing field {field}")
+
+if __name__ == '__main__':
+    unittest.main()
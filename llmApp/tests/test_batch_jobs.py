@@ -0,0 +1,88 @@
+import io
+import json
+import unittest
+from collections import defaultdict
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+from llmApp.management.commands.import_llm_results import Command as ImportResults
+from llmApp.services.batch_jobs import (
+    build_job, fake_results, job_key, read_jsonl, response_text, split_key, write_jsonl
+)
+from llmApp.services.gemini_service import GeminiService
+from llmApp.services.rate_limiter import RateLimiter
+
+class TestBatchJobs(unittest.TestCase):
+    def test_build_job_uses_batch_request_format(self):
+        job = build_job('summary', 'H1', 'f1', 'Summarise this hotel')
+        self.assertEqual(job, {
+            'key': 'summary:f1:H1',
+            'request': {'contents': [{'role': 'user', 'parts': [{'text': 'Summarise this hotel'}]}]},
+        })
+
+    def test_split_key(self):
+        self.assertEqual(split_key('review:f1:abc:1'), ('review', 'abc:1', 'f1', False))
+        self.assertEqual(split_key(job_key('review', 'H1', 'f1', force=True)), ('review', 'H1', 'f1', True))
+        with self.assertRaises(ValueError):
+            split_key('review')
+        with self.assertRaises(ValueError):
+            split_key('review:H1')
+
+    def test_jsonl_round_trip(self):
+        buffer = io.StringIO()
+        self.assertEqual(write_jsonl(buffer, [{'a': 1}, {'b': 'é'}]), 2)
+        buffer.seek(0)
+        self.assertEqual(list(read_jsonl(buffer)), [{'a': 1}, {'b': 'é'}])
+
+    def test_read_jsonl_reports_bad_lines(self):
+        with self.assertRaises(ValueError):
+            list(read_jsonl(io.StringIO('{"a": 1}\nnot json\n')))
+
+    def test_fake_results_answer_every_job(self):
+        jobs = [build_job('title', 'H1', 'f1', 'p'), build_job('review', 'H2', 'f2', 'p')]
+        results = list(fake_results(jobs))
+
+        self.assertEqual([result['key'] for result in results], ['title:f1:H1', 'review:f2:H2'])
+        service = GeminiService(rate_limiter=RateLimiter(rpm=0), use_cache=False)
+        rating, review = service.parse_review_response(response_text(results[1]))
+        self.assertEqual(rating, 4.0)
+        self.assertTrue(review)
+
+    def test_response_text_handles_errors(self):
+        self.assertIsNone(response_text({'key': 'title:H1', 'error': {'code': 400}}))
+        self.assertIsNone(response_text(json.loads('{"response": {"candidates": []}}')))
+
+class TestImportResults(unittest.TestCase):
+    @patch('llmApp.management.commands.import_llm_results.transaction')
+    def test_results_for_hotels_changed_since_export_are_skipped(self, mock_transaction):
+        stage = MagicMock()
+        stage.pending.return_value.filter.return_value = [SimpleNamespace(hotel_id='H1'), SimpleNamespace(hotel_id='H2')]
+        # H2's title was rewritten after its description prompt was exported
+        stage.fingerprint.side_effect = lambda hotel: {'H1': 'f1', 'H2': 'f3'}[hotel.hotel_id]
+        stage.apply_many.side_effect = lambda results, force: len(results)
+        lines = list(fake_results([build_job('description', 'H1', 'f1', 'p'), build_job('description', 'H2', 'f2', 'p')]))
+
+        counts = defaultdict(int)
+        with patch.dict('llmApp.management.commands.import_llm_results.STAGES', {'description': stage}):
+            ImportResults().apply_chunk(lines, MagicMock(), counts)
+
+        self.assertEqual((counts['applied'], counts['outdated']), (1, 1))
+        self.assertEqual([hotel.hotel_id for hotel, _ in stage.apply_many.call_args.args[0]], ['H1'])
+
+    @patch('llmApp.management.commands.import_llm_results.transaction')
+    def test_jobs_exported_with_force_are_applied_with_force(self, mock_transaction):
+        stage = MagicMock()
+        stage.pending.return_value.filter.return_value = [SimpleNamespace(hotel_id='H1')]
+        stage.fingerprint.return_value = 'f1'
+        stage.apply_many.side_effect = lambda results, force: len(results)
+        lines = list(fake_results([build_job('review', 'H1', 'f1', 'p', force=True)]))
+
+        counts = defaultdict(int)
+        with patch.dict('llmApp.management.commands.import_llm_results.STAGES', {'review': stage}):
+            ImportResults().apply_chunk(lines, MagicMock(), counts)
+
+        stage.pending.assert_called_once_with(force=True)
+        self.assertTrue(stage.apply_many.call_args.kwargs['force'])
+        self.assertEqual(counts['applied'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
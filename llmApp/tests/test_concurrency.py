@@ -0,0 +1,83 @@
+import asyncio
+import threading
+import time
+import unittest
+from llmApp.services.concurrency import chunked, chunked_by, run_concurrently
+
+class TestRunConcurrently(unittest.TestCase):
+    def test_yields_every_item_with_result(self):
+        async def worker(item):
+            await asyncio.sleep(0)
+            return item * 2
+
+        results = {item: result for item, result, error in run_concurrently(range(10), worker, 3)}
+        self.assertEqual(results, {i: i * 2 for i in range(10)})
+
+    def test_keeps_requests_in_flight(self):
+        lock = threading.Lock()
+        state = {'active': 0, 'peak': 0}
+
+        def blocking_call():
+            with lock:
+                state['active'] += 1
+                state['peak'] = max(state['peak'], state['active'])
+            time.sleep(0.05)
+            with lock:
+                state['active'] -= 1
+
+        async def worker(item):
+            await asyncio.to_thread(blocking_call)
+            return item
+
+        start = time.monotonic()
+        list(run_concurrently(range(8), worker, 4))
+        elapsed = time.monotonic() - start
+
+        self.assertEqual(state['peak'], 4)
+        self.assertLess(elapsed, 0.3)
+
+    def test_errors_are_returned_per_item(self):
+        async def worker(item):
+            if item == 1:
+                raise ValueError('boom')
+            return item
+
+        outcomes = {item: (result, error) for item, result, error in run_concurrently([0, 1, 2], worker, 2)}
+        self.assertEqual(outcomes[0], (0, None))
+        self.assertIsNone(outcomes[1][0])
+        self.assertIsInstance(outcomes[1][1], ValueError)
+
+    def test_items_are_consumed_lazily(self):
+        consumed = []
+
+        def items():
+            for i in range(5):
+                consumed.append(i)
+                yield i
+
+        async def worker(item):
+            return item
+
+        iterator = run_concurrently(items(), worker, 2)
+        next(iterator)
+        self.assertLessEqual(len(consumed), 3)
+        iterator.close()
+
+class TestChunked(unittest.TestCase):
+    def test_splits_into_fixed_size_chunks(self):
+        self.assertEqual(list(chunked(range(5), 2)), [[0, 1], [2, 3], [4]])
+        self.assertEqual(list(chunked([], 3)), [])
+
+    def test_chunked_by_groups_items_with_the_same_key(self):
+        items = ['a1', 'b1', 'a2', 'b2', 'a3', 'c1']
+        self.assertEqual(list(chunked_by(items, 2, key=lambda item: item[0])), [
+            ['a1', 'a2'], ['b1', 'b2'], ['a3'], ['c1'],
+        ])
+        # Too many items waiting sends the fullest chunk out early
+        items = ['a1', 'b1', 'a2', 'c1']
+        self.assertEqual(list(chunked_by(items, 3, key=lambda item: item[0], max_waiting=3)), [
+            ['a1', 'a2'], ['b1'], ['c1'],
+        ])
+
+if __name__ == '__main__':
+    unittest.main()
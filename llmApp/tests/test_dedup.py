@@ -0,0 +1,86 @@
+import unittest
+from types import SimpleNamespace
+from llmApp.services.dedup import Listing, adapt, distance, find_clusters, minhash, normalize_title, shingles, similarity
+from llmApp.services.stages import STAGES
+
+def make_listing(id, title='Grand Palace Hotel Dhaka', room_type='Double', latitude=23.8, longitude=90.4):
+    return Listing(id, f'h{id}', title, room_type, latitude, longitude)
+
+class TestSignatures(unittest.TestCase):
+    def test_titles_are_normalized(self):
+        self.assertEqual(normalize_title('  Hôtel  du Parc, PARIS! '), 'hotel du parc paris')
+        self.assertEqual(shingles('Hôtel'), {'hot', 'ote', 'tel'})
+        self.assertEqual(shingles('Inn'), {'inn'})
+
+    def test_similar_titles_have_similar_signatures(self):
+        grand = minhash(shingles('Grand Palace Hotel Dhaka'))
+
+        self.assertEqual(similarity(grand, minhash(shingles('GRAND PALACE HOTEL, Dhaka'))), 1.0)
+        self.assertGreater(similarity(grand, minhash(shingles('Grand Palace Hotel Dhaka City'))), 0.6)
+        self.assertLess(similarity(grand, minhash(shingles('Seaside Inn Chittagong'))), 0.3)
+
+    def test_distance_in_meters(self):
+        self.assertAlmostEqual(distance(make_listing(1), make_listing(2, latitude=23.801)), 111.2, delta=0.5)
+
+class TestClusters(unittest.TestCase):
+    def test_duplicates_nearby_are_clustered(self):
+        listings = [
+            make_listing(3),
+            make_listing(1, title='Grand Palace Hotel, Dhaka', latitude=23.8003),
+            make_listing(2, title='Seaside Inn'),
+        ]
+        clusters = find_clusters(listings)
+
+        self.assertEqual([[listing.id for listing in cluster] for cluster in clusters], [[1, 3]])
+
+    def test_neighbouring_grid_cells_are_searched(self):
+        # 60 m apart across a cell boundary
+        listings = [make_listing(1, latitude=0.00089), make_listing(2, latitude=0.00143)]
+
+        self.assertEqual(len(find_clusters(listings, max_distance=100)), 1)
+
+    def test_far_apart_or_different_rooms_are_kept(self):
+        listings = [
+            make_listing(1),
+            make_listing(2, latitude=23.81),
+            make_listing(3, room_type='Suite'),
+        ]
+
+        self.assertEqual(find_clusters(listings), [])
+
+    def test_clusters_are_transitive(self):
+        listings = [make_listing(1), make_listing(2, latitude=23.8008), make_listing(3, latitude=23.8016)]
+
+        clusters = find_clusters(listings, max_distance=100)
+        self.assertEqual([[listing.id for listing in cluster] for cluster in clusters], [[1, 2, 3]])
+
+class TestSharing(unittest.TestCase):
+    def test_adapt_swaps_the_title(self):
+        text = 'Grand Palace is lovely. Stay at GRAND PALACE tonight.'
+
+        self.assertEqual(
+            adapt(text, 'Grand Palace', 'Grand Palace Annex'),
+            'Grand Palace Annex is lovely. Stay at Grand Palace Annex tonight.',
+        )
+        self.assertEqual(adapt(text, 'Grand Palace', 'Grand Palace'), text)
+        self.assertIsNone(adapt(None, 'a', 'b'))
+
+    def test_members_skip_shared_stages_only(self):
+        member = SimpleNamespace(duplicate_of='h1')
+        representative = SimpleNamespace(duplicate_of=None)
+
+        self.assertTrue(STAGES['description'].copies_duplicate(member))
+        self.assertTrue(STAGES['summary'].copies_duplicate(member))
+        self.assertFalse(STAGES['title'].copies_duplicate(member))
+        self.assertFalse(STAGES['review'].copies_duplicate(member))
+        self.assertFalse(STAGES['description'].copies_duplicate(representative))
+
+    def test_pending_leaves_out_members(self):
+        def where(stage):
+            return str(STAGES[stage].pending().query).split(' WHERE ', 1)[1]
+
+        self.assertIn('"duplicate_of" IS NULL', where('description'))
+        self.assertNotIn('duplicate_of', where('review'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import os
+import random
+import tempfile
+import unittest
+from unittest.mock import patch
+from llmApp.services.benchmark import SYNTHETIC_PREFIX, summarize_run, synthetic_hotels
+from llmApp.services.canned_responses import canned_response
+from llmApp.services.fake_gemini import FakeGeminiServer, LatencyModel
+from llmApp.services.metrics import merge_histograms
+from llmApp.services.gemini_service import GeminiService
+from llmApp.services.metrics import MetricsRegistry
+from llmApp.services.rate_limiter import RateLimiter
+from llmApp.tests.helpers import make_hotel
+
+class TestFakeGeminiServer(unittest.TestCase):
+    def make_service(self, server, max_retries=0):
+        with patch.dict(os.environ, {'GEMINI_BASE_URL': server.base_url}):
+            service = GeminiService(
+                rate_limiter=RateLimiter(rpm=0), use_cache=False, max_retries=max_retries,
+                metrics=MetricsRegistry(os.path.join(self.tmp.name, 'metrics.json')),
+            )
+        service.backoff_base = 0
+        return service
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_answers_single_and_batch_prompts(self):
+        with FakeGeminiServer(latency=LatencyModel('fixed', 0)) as server:
+            service = self.make_service(server)
+            self.assertEqual(service.rewrite_property_title(make_hotel('H1', property_title='Sea View')), 'Sea View in Dhaka')
+            rating, review = service.generate_property_review({
+                'property_title': 'Sea View', 'city_name': 'Dhaka', 'price': 100, 'rating': 4.0
+            })
+            self.assertEqual(rating, 4)
+            self.assertTrue(review)
+
+            titles = service.rewrite_property_titles([make_hotel('H1', property_title='Sea View'), make_hotel('H2', property_title='Old Town')])
+            self.assertEqual(titles, {'H1': 'Sea View in Dhaka', 'H2': 'Old Town in Dhaka'})
+            self.assertEqual(service.stats['batch_fallbacks'], 0)
+            self.assertEqual(server.stats['requests'], 3)
+            service.close()
+
+    def test_injected_errors_are_retried(self):
+        server = FakeGeminiServer(latency=LatencyModel('fixed', 0), rate_429=0.5, rate_500=0.5, retry_after=0, seed=1)
+        with server:
+            service = self.make_service(server, max_retries=2)
+            self.assertIsNone(service.rewrite_property_title(make_hotel('H1', property_title='Sea View')))
+            self.assertEqual(server.stats['requests'], 3)
+            self.assertEqual(server.stats['throttled'] + server.stats['errors'], 3)
+            self.assertEqual(service.stats['retries'], 2)
+            service.close()
+
+    def test_canned_responses_override_by_prompt(self):
+        with FakeGeminiServer(latency=LatencyModel('fixed', 0), responses={'Sea View': 'Custom Title'}) as server:
+            service = self.make_service(server)
+            self.assertEqual(service.rewrite_property_title(make_hotel('H1', property_title='Sea View')), 'Custom Title')
+            service.close()
+
+    def test_canned_batch_response_only_has_requested_fields(self):
+        prompt = (
+            'Create a brief summary.\n\nHotels:\n[{"hotel_id": "H1", "name": "Sea View", '
+            '"location": "Dhaka", "description": "x"}]\n\nRespond with a JSON array ... "summary" set to the summary text'
+        )
+        self.assertEqual(
+            canned_response(prompt),
+            '[{"hotel_id": "H1", "summary": "Sea View: a well rated stay in Dhaka."}]'
+        )
+
+
+class TestLatencyModel(unittest.TestCase):
+    def test_distributions(self):
+        rng = random.Random(0)
+        self.assertEqual(LatencyModel('fixed', 0.3).sample(rng), 0.3)
+        samples = [LatencyModel('uniform', 0.5).sample(rng) for _ in range(100)]
+        self.assertTrue(all(0 <= sample <= 1 for sample in samples))
+        self.assertLessEqual(LatencyModel('lognormal', 1, sigma=3, maximum=2).sample(random.Random(1)), 2)
+        with self.assertRaises(ValueError):
+            LatencyModel('normal')
+
+
+class TestBenchmarkHelpers(unittest.TestCase):
+    def test_synthetic_hotels_are_reproducible(self):
+        first = [(hotel.hotel_id, hotel.property_title, hotel.price) for hotel in synthetic_hotels(5, seed=3)]
+        second = [(hotel.hotel_id, hotel.property_title, hotel.price) for hotel in synthetic_hotels(5, seed=3)]
+        self.assertEqual(first, second)
+        self.assertTrue(all(hotel_id.startswith(SYNTHETIC_PREFIX) for hotel_id, _, _ in first))
+        self.assertIsNone(next(synthetic_hotels(1)).description)
+        self.assertTrue(next(synthetic_hotels(1, with_descriptions=True)).description)
+
+    def test_summarize_run_merges_stage_latencies(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            registry = MetricsRegistry(os.path.join(tmp, 'metrics.json'), buckets=(1, 2))
+            registry.observe('gemini_request_seconds', 0.5, stage='title')
+            registry.observe('gemini_request_seconds', 1.5, stage='review')
+            registry.inc('gemini_requests_total', 2, stage='title', outcome='success')
+            registry.inc('gemini_requests_total', stage='title', outcome='cache_hit')
+            registry.inc('hotels_processed_total', 4, stage='title', status='succeeded')
+            registry.flush()
+
+            result = summarize_run(MetricsRegistry(registry.path, buckets=(1, 2)), hotels=4, seconds=2)
+        self.assertEqual(result['hotels_per_second'], 2)
+        self.assertEqual(result['gemini_requests'], 2)
+        self.assertEqual(result['tasks_succeeded'], 4)
+        self.assertEqual(result['latency_p50'], 1)
+        self.assertIsNone(merge_histograms({}))
@@ -0,0 +1,68 @@
+import unittest
+from llmApp.services.fingerprints import Source, fingerprint
+from llmApp.services.stages import STAGES
+from llmApp.tests.helpers import make_hotel
+
+class TestSource(unittest.TestCase):
+    def test_values_render_like_the_sql_expression(self):
+        hotel = make_hotel(price=None)
+        self.assertEqual(Source('rating', scale=10).value(hotel), '43')
+        self.assertEqual(Source('price', scale=100).value(hotel), '')
+        self.assertEqual(Source('original_title', fallback='property_title').value(hotel), 'Hotel H1')
+        hotel.original_title = 'Sea View'
+        self.assertEqual(Source('original_title', fallback='property_title').value(hotel), 'Sea View')
+
+    def test_fingerprint_depends_on_prefix_and_values(self):
+        self.assertEqual(fingerprint('title:v1', ['a', 'b']), fingerprint('title:v1', ['a', 'b']))
+        self.assertNotEqual(fingerprint('title:v1', ['a', 'b']), fingerprint('title:v2', ['a', 'b']))
+        self.assertNotEqual(fingerprint('title:v1', ['ab', '']), fingerprint('title:v1', ['a', 'b']))
+
+class TestStageFingerprints(unittest.TestCase):
+    def test_titles_are_rewritten_from_the_original_title(self):
+        stage = STAGES['title']
+        hotel = make_hotel()
+        self.assertTrue(stage.needs(hotel))
+
+        stage.carry_forward(hotel, 'Breezy Sea View Inn by the Beach')
+        self.assertEqual(hotel.original_title, 'Hotel H1')
+        self.assertEqual(stage.property_data(hotel).property_title, 'Hotel H1')
+        self.assertFalse(stage.needs(hotel))
+
+    def test_changed_inputs_make_content_stale(self):
+        stage = STAGES['description']
+        hotel = make_hotel(description='Old text')
+        hotel.description_fingerprint = stage.fingerprint(hotel)
+        self.assertFalse(stage.needs(hotel))
+
+        hotel.price = 99.0
+        self.assertTrue(stage.needs(hotel))
+
+    def test_force_regenerates_up_to_date_content_of_every_stage(self):
+        hotel = make_hotel(description='Old text')
+        for stage in STAGES.values():
+            if stage.name in ('title', 'description'):
+                setattr(hotel, f'{stage.name}_fingerprint', stage.fingerprint(hotel))
+            else:
+                setattr(hotel, stage.annotation, stage.fingerprint(hotel))
+        for stage in STAGES.values():
+            self.assertFalse(stage.needs(hotel), stage.name)
+            self.assertTrue(stage.needs(hotel, force=True), stage.name)
+            where = str(stage.pending(force=True).query).split(' WHERE ', 1)[1]
+            self.assertNotIn('MD5', where, stage.name)
+
+        # Summaries still need a description to be built from
+        hotel.description = None
+        self.assertFalse(STAGES['summary'].needs(hotel, force=True))
+
+    def test_template_version_is_part_of_the_fingerprint(self):
+        stage = STAGES['review']
+        hotel = make_hotel()
+        before = stage.fingerprint(hotel)
+        stage.template_version += 1
+        try:
+            self.assertNotEqual(stage.fingerprint(hotel), before)
+        finally:
+            stage.template_version -= 1
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,10 +1,19 @@
+import asyncio
+import json
 import unittest
 from unittest.mock import patch, MagicMock
-from llmApp.services.gemini_service import GeminiService
+import requests
+from llmApp.services.gemini_service import (
+    AsyncGeminiService, GeminiService, Review, estimate_tokens, fit_to_budget, parse_batch_response,
+    parse_retry_after, parse_stage_limits, pick_personas
+)
+from llmApp.services.metrics import MetricsRegistry
+from llmApp.services.rate_limiter import RateLimiter
+from llmApp.services.response_cache import ResponseCache
 
 class TestGeminiService(unittest.TestCase):
     def setUp(self):
-        self.gemini_service = GeminiService()
+        self.gemini_service = GeminiService(rate_limiter=RateLimiter(rpm=0), use_cache=False)
         self.mock_hotel_data = {
             'property_title': 'Sunrise Beach Resort',
             'city_name': 'Miami Beach',
@@ -14,7 +23,7 @@ class TestGeminiService(unittest.TestCase):
             'description': 'Luxurious beachfront resort with stunning ocean views.'
         }
 
-    @patch('llmApp.services.gemini_service.requests.post')
+    @patch('llmApp.services.gemini_service.requests.Session.post')
     def test_rewrite_property_title_success(self, mock_post):
         # Mock successful API response
         mock_response = MagicMock()
@@ -40,7 +49,7 @@ class TestGeminiService(unittest.TestCase):
         result = self.gemini_service.rewrite_property_title(mock_hotel)
         self.assertEqual(result, 'Luxurious Ocean View Suite at Sunrise Beach Resort - Miami Beach')
 
-    @patch('llmApp.services.gemini_service.requests.post')
+    @patch('llmApp.services.gemini_service.requests.Session.post')
     def test_generate_property_description_success(self, mock_post):
         # Mock successful API response
         mock_response = MagicMock()
@@ -59,7 +68,7 @@ class TestGeminiService(unittest.TestCase):
         result = self.gemini_service.generate_property_description(self.mock_hotel_data)
         self.assertEqual(result, 'Experience luxury at its finest in Miami Beach...')
 
-    @patch('llmApp.services.gemini_service.requests.post')
+    @patch('llmApp.services.gemini_service.requests.Session.post')
     def test_generate_property_summary_success(self, mock_post):
         # Mock successful API response
         mock_response = MagicMock()
@@ -78,7 +87,7 @@ class TestGeminiService(unittest.TestCase):
         result = self.gemini_service.generate_property_summary(self.mock_hotel_data)
         self.assertEqual(result, 'Stunning beachfront resort in Miami Beach...')
 
-    @patch('llmApp.services.gemini_service.requests.post')
+    @patch('llmApp.services.gemini_service.requests.Session.post')
     def test_generate_property_review_success(self, mock_post):
         # Mock successful API response
         mock_response = MagicMock()
@@ -98,7 +107,7 @@ class TestGeminiService(unittest.TestCase):
         self.assertEqual(rating, 4.5)
         self.assertEqual(review, 'Excellent beachfront location...')
 
-    @patch('llmApp.services.gemini_service.requests.post')
+    @patch('llmApp.services.gemini_service.requests.Session.post')
     def test_request_failure(self, mock_post):
         # Mock failed API response
         mock_post.side_effect = Exception('API Error')
@@ -106,7 +115,7 @@ class TestGeminiService(unittest.TestCase):
         result = self.gemini_service.generate_property_description(self.mock_hotel_data)
         self.assertIsNone(result)
 
-    @patch('llmApp.services.gemini_service.requests.post')
+    @patch('llmApp.services.gemini_service.requests.Session.post')
     def test_invalid_response_format(self, mock_post):
         # Mock invalid API response
         mock_response = MagicMock()
@@ -117,7 +126,7 @@ class TestGeminiService(unittest.TestCase):
         result = self.gemini_service.generate_property_description(self.mock_hotel_data)
         self.assertIsNone(result)
 
-    @patch('llmApp.services.gemini_service.requests.post')
+    @patch('llmApp.services.gemini_service.requests.Session.post')
     def test_generate_property_review_invalid_format(self, mock_post):
         # Mock invalid review format response
         mock_response = MagicMock()
@@ -137,5 +146,476 @@ class TestGeminiService(unittest.TestCase):
         self.assertIsNone(rating)
         self.assertIsNone(review)
 
+class TestGeminiServiceRetries(unittest.TestCase):
+    def setUp(self):
+        self.rate_limiter = MagicMock()
+        self.gemini_service = GeminiService(max_retries=3, rate_limiter=self.rate_limiter, use_cache=False)
+
+    def _response(self, status_code, text=None, headers=None):
+        response = MagicMock()
+        response.status_code = status_code
+        response.headers = headers or {}
+        response.json.return_value = {
+            'candidates': [{'content': {'parts': [{'text': text}]}}]
+        }
+        if status_code >= 400:
+            response.raise_for_status.side_effect = requests.exceptions.HTTPError(str(status_code))
+        else:
+            response.raise_for_status.return_value = None
+        return response
+
+    @patch('llmApp.services.gemini_service.time.sleep')
+    @patch('llmApp.services.gemini_service.requests.Session.post')
+    def test_retries_throttled_request_honoring_retry_after(self, mock_post, mock_sleep):
+        mock_post.side_effect = [
+            self._response(429, headers={'Retry-After': '7'}),
+            self._response(503),
+            self._response(200, 'Recovered'),
+        ]
+
+        self.assertEqual(self.gemini_service.send('prompt'), ('Recovered', 3))
+        self.assertGreaterEqual(mock_sleep.call_args_list[0].args[0], 7)
+        self.assertEqual(self.gemini_service.stats['retries'], 2)
+        self.assertEqual(self.rate_limiter.acquire.call_count, 3)
+        self.rate_limiter.record_throttle.assert_called_once()
+        self.rate_limiter.record_success.assert_called_once()
+
+    @patch('llmApp.services.gemini_service.time.sleep')
+    @patch('llmApp.services.gemini_service.requests.Session.post')
+    def test_gives_up_after_max_retries(self, mock_post, mock_sleep):
+        mock_post.return_value = self._response(500)
+
+        self.assertEqual(self.gemini_service.send('prompt'), (None, 4))
+        self.assertEqual(mock_post.call_count, 4)
+        self.assertEqual(self.gemini_service.stats['failures'], 1)
+
+    @patch('llmApp.services.gemini_service.time.sleep')
+    @patch('llmApp.services.gemini_service.requests.Session.post')
+    def test_retries_connection_errors(self, mock_post, mock_sleep):
+        mock_post.side_effect = [
+            requests.exceptions.ConnectionError('reset'),
+            self._response(200, 'Done'),
+        ]
+
+        self.assertEqual(self.gemini_service.send('prompt'), ('Done', 2))
+
+    @patch('llmApp.services.gemini_service.time.sleep')
+    @patch('llmApp.services.gemini_service.requests.Session.post')
+    def test_records_metrics_per_stage(self, mock_post, mock_sleep):
+        metrics = MetricsRegistry(path='/nonexistent/metrics.json')
+        service = GeminiService(max_retries=3, rate_limiter=self.rate_limiter, use_cache=False, metrics=metrics)
+        recovered = self._response(200, 'Bright Miami Stay')
+        recovered.json.return_value['usageMetadata'] = {
+            'promptTokenCount': 80, 'candidatesTokenCount': 12, 'totalTokenCount': 92,
+        }
+        mock_post.side_effect = [self._response(429), recovered]
+
+        service.rewrite_property_title(MagicMock(property_title='Miami Stay'))
+        counters = metrics.summary()['counters']
+        self.assertEqual(counters['gemini_requests_total'], {'outcome="success",stage="title"': 1})
+        self.assertEqual(counters['gemini_throttled_total'], {'stage="title"': 1})
+        self.assertEqual(counters['gemini_retries_total'], {'stage="title"': 1})
+        self.assertEqual(counters['gemini_prompt_tokens_total'], {'stage="title"': 80})
+        self.assertEqual(counters['gemini_response_tokens_total'], {'stage="title"': 12})
+        self.assertEqual(metrics.summary()['histograms']['gemini_request_seconds']['stage="title"']['count'], 1)
+
+    @patch('llmApp.services.gemini_service.requests.Session.post')
+    def test_client_errors_are_not_retried(self, mock_post):
+        mock_post.return_value = self._response(400)
+
+        self.assertIsNone(self.gemini_service._make_request('prompt'))
+        self.assertEqual(mock_post.call_count, 1)
+
+    def test_session_uses_configured_pool_and_timeouts(self):
+        service = GeminiService(
+            pool_size=32, timeout=(1, 2), rate_limiter=self.rate_limiter, use_cache=False
+        )
+        adapter = service.session.get_adapter('https://generativelanguage.googleapis.com')
+        self.assertEqual(adapter._pool_maxsize, 32)
+        self.assertEqual(service.timeout, (1, 2))
+
+    @patch.dict('os.environ', {'GEMINI_POOL_SIZE': '10'})
+    def test_explicit_pool_size_wins_over_environment(self):
+        service = GeminiService(pool_size=2, rate_limiter=self.rate_limiter, use_cache=False)
+        self.assertEqual(service.pool_size, 2)
+
+        service = GeminiService(rate_limiter=self.rate_limiter, use_cache=False)
+        self.assertEqual(service.pool_size, 10)
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after('12'), 12.0)
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after('soon'))
+        self.assertEqual(parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT'), 0.0)
+
+class TestGeminiServiceCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = ResponseCache(path=':memory:')
+        self.response = MagicMock()
+        self.response.status_code = 200
+        self.response.json.return_value = {
+            'candidates': [{'content': {'parts': [{'text': 'Fresh response'}]}}]
+        }
+
+    def make_service(self, **kwargs):
+        return GeminiService(rate_limiter=RateLimiter(rpm=0), cache=self.cache, **kwargs)
+
+    @patch('llmApp.services.gemini_service.requests.Session.post')
+    def test_repeated_prompt_is_served_from_cache(self, mock_post):
+        mock_post.return_value = self.response
+        service = self.make_service()
+
+        self.assertEqual(service.send('prompt'), ('Fresh response', 1))
+        self.assertEqual(service.send('prompt'), ('Fresh response', 0))
+        self.assertEqual(mock_post.call_count, 1)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    @patch('llmApp.services.gemini_service.requests.Session.post')
+    def test_refresh_cache_skips_lookup_but_stores(self, mock_post):
+        mock_post.return_value = self.response
+        key = ResponseCache.make_key('gemini-1.5-flash', 'prompt', {})
+        self.cache.set(key, 'Stale response')
+
+        service = self.make_service(refresh_cache=True)
+        self.assertEqual(service._make_request('prompt'), 'Fresh response')
+        self.assertEqual(self.cache.get(key), 'Fresh response')
+
+    @patch('llmApp.services.gemini_service.requests.Session.post')
+    def test_failed_responses_are_not_cached(self, mock_post):
+        self.response.json.return_value = {'invalid': 'response'}
+        mock_post.return_value = self.response
+        service = self.make_service()
+
+        self.assertIsNone(service._make_request('prompt'))
+        self.assertEqual(len(self.cache), 0)
+
+class TestGeminiServiceBatches(unittest.TestCase):
+    def setUp(self):
+        self.gemini_service = GeminiService(rate_limiter=RateLimiter(rpm=0), use_cache=False)
+        self.properties = [
+            {
+                'hotel_id': hotel_id,
+                'property_title': f'Hotel {hotel_id}',
+                'city_name': 'Dhaka',
+                'room_type': 'Double',
+                'rating': '4.0',
+                'price': '120.00',
+            }
+            for hotel_id in ('101', '102', '103')
+        ]
+
+    def _response(self, text):
+        response = MagicMock()
+        response.status_code = 200
+        response.json.return_value = {'candidates': [{'content': {'parts': [{'text': text}]}}]}
+        return response
+
+    @patch('llmApp.services.gemini_service.requests.Session.post')
+    def test_batch_uses_one_request_and_json_output(self, mock_post):
+        mock_post.return_value = self._response(json.dumps([
+            {'hotel_id': '101', 'description': 'First'},
+            {'hotel_id': 102, 'description': 'Second'},
+            {'hotel_id': '103', 'description': 'Third'},
+        ]))
+
+        results = self.gemini_service.generate_property_descriptions(self.properties)
+        self.assertEqual(results, {'101': 'First', '102': 'Second', '103': 'Third'})
+        self.assertEqual(mock_post.call_count, 1)
+        payload = mock_post.call_args.kwargs['json']
+        self.assertEqual(payload['generationConfig']['responseMimeType'], 'application/json')
+        schema = payload['generationConfig']['responseSchema']
+        self.assertEqual(schema['type'], 'ARRAY')
+        self.assertEqual(schema['items']['required'], ['hotel_id', 'description'])
+        self.assertIn('Hotel 103', payload['contents'][0]['parts'][0]['text'])
+        # All three are in Dhaka, so the city is named once in the system instruction
+        self.assertNotIn('Dhaka', payload['contents'][0]['parts'][0]['text'])
+        self.assertIn('located in Dhaka', payload['systemInstruction']['parts'][0]['text'])
+
+    @patch('llmApp.services.gemini_service.requests.Session.post')
+    def test_batch_across_cities_keeps_locations(self, mock_post):
+        mock_post.return_value = self._response('[]')
+        self.properties[0]['city_name'] = 'Paris'
+        self.gemini_service.max_retries = 0
+        with patch.object(self.gemini_service, 'generate_property_description', return_value=None):
+            self.gemini_service.generate_property_descriptions(self.properties)
+        payload = mock_post.call_args_list[0].kwargs['json']
+        self.assertIn('"location": "Paris"', payload['contents'][0]['parts'][0]['text'])
+        self.assertNotIn('located in', payload['systemInstruction']['parts'][0]['text'])
+
+    @patch('llmApp.services.gemini_service.requests.Session.post')
+    def test_batch_repairs_failed_entries_then_falls_back(self, mock_post):
+        mock_post.side_effect = [
+            self._response(json.dumps([
+                {'hotel_id': '101', 'summary': 'First'},
+                {'hotel_id': '102', 'summary': ''},
+            ])),
+            # One repair prompt for both broken hotels fixes only 102
+            self._response(json.dumps([{'hotel_id': '102', 'summary': 'Second repaired'}])),
+            self._response(json.dumps({'summary': 'Third from fallback'})),
+        ]
+
+        results = self.gemini_service.generate_property_summaries(self.properties)
+        self.assertEqual(results, {
+            '101': 'First',
+            '102': 'Second repaired',
+            '103': 'Third from fallback',
+        })
+        self.assertEqual(mock_post.call_count, 3)
+        repair_prompt = mock_post.call_args_list[1].kwargs['json']['contents'][0]['parts'][0]['text']
+        self.assertIn('Hotels to fix', repair_prompt)
+        self.assertNotIn('Hotel 101', repair_prompt.split('Hotels to fix')[1])
+        self.assertEqual(self.gemini_service.stats['batch_fallbacks'], 1)
+
+    @patch('llmApp.services.gemini_service.requests.Session.post')
+    def test_batch_reviews_validate_rating(self, mock_post):
+        mock_post.side_effect = [
+            self._response(json.dumps([
+                {'hotel_id': '101', 'rating': 9, 'review': 'Great'},
+                {'hotel_id': '102', 'rating': 'n/a', 'review': 'Odd'},
+                {'hotel_id': '103', 'rating': 3.5, 'review': 'Fine'},
+            ])),
+            self._response(json.dumps([{'hotel_id': '102', 'rating': 2}])),
+        ]
+
+        results = self.gemini_service.generate_property_reviews(self.properties)
+        self.assertEqual(results['101'], (5, 'Great'))
+        self.assertEqual(results['102'], (2.0, 'Odd'))
+        self.assertEqual(results['103'], (3.5, 'Fine'))
+        repair_config = mock_post.call_args_list[1].kwargs['json']['generationConfig']
+        self.assertEqual(list(repair_config['responseSchema']['items']['properties']), ['hotel_id', 'rating'])
+
+    @patch('llmApp.services.gemini_service.requests.Session.post')
+    def test_batch_review_sets_repair_with_array_schema(self, mock_post):
+        review = {'persona': 'retired couple', 'rating': 4, 'review': 'Quiet'}
+        mock_post.side_effect = [
+            self._response(json.dumps([
+                {'hotel_id': '101', 'reviews': [review]},
+                {'hotel_id': '102', 'reviews': 'none'},
+                {'hotel_id': '103', 'reviews': [review]},
+            ])),
+            self._response(json.dumps([{'hotel_id': '102', 'reviews': [review]}])),
+        ]
+
+        results = self.gemini_service.generate_property_review_sets(self.properties, 1)
+        self.assertEqual(results['102'], [Review(4.0, 'Quiet')])
+        self.assertEqual(mock_post.call_count, 2)
+        schema = mock_post.call_args_list[1].kwargs['json']['generationConfig']['responseSchema']
+        reviews = schema['items']['properties']['reviews']
+        self.assertEqual(reviews['type'], 'ARRAY')
+        self.assertEqual(reviews['items']['type'], 'OBJECT')
+        self.assertEqual(reviews['items']['required'], ['persona', 'rating', 'review'])
+
+    def test_parse_batch_response(self):
+        fenced = '```json\n[{"hotel_id": "1", "title": "A"}]\n```'
+        self.assertEqual(parse_batch_response(fenced), {'1': {'hotel_id': '1', 'title': 'A'}})
+        self.assertEqual(parse_batch_response('not json'), {})
+        self.assertEqual(parse_batch_response('{"hotel_id": "1"}'), {})
+        self.assertEqual(parse_batch_response(None), {})
+
+class TestStructuredOutput(unittest.TestCase):
+    def setUp(self):
+        self.cache = ResponseCache(path=':memory:')
+        self.metrics = MetricsRegistry(path='/nonexistent/metrics.json')
+        self.service = GeminiService(rate_limiter=RateLimiter(rpm=0), cache=self.cache, metrics=self.metrics)
+        self.property_data = {'property_title': 'Sea View', 'city_name': 'Dhaka', 'price': '99.00', 'rating': '4.0'}
+
+    def _response(self, text):
+        response = MagicMock()
+        response.status_code = 200
+        response.json.return_value = {'candidates': [{'content': {'parts': [{'text': text}]}}]}
+        return response
+
+    @patch('llmApp.services.gemini_service.requests.Session.post')
+    def test_review_requests_schema_and_repairs_only_bad_field(self, mock_post):
+        mock_post.side_effect = [
+            self._response('{"rating": "great", "review": "Lovely rooms"}'),
+            self._response('{"rating": 4}'),
+        ]
+
+        result = self.service.generate_property_review(self.property_data)
+        self.assertEqual(result, Review(4.0, 'Lovely rooms'))
+        first, repair = [call.kwargs['json'] for call in mock_post.call_args_list]
+        self.assertEqual(first['generationConfig']['responseSchema']['required'], ['rating', 'review'])
+        self.assertEqual(repair['generationConfig']['responseSchema']['required'], ['rating'])
+        self.assertIn('rating: must be a number between 1 and 5', repair['contents'][0]['parts'][0]['text'])
+        # The malformed answer was not cached, the repair was
+        self.assertEqual(len(self.cache), 1)
+
+        summary = self.metrics.summary()
+        self.assertEqual(summary['counters']['llm_repairs_total'], {'outcome="success",stage="review"': 1})
+        self.assertEqual(summary['waste_rate'], 1.0)
+
+    @patch('llmApp.services.gemini_service.requests.Session.post')
+    def test_plain_text_answers_are_still_accepted(self, mock_post):
+        mock_post.return_value = self._response('RATING: 3\nREVIEW: Fine')
+        self.assertEqual(self.service.generate_property_review(self.property_data), (3.0, 'Fine'))
+        mock_post.return_value = self._response('```json\n{"summary": "Short"}\n```')
+        self.assertEqual(self.service.generate_property_summary(self.property_data), 'Short')
+        self.assertEqual(mock_post.call_count, 2)
+
+    @patch('llmApp.services.gemini_service.requests.Session.post')
+    def test_review_set_keeps_valid_reviews(self, mock_post):
+        mock_post.return_value = self._response(json.dumps({'reviews': [
+            {'persona': 'retired couple', 'rating': 4, 'review': 'Quiet and clean'},
+            {'persona': 'backpacker on a budget', 'rating': 'n/a', 'review': 'Pricey'},
+            {'persona': 'honeymooners', 'rating': 5, 'review': 'Perfect'},
+        ]}))
+        data = dict(self.property_data, hotel_id='h1')
+
+        reviews = self.service.generate_property_review_set(data, 3)
+        self.assertEqual(reviews, [Review(4.0, 'Quiet and clean'), Review(5.0, 'Perfect')])
+        self.assertEqual(mock_post.call_count, 1)
+        payload = mock_post.call_args.kwargs['json']
+        schema = payload['generationConfig']['responseSchema']['properties']['reviews']
+        self.assertEqual(schema['type'], 'ARRAY')
+        self.assertIn(', '.join(pick_personas('h1', 3)), payload['contents'][0]['parts'][0]['text'])
+
+    def test_pick_personas_is_stable_and_distinct(self):
+        self.assertEqual(pick_personas('h1', 4), pick_personas('h1', 4))
+        self.assertEqual(len(set(pick_personas('h1', 4))), 4)
+
+    @patch('llmApp.services.gemini_service.requests.Session.post')
+    def test_instructions_and_city_go_in_the_system_instruction(self, mock_post):
+        mock_post.return_value = self._response('{"summary": "Short"}')
+        data = dict(self.property_data, description='Nice')
+        self.service.generate_property_summary(data)
+        self.service.generate_property_summary(dict(data, property_title='Other'))
+
+        first, second = [call.kwargs['json'] for call in mock_post.call_args_list]
+        prompt = first['contents'][0]['parts'][0]['text']
+        self.assertIn('Sea View', prompt)
+        self.assertNotIn('2-3 sentence', prompt)
+        self.assertNotIn('Dhaka', prompt)
+        system = first['systemInstruction']['parts'][0]['text']
+        self.assertIn('2-3 sentence', system)
+        self.assertTrue(system.endswith('located in Dhaka.'))
+        # Hotels in the same city share the whole system instruction
+        self.assertEqual(system, second['systemInstruction']['parts'][0]['text'])
+
+    def test_check_response(self):
+        self.assertEqual(self.service.check_response('title', 'New Title'), ({'title': 'New Title'}, {}))
+        self.assertEqual(
+            self.service.check_response('title', '{"title": '),
+            ({}, {'title': 'must be a non-empty string'})
+        )
+        self.assertEqual(self.service.parse_result('review', '{"rating": 7, "review": "Wow"}'), (5, 'Wow'))
+        self.assertIsNone(self.service.parse_result('summary', None))
+
+
+class TestTokenLimits(unittest.TestCase):
+    def setUp(self):
+        self.cache = ResponseCache(path=':memory:')
+        self.metrics = MetricsRegistry(path='/nonexistent/metrics.json')
+        self.service = GeminiService(
+            rate_limiter=RateLimiter(rpm=0), cache=self.cache, metrics=self.metrics,
+            max_output_tokens={'title': 50}, input_budgets={'summary': 40},
+        )
+        self.property_data = {'property_title': 'Sea View', 'city_name': 'Dhaka', 'price': '99.00', 'rating': '4.0'}
+
+    def _response(self, text):
+        response = MagicMock()
+        response.status_code = 200
+        response.json.return_value = {'candidates': [{'content': {'parts': [{'text': text}]}}]}
+        return response
+
+    def test_parse_stage_limits(self):
+        self.assertEqual(parse_stage_limits('title=64, summary=0'), {'title': 64, 'summary': 0})
+        self.assertEqual(parse_stage_limits(None), {})
+        for value in ('title', 'title=many', 'title=-1', '=5'):
+            with self.assertRaises(ValueError):
+                parse_stage_limits(value)
+
+    def test_fit_to_budget_keeps_paragraph_openings(self):
+        text = (
+            "Set on the beach.   Rooms face the sea. Rooms face the sea. The lobby is grand.\n\n"
+            "Breakfast is included. The pool is heated.\n\n"
+            "Great value for families."
+        )
+        self.assertEqual(fit_to_budget(text, 0), text)
+        self.assertEqual(fit_to_budget('Short.', 10), 'Short.')
+        fitted = fit_to_budget(text, 23)
+        self.assertLessEqual(estimate_tokens(fitted), 23)
+        self.assertEqual(
+            fitted, 'Set on the beach. Rooms face the sea. Breakfast is included. Great value for families.'
+        )
+        self.assertEqual(fit_to_budget('word ' * 100, 5), 'word word word')
+
+    def test_output_limits_per_stage(self):
+        self.assertEqual(self.service.output_limit('title'), 50)
+        self.assertEqual(self.service.output_limit('review', per_hotel=3), 3 * 768)
+        self.assertEqual(self.service.output_limit('reviews', per_hotel=2, hotels=4), (2 * 768 + 16) * 4)
+        self.service.max_output_tokens['summary'] = 0
+        self.assertIsNone(self.service.output_limit('summary'))
+        self.assertNotIn('maxOutputTokens', self.service.generation_config('summary'))
+
+    @patch.dict('os.environ', {'LLM_MAX_OUTPUT_TOKENS': 'title=20,review=100', 'LLM_INPUT_BUDGETS': 'summary=0'})
+    def test_environment_limits_under_explicit_ones(self):
+        service = GeminiService(rate_limiter=RateLimiter(rpm=0), use_cache=False, max_output_tokens={'title': 30})
+        self.assertEqual(service.max_output_tokens['title'], 30)
+        self.assertEqual(service.max_output_tokens['review'], 100)
+        self.assertEqual(service.input_budgets['summary'], 0)
+
+    @patch('llmApp.services.gemini_service.requests.Session.post')
+    def test_long_descriptions_are_trimmed_in_summary_prompts(self, mock_post):
+        mock_post.return_value = self._response('{"summary": "Short"}')
+        description = ' '.join(f"Feature number {number} is great." for number in range(100))
+
+        self.service.generate_property_summary(dict(self.property_data, description=description))
+        payload = mock_post.call_args.kwargs['json']
+        prompt = payload['contents'][0]['parts'][0]['text']
+        self.assertIn('Feature number 0 is great.', prompt)
+        self.assertNotIn('Feature number 99', prompt)
+        self.assertLess(estimate_tokens(prompt), estimate_tokens(description) // 4)
+        self.assertEqual(payload['generationConfig']['maxOutputTokens'], 384)
+        self.assertEqual(
+            self.metrics.summary()['counters']['llm_inputs_trimmed_total'], {'stage="summary"': 1}
+        )
+
+    @patch('llmApp.services.gemini_service.requests.Session.post')
+    def test_cache_is_shared_across_output_limits(self, mock_post):
+        mock_post.return_value = self._response('{"title": "Sea View Dhaka"}')
+        hotel = MagicMock(property_title='Sea View', city_name='Dhaka', room_type='Double', rating=4)
+
+        self.assertEqual(self.service.rewrite_property_title(hotel), 'Sea View Dhaka')
+        self.assertEqual(mock_post.call_args.kwargs['json']['generationConfig']['maxOutputTokens'], 50)
+        self.service.max_output_tokens['title'] = 80
+        self.assertEqual(self.service.rewrite_property_title(hotel), 'Sea View Dhaka')
+        self.assertEqual(mock_post.call_count, 1)
+
+class TestAsyncGeminiService(unittest.TestCase):
+    def setUp(self):
+        self.service = MagicMock()
+        self.async_service = AsyncGeminiService(self.service, concurrency=2)
+
+    def test_generate_property_description(self):
+        self.service.generate_property_description.return_value = 'A lovely hotel'
+
+        result = asyncio.run(self.async_service.generate_property_description({'property_title': 'X'}))
+        self.assertEqual(result, 'A lovely hotel')
+        self.service.generate_property_description.assert_called_once_with({'property_title': 'X'})
+
+    @patch('llmApp.services.gemini_service.time.sleep')
+    @patch('llmApp.services.gemini_service.requests.Session.post')
+    def test_awaited_send_returns_its_attempts(self, mock_post, mock_sleep):
+        ok = MagicMock(status_code=200)
+        ok.json.return_value = {'candidates': [{'content': {'parts': [{'text': 'Done'}]}}]}
+        mock_post.side_effect = [MagicMock(status_code=503, headers={}), ok]
+        service = GeminiService(rate_limiter=RateLimiter(rpm=0), use_cache=False)
+
+        reply = asyncio.run(AsyncGeminiService(service).send('prompt', stage='title'))
+        self.assertEqual((reply.text, reply.attempts), ('Done', 2))
+        service.close()
+
+    def test_semaphore_bounds_in_flight_requests(self):
+        async def run():
+            self.service.generate_property_summary.return_value = 'Summary'
+            return await asyncio.gather(*(
+                self.async_service.generate_property_summary({}) for _ in range(5)
+            ))
+
+        self.assertEqual(asyncio.run(run()), ['Summary'] * 5)
+        # A fresh loop gets a fresh semaphore
+        self.assertEqual(asyncio.run(run()), ['Summary'] * 5)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
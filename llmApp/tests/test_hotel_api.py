@@ -0,0 +1,153 @@
+import json
+import unittest
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import RequestFactory
+from llmApp import views
+from llmApp.services.hotel_api import (
+    InvalidCursor, build_document, cache_key, decode_cursor, encode_cursor, get_entries, invalidate_hotels,
+    make_entry, page_ids,
+)
+from llmApp.tests.helpers import make_hotel
+
+CREATED = datetime(2024, 5, 1, 12, 0, tzinfo=timezone.utc)
+
+def make_review(rating, text='Good'):
+    return SimpleNamespace(rating=rating, review=text, created_at=CREATED)
+
+class TestDocuments(unittest.TestCase):
+    def setUp(self):
+        self.cache = LocMemCache('test-hotels', {})
+        patcher = patch('llmApp.services.hotel_api.hotel_cache', return_value=self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.cache.clear)
+
+    def test_document_has_latest_summary_and_review_aggregate(self):
+        hotel = make_hotel(
+            summaries=[SimpleNamespace(summary='Newest'), SimpleNamespace(summary='Older')],
+            reviews=[make_review(4), make_review(5)],
+        )
+        document = build_document(hotel)
+
+        self.assertEqual(document['summary'], 'Newest')
+        self.assertEqual(document['review_count'], 2)
+        self.assertEqual(document['review_rating'], 4.5)
+        self.assertEqual(document['reviews'][0]['created_at'], '2024-05-01T12:00:00Z')
+        self.assertNotIn('id', document)
+
+    def test_hotel_without_content(self):
+        document = build_document(make_hotel())
+
+        self.assertIsNone(document['summary'])
+        self.assertIsNone(document['review_rating'])
+        self.assertEqual(document['reviews'], [])
+
+    def test_etag_follows_content(self):
+        first = make_entry({'summary': 'a'})
+
+        self.assertEqual(first['etag'], make_entry({'summary': 'a'})['etag'])
+        self.assertNotEqual(first['etag'], make_entry({'summary': 'b'})['etag'])
+
+    @patch('llmApp.services.hotel_api.hotels_with_content')
+    def test_only_missing_hotels_are_built(self, mock_hotels):
+        self.cache.set(cache_key('h1'), make_entry({'hotel_id': 'h1'}))
+        mock_hotels.return_value.filter.return_value = [make_hotel('h2')]
+
+        entries = get_entries(['h1', 'h2', 'gone'])
+
+        mock_hotels.return_value.filter.assert_called_once_with(hotel_id__in=['h2', 'gone'])
+        self.assertEqual(set(entries), {'h1', 'h2'})
+        self.assertIsNotNone(self.cache.get(cache_key('h2')))
+
+    @patch('llmApp.services.hotel_api.hotels_with_content')
+    def test_cached_hotels_need_no_queries(self, mock_hotels):
+        self.cache.set(cache_key('h1'), make_entry({'hotel_id': 'h1'}))
+
+        get_entries(['h1'])
+
+        mock_hotels.assert_not_called()
+
+    def test_invalidate_drops_entries(self):
+        self.cache.set(cache_key('h1'), make_entry({}))
+        self.cache.set(cache_key('h2'), make_entry({}))
+
+        invalidate_hotels(['h1', 'h1'])
+
+        self.assertIsNone(self.cache.get(cache_key('h1')))
+        self.assertIsNotNone(self.cache.get(cache_key('h2')))
+
+class TestCursor(unittest.TestCase):
+    def test_round_trip(self):
+        self.assertEqual(decode_cursor(encode_cursor(1234)), 1234)
+
+    def test_invalid_cursor(self):
+        for cursor in ('garbage', encode_cursor(1)[:-2] + '!!', 'e30'):
+            with self.assertRaises(InvalidCursor):
+                decode_cursor(cursor)
+
+    def test_page_reads_one_extra_row(self):
+        queryset = MagicMock()
+        rows = queryset.filter.return_value.order_by.return_value.values_list.return_value
+        rows.__getitem__.return_value = [(11, 'a'), (12, 'b'), (13, 'c')]
+
+        hotel_ids, next_cursor = page_ids(queryset, 10, 2)
+
+        queryset.filter.assert_called_once_with(id__gt=10)
+        rows.__getitem__.assert_called_once_with(slice(None, 3))
+        self.assertEqual(hotel_ids, ['a', 'b'])
+        self.assertEqual(decode_cursor(next_cursor), 12)
+
+class TestViews(unittest.TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.entry = make_entry({'hotel_id': 'h1', 'summary': 'Nice', 'reviews': [{'rating': 5}]})
+
+    @patch('llmApp.views.get_entry')
+    def test_detail_sends_validators(self, mock_entry):
+        mock_entry.return_value = self.entry
+        response = views.hotel_detail(self.factory.get('/api/hotels/h1'), 'h1')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], f'"{self.entry["etag"]}"')
+        self.assertIn('Last-Modified', response)
+        self.assertEqual(json.loads(response.content)['summary'], 'Nice')
+
+    @patch('llmApp.views.get_entry')
+    def test_detail_not_modified(self, mock_entry):
+        mock_entry.return_value = self.entry
+        request = self.factory.get('/api/hotels/h1', HTTP_IF_NONE_MATCH=f'"{self.entry["etag"]}"')
+
+        self.assertEqual(views.hotel_detail(request, 'h1').status_code, 304)
+
+    @patch('llmApp.views.get_entry', return_value=None)
+    def test_detail_not_found(self, mock_entry):
+        self.assertEqual(views.hotel_detail(self.factory.get('/api/hotels/x'), 'x').status_code, 404)
+
+    @patch('llmApp.views.get_entries')
+    @patch('llmApp.views.page_ids')
+    @patch('llmApp.views.Hotel.objects')
+    def test_list_filters_and_pages(self, mock_objects, mock_page_ids, mock_entries):
+        mock_page_ids.return_value = (['h1'], 'next')
+        mock_entries.return_value = {'h1': self.entry}
+        request = self.factory.get('/api/hotels', {'city_name': 'Dhaka', 'min_rating': '4', 'limit': '500'})
+
+        response = views.hotel_list(request)
+
+        queryset = mock_objects.all.return_value
+        queryset.filter.assert_called_once_with(city_name__iexact='Dhaka')
+        queryset.filter.return_value.filter.assert_called_once_with(rating__gte=4.0)
+        self.assertEqual(mock_page_ids.call_args[0][1:], (None, views.MAX_PAGE_SIZE))
+        data = json.loads(response.content)
+        self.assertEqual(data['next_cursor'], 'next')
+        self.assertNotIn('reviews', data['results'][0])
+
+    def test_list_rejects_bad_parameters(self):
+        for params in ({'max_price': 'cheap'}, {'cursor': 'garbage'}, {'limit': 'all'}):
+            response = views.hotel_list(self.factory.get('/api/hotels', params))
+            self.assertEqual(response.status_code, 400, params)
+
+if __name__ == '__main__':
+    unittest.main()
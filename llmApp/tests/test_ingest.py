@@ -0,0 +1,120 @@
+import csv
+import gzip
+import io
+import os
+import tempfile
+import unittest
+from contextlib import nullcontext
+from unittest.mock import MagicMock, patch
+from llmApp.services.ingest import (
+    COLUMNS, HotelLoader, InvalidRecord, clean_record, detect_format, iter_records, open_source, to_csv,
+)
+
+LENGTHS = {'hotel_id': 50, 'city_name': 100, 'property_title': 255}
+
+def make_record(**overrides):
+    record = {
+        'hotel_id': 'h1', 'city_name': 'Dhaka', 'property_title': 'Grand Hotel', 'price': '120.5',
+        'rating': 4.2, 'address': '1 Road', 'latitude': 23.8, 'longitude': 90.4,
+        'room_type': 'Double', 'image': '', 'local_image_path': None,
+    }
+    record.update(overrides)
+    return record
+
+class TestCleanRecord(unittest.TestCase):
+    def test_values_follow_columns(self):
+        row = clean_record(make_record(property_title='  Grand Hotel '), LENGTHS)
+
+        self.assertEqual(len(row), len(COLUMNS))
+        values = dict(zip(COLUMNS, row))
+        self.assertEqual(values['property_title'], 'Grand Hotel')
+        self.assertEqual(values['price'], 120.5)
+        self.assertEqual(values['local_image_path'], '')
+
+    def test_missing_required_field(self):
+        with self.assertRaisesRegex(InvalidRecord, 'city_name is required'):
+            clean_record(make_record(city_name=' '), LENGTHS)
+
+    def test_non_numeric_price(self):
+        with self.assertRaisesRegex(InvalidRecord, 'price must be a number'):
+            clean_record(make_record(price='cheap'), LENGTHS)
+
+    def test_value_too_long(self):
+        with self.assertRaisesRegex(InvalidRecord, 'hotel_id is longer than 50'):
+            clean_record(make_record(hotel_id='x' * 51), LENGTHS)
+
+    def test_record_must_be_an_object(self):
+        with self.assertRaises(InvalidRecord):
+            clean_record(['h1'], LENGTHS)
+
+class TestReading(unittest.TestCase):
+    def test_jsonl_reports_bad_lines_and_continues(self):
+        handle = io.StringIO('{"hotel_id": "h1"}\n\nnot json\n{"hotel_id": "h2"}\n')
+        records = list(iter_records(handle, 'jsonl'))
+
+        self.assertEqual([number for number, _ in records], [1, 3, 4])
+        self.assertIsInstance(records[1][1], InvalidRecord)
+        self.assertEqual(records[2][1], {'hotel_id': 'h2'})
+
+    def test_csv_uses_header(self):
+        handle = io.StringIO('hotel_id,city_name\nh1,Dhaka\nh2,Paris\n')
+        records = list(iter_records(handle, 'csv'))
+
+        self.assertEqual(records[1], (3, {'hotel_id': 'h2', 'city_name': 'Paris'}))
+
+    def test_gzipped_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'hotels.csv.gz')
+            with gzip.open(path, 'wt') as handle:
+                handle.write('hotel_id\nh1\n')
+            self.assertEqual(detect_format(path), 'csv')
+            with open_source(path) as handle:
+                self.assertEqual(list(iter_records(handle, 'csv')), [(2, {'hotel_id': 'h1'})])
+
+    def test_to_csv_keeps_empty_strings_distinct_from_null(self):
+        rows = list(csv.reader(to_csv([('h1', ''), ('h2', 'x')])))
+
+        self.assertEqual(rows, [['0', 'h1', ''], ['1', 'h2', 'x']])
+        self.assertIn('"h1",""', to_csv([('h1', '')]).getvalue())
+
+class TestHotelLoader(unittest.TestCase):
+    def make_connection(self, vendor='postgresql'):
+        cursor = MagicMock()
+        cursor.fetchone.return_value = (2, 1)
+        connection = MagicMock(vendor=vendor, alias='default')
+        connection.cursor.return_value.__enter__.return_value = cursor
+        return connection, cursor
+
+    @patch('llmApp.services.ingest.transaction.atomic', return_value=nullcontext())
+    def test_postgres_copies_into_staging_and_merges(self, mock_atomic):
+        connection, cursor = self.make_connection()
+        rows = [clean_record(make_record(hotel_id=f'h{number}'), LENGTHS) for number in range(4)]
+
+        result = HotelLoader(connection).load(rows)
+
+        self.assertEqual(result, {'inserted': 2, 'updated': 1, 'unchanged': 1})
+        mock_atomic.assert_called_once_with(using='default')
+        statement, data = cursor.copy_expert.call_args[0]
+        self.assertTrue(statement.startswith('COPY hotels_ingest (seq, hotel_id'))
+        self.assertEqual(len(data.getvalue().splitlines()), 4)
+        merge = cursor.execute.call_args[0][0]
+        self.assertIn('ON CONFLICT (hotel_id) DO UPDATE', merge)
+        self.assertIn('IS DISTINCT FROM', merge)
+
+    def test_merge_keeps_rewritten_titles(self):
+        merge = HotelLoader(MagicMock(vendor='postgresql')).merge_sql()
+
+        self.assertIn('DISTINCT ON (hotel_id)', merge)
+        self.assertIn('THEN EXCLUDED.property_title ELSE hotels.property_title END', merge)
+
+    def test_other_databases_use_bulk_upsert(self):
+        self.assertFalse(HotelLoader(MagicMock(vendor='sqlite')).uses_copy)
+
+    def test_empty_chunk(self):
+        connection, cursor = self.make_connection()
+
+        self.assertEqual(HotelLoader(connection).load([]), {'inserted': 0, 'updated': 0, 'unchanged': 0})
+        connection.cursor.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
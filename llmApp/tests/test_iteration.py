@@ -0,0 +1,64 @@
+import unittest
+from types import SimpleNamespace
+from llmApp.services.iteration import iter_keyset, iter_keyset_pages
+
+class FakeQuerySet:
+    """Just enough of the QuerySet API to record how pages are fetched"""
+
+    def __init__(self, rows, log, min_pk=None, limit=None, fields=None):
+        self.rows, self.log = rows, log
+        self.min_pk, self.limit, self.fields = min_pk, limit, fields
+
+    def _clone(self, **changes):
+        state = dict(min_pk=self.min_pk, limit=self.limit, fields=self.fields)
+        state.update(changes)
+        return FakeQuerySet(self.rows, self.log, **state)
+
+    def order_by(self, *fields):
+        return self._clone()
+
+    def only(self, *fields):
+        return self._clone(fields=fields)
+
+    def filter(self, pk__gt):
+        return self._clone(min_pk=pk__gt)
+
+    def __getitem__(self, item):
+        return self._clone(limit=item.stop)
+
+    def iterator(self, chunk_size):
+        self.log.append((self.min_pk, self.limit, self.fields))
+        rows = [row for row in self.rows if self.min_pk is None or row.pk > self.min_pk]
+        return iter(rows[:self.limit])
+
+class TestKeysetIteration(unittest.TestCase):
+    def setUp(self):
+        self.log = []
+        self.rows = [SimpleNamespace(pk=pk) for pk in (2, 3, 5, 8, 13)]
+        self.queryset = FakeQuerySet(self.rows, self.log)
+
+    def test_pages_follow_last_primary_key(self):
+        pages = list(iter_keyset_pages(self.queryset, 2, ['hotel_id']))
+
+        self.assertEqual([[row.pk for row in page] for page in pages], [[2, 3], [5, 8], [13]])
+        self.assertEqual(self.log, [
+            (None, 2, ('hotel_id',)),
+            (3, 2, ('hotel_id',)),
+            (8, 2, ('hotel_id',)),
+        ])
+
+    def test_rows_leaving_the_filter_do_not_skip_pages(self):
+        pages = iter_keyset_pages(self.queryset, 2)
+        seen = [row.pk for row in next(pages)]
+        # Processing removes the first page from the filtered queryset
+        del self.rows[:2]
+        for page in pages:
+            seen.extend(row.pk for row in page)
+        self.assertEqual(seen, [2, 3, 5, 8, 13])
+
+    def test_flat_iteration(self):
+        self.assertEqual([row.pk for row in iter_keyset(self.queryset, 3)], [2, 3, 5, 8, 13])
+        self.assertEqual(len(self.log), 2)
+
+if __name__ == '__main__':
+    unittest.main()
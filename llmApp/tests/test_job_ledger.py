@@ -0,0 +1,240 @@
+import threading
+import unittest
+from contextlib import nullcontext
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from llmApp.management.base import GeminiCommand
+from llmApp.management.commands.generate_reviews import Command as GenerateReviews
+from llmApp.models import GenerationJob, GenerationTask, Hotel
+from llmApp.services.job_ledger import JobLedger, poison_hotel_ids
+from llmApp.tests.helpers import PostgresTestCase
+
+def make_task(stage, status=GenerationTask.STATUS_PENDING, attempts=0, pk=None):
+    return GenerationTask(pk=pk, hotel_id='H1', stage=stage, status=status, attempts=attempts)
+
+class TestJobLedger(unittest.TestCase):
+    def setUp(self):
+        self.job = MagicMock(spec=GenerationJob)
+        self.job.left_out = 0
+        self.ledger = JobLedger(self.job, max_attempts=3, flush_size=2)
+        self.hotel = SimpleNamespace(hotel_id='H1', generation_tasks={
+            'description': make_task('description', pk=1),
+            'summary': make_task('summary', pk=2),
+        })
+
+    def test_worker_ids_are_unique(self):
+        self.assertNotEqual(JobLedger(self.job).worker_id, JobLedger(self.job).worker_id)
+
+    def test_mark_counts_attempts_and_tracks_failures(self):
+        self.assertFalse(self.ledger.has_failures(self.hotel))
+        self.assertTrue(self.ledger.mark(self.hotel, 'description', GenerationTask.STATUS_FAILED, 'timeout'))
+        self.assertFalse(self.ledger.mark(self.hotel, 'review', GenerationTask.STATUS_FAILED))
+
+        task = self.hotel.generation_tasks['description']
+        self.assertEqual((task.status, task.attempts, task.last_error), ('failed', 1, 'timeout'))
+        self.assertTrue(self.ledger.has_failures(self.hotel))
+
+        self.ledger.mark(self.hotel, 'summary', GenerationTask.STATUS_SKIPPED)
+        self.assertEqual(self.hotel.generation_tasks['summary'].attempts, 0)
+
+    @patch('llmApp.services.job_ledger.GenerationTask.objects')
+    def test_flush_writes_outcomes_in_bulk(self, mock_objects):
+        bulk_update = mock_objects.filter.return_value.bulk_update
+        bulk_update.return_value = 2
+        self.ledger.mark(self.hotel, 'description', GenerationTask.STATUS_SUCCEEDED)
+        self.assertEqual(self.ledger.flush(full_only=True), 0)
+        bulk_update.assert_not_called()
+
+        self.ledger.mark(self.hotel, 'summary', GenerationTask.STATUS_FAILED)
+        self.assertEqual(self.ledger.flush(full_only=True), 2)
+        tasks, fields = bulk_update.call_args.args
+        self.assertEqual([task.pk for task in tasks], [1, 2])
+        self.assertIn('attempts', fields)
+        self.assertEqual(self.ledger.flush(), 0)
+
+    @patch('llmApp.services.job_ledger.GenerationTask.objects')
+    def test_flush_only_writes_tasks_still_leased(self, mock_objects):
+        self.ledger.mark(self.hotel, 'description', GenerationTask.STATUS_SUCCEEDED)
+        self.ledger.flush()
+
+        mock_objects.filter.assert_called_once_with(lease_owner=self.ledger.worker_id)
+        # The leases of the tasks still in flight are renewed
+        self.job.tasks.filter.assert_called_with(
+            status=GenerationTask.STATUS_RUNNING, lease_owner=self.ledger.worker_id
+        )
+        self.assertIn('lease_expires_at', self.job.tasks.filter.return_value.update.call_args.kwargs)
+
+    @patch('llmApp.services.job_ledger.iter_keyset_pages')
+    @patch('llmApp.services.job_ledger.GenerationTask')
+    def test_seed_counts_tasks_actually_created(self, mock_task, mock_pages):
+        mock_pages.return_value = [[SimpleNamespace(hotel_id='H1'), SimpleNamespace(hotel_id='H2')]]
+        # H1 already had a task, so bulk_create drops it
+        self.job.tasks.count.side_effect = [1, 2]
+
+        self.assertEqual(self.ledger.seed(MagicMock(), ['description'], page_size=10), 1)
+        self.assertEqual(len(mock_task.objects.bulk_create.call_args.args[0]), 2)
+
+    def test_lock_leased_keeps_pairs_still_held(self):
+        held = self.job.tasks.filter.return_value.filter.return_value.select_for_update.return_value
+        held.values_list.return_value = [('H1', 'summary'), ('H2', 'review')]
+
+        pairs = self.ledger.lock_leased([('H1', 'summary'), ('H1', 'description'), ('H3', 'summary')])
+        self.assertEqual(pairs, {('H1', 'summary')})
+        self.assertEqual(
+            self.job.tasks.filter.return_value.filter.call_args.kwargs['hotel_id__in'], {'H1', 'H3'}
+        )
+
+    def test_finish_sets_job_status_from_counts(self):
+        cases = [
+            ({'succeeded': 4, 'skipped': 1}, False, GenerationJob.STATUS_COMPLETED),
+            ({'succeeded': 4, 'failed': 1}, False, GenerationJob.STATUS_INCOMPLETE),
+            ({'pending': 3}, False, GenerationJob.STATUS_INCOMPLETE),
+            ({'succeeded': 4}, True, GenerationJob.STATUS_INTERRUPTED),
+        ]
+        for found, interrupted, expected in cases:
+            self.job.left_out = 0
+            counts = {status: 0 for status, _ in GenerationTask.STATUS_CHOICES}
+            counts.update(found)
+            with patch.object(self.ledger, 'counts', return_value=counts):
+                self.ledger.finish(interrupted=interrupted)
+            self.assertEqual(self.job.status, expected)
+            self.assertIsNotNone(self.job.finished_at)
+
+        # Poison hotels left out of the job keep it from completing cleanly
+        self.job.left_out = 2
+        with patch.object(self.ledger, 'counts', return_value=dict(counts, failed=0)):
+            self.ledger.finish()
+        self.assertEqual(self.job.status, GenerationJob.STATUS_INCOMPLETE)
+
+    def test_poison_hotels_only_count_failures_since_their_last_success(self):
+        where = str(poison_hotel_ids('description', 3).query).split(' WHERE ', 1)[1]
+
+        self.assertIn('NOT EXISTS', where)
+        self.assertIn('"status" = succeeded AND U0."updated_at" > ("generation_tasks"."updated_at")', where)
+
+    @patch('llmApp.services.job_ledger.transaction.atomic', lambda: nullcontext())
+    def test_claim_attaches_leased_tasks_and_skips_pages_taken_by_others(self):
+        hotels = [SimpleNamespace(pk=i, hotel_id=f'H{i}') for i in range(1, 4)]
+        selects = iter([hotels[:2], hotels[2:]])
+        leased_task = make_task('summary', status=GenerationTask.STATUS_RUNNING)
+        leased_task.hotel_id = 'H3'
+        leased = iter([[], [leased_task]])
+
+        query = MagicMock()
+        query.order_by.return_value.only.return_value.select_for_update.return_value.__getitem__.side_effect = (
+            lambda _: next(selects)
+        )
+        self.job.tasks.filter.side_effect = lambda **kwargs: next(leased)
+        with patch.object(self.ledger, 'hotels', return_value=query), \
+                patch.object(self.ledger, 'runnable_tasks'):
+            claimed = self.ledger.claim(MagicMock(), 2, ['hotel_id'])
+
+        self.assertEqual([hotel.hotel_id for hotel in claimed], ['H3'])
+        self.assertEqual(list(claimed[0].generation_tasks), ['summary'])
+
+class TestResumeOptions(unittest.TestCase):
+    def setUp(self):
+        self.command = GenerateReviews()
+        job = GenerationJob(pk=7, command='generate_reviews', options={'force': True, 'reviews_per_hotel': 3})
+        patcher = patch.object(GeminiCommand, 'get_resumed_job', return_value=job)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def options(self, **options):
+        defaults = vars(self.command.create_parser('manage.py', 'generate_reviews').parse_args([]))
+        return dict(defaults, resume=7, **options)
+
+    def test_resume_restores_recorded_options(self):
+        options = self.options()
+        self.command.restore_job_options(options)
+
+        self.assertEqual((options['force'], options['reviews_per_hotel']), (True, 3))
+
+    def test_resume_refuses_conflicting_options(self):
+        with self.assertRaisesRegex(CommandError, '--reviews-per-hotel=5'):
+            self.command.restore_job_options(self.options(reviews_per_hotel=5))
+
+class TestJobLedgerOnPostgres(PostgresTestCase):
+    """
+    Seeding, claiming and poison hotels against real rows, which are
+    removed again afterwards
+    """
+    prefix = 'ledger-test-'
+
+    def setUp(self):
+        Hotel.objects.bulk_create([
+            Hotel(
+                hotel_id=f'{self.prefix}{number}', property_title=f'Hotel {number}', city_name='Dhaka', price=50,
+                rating=4, address='a', latitude=0, longitude=0, room_type='Double', image='http://x/y.jpg',
+                local_image_path='p',
+            )
+            for number in range(3)
+        ])
+        self.addCleanup(Hotel.objects.filter(hotel_id__startswith=self.prefix).delete)
+        self.addCleanup(GenerationJob.objects.filter(command='ledger-test').delete)
+        self.hotels = Hotel.objects.filter(hotel_id__startswith=self.prefix)
+
+    def start(self, **kwargs):
+        ledger = JobLedger.start('ledger-test', ['description'], **kwargs)
+        ledger.seed(self.hotels, ['description'])
+        return ledger
+
+    def claimed_ids(self, ledger, limit=10):
+        return [hotel.hotel_id for hotel in ledger.claim(self.hotels, limit, ['hotel_id'])]
+
+    def test_leased_hotels_are_not_claimed_again_until_the_lease_runs_out(self):
+        first = self.start()
+        second = JobLedger.resume(first.job)
+
+        self.assertEqual(self.claimed_ids(first, limit=2), [f'{self.prefix}0', f'{self.prefix}1'])
+        self.assertEqual(self.claimed_ids(second), [f'{self.prefix}2'])
+        self.assertEqual(self.claimed_ids(second), [])
+
+        first.job.tasks.filter(lease_owner=first.worker_id).update(
+            lease_expires_at=timezone.now() - timedelta(seconds=1)
+        )
+        self.assertEqual(self.claimed_ids(second), [f'{self.prefix}0', f'{self.prefix}1'])
+
+    def test_hotels_locked_by_another_worker_are_skipped(self):
+        ledger = self.start()
+        locked, release = threading.Event(), threading.Event()
+
+        def hold_lock():
+            # Another worker in the middle of claiming the first hotel
+            try:
+                with transaction.atomic():
+                    list(Hotel.objects.select_for_update().filter(hotel_id=f'{self.prefix}0'))
+                    locked.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        worker = threading.Thread(target=hold_lock)
+        worker.start()
+        try:
+            self.assertTrue(locked.wait(10))
+            self.assertEqual(self.claimed_ids(ledger, limit=1), [f'{self.prefix}1'])
+        finally:
+            release.set()
+            worker.join()
+        self.assertEqual(self.claimed_ids(ledger), [f'{self.prefix}0', f'{self.prefix}2'])
+
+    def test_poison_hotels_are_left_out_until_they_succeed(self):
+        failed = self.start()
+        failed.job.tasks.filter(hotel_id=f'{self.prefix}0').update(status=GenerationTask.STATUS_FAILED, attempts=3)
+
+        ledger = self.start()
+        self.assertEqual(ledger.job.left_out, 1)
+        self.assertEqual(ledger.job.tasks.count(), 2)
+        self.assertEqual(self.start(retry_failed=True).job.tasks.count(), 3)
+
+        ledger.job.tasks.update(status=GenerationTask.STATUS_SUCCEEDED)
+        ledger.job.tasks.create(hotel_id=f'{self.prefix}0', stage='description', status=GenerationTask.STATUS_SUCCEEDED)
+        self.assertEqual(self.start().job.left_out, 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import os
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch, MagicMock
+from llmApp.services.gemini_service import GeminiService
+from llmApp.services.llm_backends import (
+    GeminiBackend, OllamaBackend, get_backend, parse_stage_backends
+)
+from llmApp.services.metrics import MetricsRegistry
+
+class TestOllamaBackend(unittest.TestCase):
+    def test_generate_payload(self):
+        backend = OllamaBackend('llama3.2', base_url='http://ollama:11434/', keep_alive='1h', options={'num_batch': 64})
+        payload = backend.build_payload('Hi', {'responseMimeType': 'application/json', 'maxOutputTokens': 100})
+        self.assertEqual(backend.url(), 'http://ollama:11434/api/generate')
+        self.assertEqual(payload, {
+            'model': 'llama3.2',
+            'stream': False,
+            'keep_alive': '1h',
+            'prompt': 'Hi',
+            'format': 'json',
+            'options': {'num_batch': 64, 'num_predict': 100},
+        })
+        text, usage = backend.parse_response({'response': 'Hello', 'prompt_eval_count': 3, 'eval_count': 2})
+        self.assertEqual(text, 'Hello')
+        self.assertEqual(usage, {'prompt': 3, 'response': 2, 'total': 5, 'cached': 0})
+
+    def test_chat_payload(self):
+        backend = OllamaBackend('qwen2.5', base_url='http://ollama:11434', chat=True, options={})
+        payload = backend.build_payload('Hi')
+        self.assertEqual(backend.url(), 'http://ollama:11434/api/chat')
+        self.assertEqual(payload['messages'], [{'role': 'user', 'content': 'Hi'}])
+        self.assertNotIn('options', payload)
+        payload = backend.build_payload('Hi', system='Be brief')
+        self.assertEqual(payload['messages'][0], {'role': 'system', 'content': 'Be brief'})
+        text, _ = backend.parse_response({'message': {'role': 'assistant', 'content': 'Hello'}})
+        self.assertEqual(text, 'Hello')
+
+    @patch.dict(os.environ, {'OLLAMA_NUM_CTX': '4096'})
+    def test_options_from_env(self):
+        self.assertEqual(OllamaBackend().options, {'num_ctx': 4096})
+
+    def test_system_instruction(self):
+        payload = OllamaBackend(options={}).build_payload('Hi', system='Be brief')
+        self.assertEqual(payload['system'], 'Be brief')
+        payload = GeminiBackend(api_key='test').build_payload('Hi', system='Be brief')
+        self.assertEqual(payload['systemInstruction'], {'parts': [{'text': 'Be brief'}]})
+        self.assertNotIn('systemInstruction', GeminiBackend(api_key='test').build_payload('Hi'))
+
+
+class TestBackendSpecs(unittest.TestCase):
+    def test_get_backend(self):
+        backend = get_backend('ollama-chat:qwen2.5')
+        self.assertIsInstance(backend, OllamaBackend)
+        self.assertTrue(backend.chat)
+        self.assertEqual(backend.model, 'qwen2.5')
+        self.assertEqual(get_backend('gemini:gemini-1.5-pro').model, 'gemini-1.5-pro')
+        with patch.dict(os.environ, {'LLM_BACKEND': 'ollama'}):
+            self.assertIsInstance(get_backend(), OllamaBackend)
+        with self.assertRaises(ValueError):
+            get_backend('openai')
+
+    def test_parse_stage_backends(self):
+        backends = parse_stage_backends('title=ollama:llama3.2, review=gemini')
+        self.assertEqual(sorted(backends), ['review', 'title'])
+        self.assertIsInstance(backends['title'], OllamaBackend)
+        self.assertEqual(parse_stage_backends(None), {})
+        with self.assertRaises(ValueError):
+            parse_stage_backends('title')
+
+
+class TestStageRouting(unittest.TestCase):
+    @patch('llmApp.services.gemini_service.requests.Session.post')
+    def test_stage_goes_to_its_backend_without_rate_limiting(self, mock_post):
+        response = MagicMock(status_code=200)
+        response.json.return_value = {'response': 'Local Title', 'prompt_eval_count': 10, 'eval_count': 3}
+        mock_post.return_value = response
+        rate_limiter = MagicMock()
+        service = GeminiService(
+            rate_limiter=rate_limiter,
+            use_cache=False,
+            metrics=MagicMock(spec=MetricsRegistry),
+            backend=GeminiBackend(api_key='key'),
+            stage_backends={'title': OllamaBackend('llama3.2', base_url='http://ollama:11434', options={})},
+        )
+        hotel = SimpleNamespace(property_title='Sea View', city_name='Dhaka', room_type='Double', rating=4.0)
+
+        self.assertEqual(service.rewrite_property_title(hotel), 'Local Title')
+        self.assertEqual(mock_post.call_args[0][0], 'http://ollama:11434/api/generate')
+        self.assertEqual(mock_post.call_args[1]['json']['model'], 'llama3.2')
+        rate_limiter.acquire.assert_not_called()
+
+        response.json.return_value = {'candidates': [{'content': {'parts': [{'text': 'Nice place'}]}}]}
+        service.generate_property_description({
+            'property_title': 'Sea View', 'city_name': 'Dhaka', 'room_type': 'Double', 'rating': 4.0, 'price': 100
+        })
+        self.assertTrue(mock_post.call_args[0][0].endswith('/gemini-1.5-flash:generateContent'))
+        self.assertEqual(mock_post.call_args[1]['params'], {'key': 'key'})
+        rate_limiter.acquire.assert_called_once()
@@ -0,0 +1,65 @@
+import os
+import tempfile
+import unittest
+from llmApp.services.metrics import MetricsRegistry
+
+class TestMetricsRegistry(unittest.TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.json')
+        os.close(handle)
+        os.remove(self.path)
+
+    def tearDown(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def test_summary_reports_counters_and_quantiles(self):
+        registry = MetricsRegistry(self.path, buckets=(1, 2, 4))
+        registry.inc('gemini_requests_total', stage='title', outcome='success')
+        registry.inc('gemini_requests_total', stage='title', outcome='success')
+        registry.inc('hotels_processed_total', 3, stage='title', status='succeeded')
+        for value in (0.5, 0.5, 1.5, 3):
+            registry.observe('gemini_request_seconds', value, stage='title')
+
+        summary = registry.summary()
+        self.assertEqual(
+            summary['counters']['gemini_requests_total'], {'outcome="success",stage="title"': 2}
+        )
+        latency = summary['histograms']['gemini_request_seconds']['stage="title"']
+        self.assertEqual(latency['count'], 4)
+        self.assertEqual(latency['p50'], 1)
+        self.assertGreater(latency['p99'], 2)
+        self.assertEqual(registry.counter_total('hotels_processed_total'), 3)
+
+    def test_flushes_from_several_processes_add_up(self):
+        first, second = MetricsRegistry(self.path), MetricsRegistry(self.path)
+        first.inc('gemini_throttled_total', stage='review')
+        first.flush()
+        first.flush()  # Nothing new to add
+        second.inc('gemini_throttled_total', 2, stage='review')
+        second.observe('db_flush_seconds', 0.2)
+        second.flush()
+
+        state = MetricsRegistry(self.path).read()
+        self.assertEqual(state['counters']['gemini_throttled_total'], {'stage="review"': 3})
+        self.assertEqual(state['histograms']['db_flush_seconds']['']['count'], 1)
+
+    def test_renders_prometheus_text(self):
+        registry = MetricsRegistry(self.path, buckets=(1, 5))
+        registry.inc('gemini_prompt_tokens_total', 120, stage='summary')
+        registry.observe('db_flush_seconds', 2)
+        registry.flush()
+
+        text = registry.render()
+        self.assertIn('# TYPE gemini_prompt_tokens_total counter', text)
+        self.assertIn('gemini_prompt_tokens_total{stage="summary"} 120', text)
+        self.assertIn('db_flush_seconds_bucket{le="1"} 0', text)
+        self.assertIn('db_flush_seconds_bucket{le="5"} 1', text)
+        self.assertIn('db_flush_seconds_bucket{le="+Inf"} 1', text)
+        self.assertIn('db_flush_seconds_count 1', text)
+
+    def test_render_without_metrics_file(self):
+        self.assertEqual(MetricsRegistry(self.path).render(), '\n')
+
+if __name__ == '__main__':
+    unittest.main()
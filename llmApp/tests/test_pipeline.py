@@ -0,0 +1,142 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+from llmApp.models import Hotel
+from llmApp.services.gemini_service import AsyncGeminiService, Review
+from llmApp.services.pipeline import EnrichmentPipeline
+from llmApp.services.stages import STAGES, ReviewStage
+from llmApp.tests.helpers import make_hotel
+
+class TestEnrichmentPipeline(unittest.TestCase):
+    def setUp(self):
+        self.gemini_service = MagicMock()
+        self.gemini_service.rewrite_property_title.side_effect = lambda hotel: f'New {hotel.property_title}'
+        self.gemini_service.generate_property_description.side_effect = (
+            lambda data: f"Description of {data['property_title']}"
+        )
+        self.gemini_service.generate_property_summary.side_effect = (
+            lambda data: f"Summary of {data['description']}"
+        )
+        self.gemini_service.generate_property_review.return_value = (4.0, 'Lovely')
+        self.service = AsyncGeminiService(self.gemini_service, concurrency=3)
+
+    def run_pipeline(self, hotels, **kwargs):
+        pipeline = EnrichmentPipeline(self.service, queue_size=2, **kwargs)
+        pages = [hotels[i:i + 2] for i in range(0, len(hotels), 2)]
+        return [(hotel.id, stage.name, result) for hotel, stage, result, error in pipeline.run(pages)]
+
+    def test_every_stage_runs_in_dependency_order(self):
+        outputs = self.run_pipeline([make_hotel(i) for i in range(5)])
+
+        self.assertEqual(len(outputs), 20)
+        for hotel_id in range(5):
+            order = [stage for id_, stage, _ in outputs if id_ == hotel_id]
+            self.assertEqual(order[0], 'title')
+            self.assertLess(order.index('description'), order.index('summary'))
+            self.assertIn('review', order)
+
+        results = {(id_, stage): result for id_, stage, result in outputs}
+        self.assertEqual(results[(0, 'description')], 'Description of New Hotel 0')
+        self.assertEqual(results[(0, 'summary')], 'Summary of Description of New Hotel 0')
+
+    def test_stages_not_needed_are_skipped(self):
+        hotels = [
+            make_hotel(1, description='Existing', done=('description', 'review')),
+            make_hotel(2, description='Existing', done=('description', 'summary')),
+        ]
+        outputs = self.run_pipeline(hotels, stages=['description', 'summary', 'review'])
+
+        self.assertEqual(sorted(outputs), [
+            (1, 'summary', 'Summary of Existing'),
+            (2, 'review', (4.0, 'Lovely')),
+        ])
+
+    def test_failed_description_skips_summary(self):
+        self.gemini_service.generate_property_description.side_effect = None
+        self.gemini_service.generate_property_description.return_value = None
+
+        outputs = self.run_pipeline([make_hotel(1)])
+        self.assertEqual(sorted(stage for _, stage, _ in outputs), ['description', 'review', 'title'])
+        self.gemini_service.generate_property_summary.assert_not_called()
+
+    def test_errors_are_reported_and_pipeline_continues(self):
+        def rewrite(hotel):
+            if hotel.hotel_id == '1':
+                raise RuntimeError('boom')
+            return 'New title'
+        self.gemini_service.rewrite_property_title.side_effect = rewrite
+        pipeline = EnrichmentPipeline(self.service, stages=['title', 'review'])
+
+        outputs = list(pipeline.run([[make_hotel(1), make_hotel(2)]]))
+        errors = [error for _, stage, _, error in outputs if stage.name == 'title' and error]
+        self.assertIsInstance(errors[0], RuntimeError)
+        # Reviews wait for the title, so only the hotel whose title succeeded gets one
+        self.assertEqual(
+            sorted((hotel.id, stage.name) for hotel, stage, _, _ in outputs),
+            [(1, 'title'), (2, 'review'), (2, 'title')],
+        )
+
+    def test_dependents_of_an_invalid_result_are_skipped(self):
+        self.gemini_service.rewrite_property_title.side_effect = None
+        self.gemini_service.rewrite_property_title.return_value = None
+
+        skipped = []
+        outputs = self.run_pipeline([make_hotel(1)], on_skip=lambda hotel, stage: skipped.append(stage.name))
+        self.assertEqual([stage for _, stage, _ in outputs], ['title'])
+        self.assertEqual(sorted(skipped), ['description', 'review', 'summary'])
+
+    def test_should_run_overrides_needs(self):
+        hotels = [make_hotel(1), make_hotel(2)]
+        should_run = lambda hotel, stage: stage.name == 'title' or hotel.id == 2
+        outputs = self.run_pipeline(hotels, stages=['title', 'description'], should_run=should_run)
+
+        self.assertEqual(sorted((id_, stage) for id_, stage, _ in outputs), [
+            (1, 'title'), (2, 'description'), (2, 'title'),
+        ])
+
+class TestReviewStage(unittest.TestCase):
+    def test_review_set_becomes_one_row_per_review(self):
+        gemini_service = MagicMock()
+        gemini_service.generate_property_review_set.return_value = [Review(4.0, 'Quiet'), Review(3.0, 'Noisy')]
+        stage = ReviewStage(per_hotel=2)
+        hotel = Hotel(id=1, hotel_id='h1', property_title='Hotel 1', city_name='Dhaka', price=100.0, rating=4.0)
+
+        result = asyncio.run(stage.generate(AsyncGeminiService(gemini_service), hotel))
+        self.assertEqual(gemini_service.generate_property_review_set.call_args.args[1], 2)
+        self.assertTrue(stage.is_valid(result))
+        self.assertFalse(stage.is_valid([]))
+        rows = stage.build_rows(hotel, result, 'abc')
+        self.assertEqual([(row.rating, row.review) for row in rows], [(4.0, 'Quiet'), (3.0, 'Noisy')])
+
+    def test_single_review_by_default(self):
+        self.assertEqual(STAGES['review'].reviews_wanted(SimpleNamespace(review_count=0)), 1)
+        rows = STAGES['review'].build_rows(Hotel(id=1), (4.0, 'Lovely'), 'abc')
+        self.assertEqual(len(rows), 1)
+
+    def test_regenerated_reviews_keep_the_hotels_number_of_reviews(self):
+        gemini_service = MagicMock()
+        gemini_service.generate_property_review_sets.side_effect = lambda properties, count: {
+            data['hotel_id']: [Review(4.0, 'Quiet')] * count for data in properties
+        }
+        gemini_service.generate_property_reviews.side_effect = lambda properties: {
+            data['hotel_id']: (4.0, 'Quiet') for data in properties
+        }
+        hotels = [
+            Hotel(id=number, hotel_id=f'h{number}', property_title='Hotel', city_name='Dhaka', price=100.0, rating=4.0)
+            for number in range(3)
+        ]
+        for hotel, count in zip(hotels, (3, 0, 3)):
+            hotel.review_count = count
+
+        results = asyncio.run(STAGES['review'].generate_batch(AsyncGeminiService(gemini_service), hotels))
+        self.assertEqual(len(results['h0']), 3)
+        self.assertEqual(results['h1'], (4.0, 'Quiet'))
+        gemini_service.generate_property_review_sets.assert_called_once()
+        self.assertEqual(gemini_service.generate_property_review_sets.call_args.args[1], 3)
+
+        # An explicit number wins over the hotel's
+        self.assertEqual(ReviewStage(per_hotel=2).reviews_wanted(hotels[0]), 2)
+
+if __name__ == '__main__':
+    unittest.main()
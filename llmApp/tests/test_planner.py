@@ -0,0 +1,106 @@
+import unittest
+from unittest.mock import patch
+from django.db import transaction
+from llmApp.models import Hotel, PropertyReview, PropertySummary
+from llmApp.services.llm_backends import GeminiBackend, OllamaBackend
+from llmApp.services.planner import PromptRecorder, StagePlan, format_duration, plan_stage, project_seconds
+from llmApp.services.stages import STAGES, ReviewStage, get_stages, pending_any, upstream
+from llmApp.tests.helpers import PostgresTestCase, make_hotel
+
+class TestPlanner(unittest.TestCase):
+    def setUp(self):
+        self.service = PromptRecorder(backend=GeminiBackend(api_key='test'))
+
+    def tearDown(self):
+        self.service.close()
+
+    @patch('llmApp.services.gemini_service.requests.Session.post')
+    def test_plan_builds_real_prompts_without_calling_the_api(self, mock_post):
+        sample = [make_hotel(number, description='A hotel.') for number in range(4)]
+        plan = plan_stage(STAGES['description'], 100, sample, self.service)
+
+        mock_post.assert_not_called()
+        self.assertEqual(len(self.service.prompts), 4)
+        self.assertIn('You write engaging hotel descriptions', self.service.prompts[0][2])
+        self.assertEqual(plan.requests, 100)
+        self.assertGreater(plan.total_prompt_tokens, 100 * 50)
+        self.assertEqual(plan.total_response_tokens, 100 * 250)
+
+    def test_prompt_batches_cut_requests(self):
+        sample = [make_hotel(number, description='A hotel.') for number in range(6)]
+        single = plan_stage(STAGES['title'], 100, sample, self.service)
+        batched = plan_stage(STAGES['title'], 100, sample, self.service, prompt_batch=5)
+
+        self.assertEqual(batched.requests, 20)
+        self.assertLess(batched.total_prompt_tokens, single.total_prompt_tokens)
+        self.assertEqual(batched.total_response_tokens, single.total_response_tokens)
+
+    def test_review_sets_scale_response_tokens(self):
+        plan = plan_stage(ReviewStage(per_hotel=3), 10, [make_hotel(1, description='A hotel.')], self.service)
+        self.assertEqual(plan.requests, 10)
+        self.assertEqual(plan.total_response_tokens, 10 * 3 * 180)
+
+    def test_cost_uses_model_prices_and_local_backends_are_free(self):
+        plan = StagePlan('title', 10, 10, 1000, 100, GeminiBackend(model='gemini-1.5-flash'))
+        self.assertAlmostEqual(plan.cost, (10000 * 0.075 + 1000 * 0.30) / 1_000_000)
+        self.assertEqual(StagePlan('title', 10, 10, 1000, 100, OllamaBackend()).cost, 0)
+        self.assertIsNone(StagePlan('title', 10, 10, 1000, 100, GeminiBackend(model='unknown')).cost)
+
+    def test_projection_picks_the_bottleneck(self):
+        plans = [StagePlan('title', 600, 600, 200, 50, GeminiBackend())]
+        self.assertEqual(project_seconds(plans, concurrency=1, latency=2.0), {'seconds': 1200, 'bottleneck': 'concurrency'})
+        self.assertEqual(project_seconds(plans, concurrency=10, latency=2.0, rpm=60)['bottleneck'], 'rpm')
+        self.assertEqual(project_seconds(plans, concurrency=10, latency=2.0, rpm=600, tpm=1500)['seconds'], 6000)
+        # Local backends are not held to the Gemini quota
+        local = [StagePlan('title', 600, 600, 200, 50, OllamaBackend())]
+        self.assertEqual(project_seconds(local, concurrency=4, latency=2.0, rpm=60)['bottleneck'], 'concurrency')
+        self.assertEqual(format_duration(3725), '1h 02m')
+
+    def test_upstream_follows_stage_outputs(self):
+        stages = get_stages()
+        self.assertEqual([stage.name for stage in upstream(STAGES['summary'], stages)], ['title', 'description', 'summary'])
+        self.assertEqual([stage.name for stage in upstream(STAGES['title'], stages)], ['title'])
+        self.assertEqual(
+            [stage.name for stage in upstream(STAGES['summary'], get_stages(['summary', 'review']))], ['summary']
+        )
+
+class TestPlanWithLegacyContent(unittest.TestCase):
+    def where(self, queryset) -> str:
+        return str(queryset.query).split(' WHERE ', 1)[1]
+
+    def test_plan_queries_leave_out_unstamped_content(self):
+        planned = self.where(STAGES['description'].pending(assume_adopted=True))
+        self.assertIn('NOT ("hotels"."description" IS NOT NULL AND "hotels"."description_fingerprint" IS NULL)', planned)
+        for name in ('summary', 'review'):
+            self.assertIn('"source_fingerprint" IS NULL', self.where(STAGES[name].pending(assume_adopted=True)))
+        # With force every hotel gets new reviews, stamped or not
+        self.assertEqual(
+            self.where(STAGES['review'].pending(force=True, assume_adopted=True)),
+            self.where(STAGES['review'].pending(force=True)),
+        )
+
+class TestPlanWithLegacyRows(PostgresTestCase):
+    """
+    Plans against the configured PostgreSQL database, inside a transaction
+    that is rolled back
+    """
+
+    def test_legacy_content_is_not_planned(self):
+        stages = [STAGES['description'], STAGES['summary'], STAGES['review']]
+        with transaction.atomic():
+            hotel = Hotel.objects.create(
+                hotel_id='plan-legacy', property_title='Old Inn', city_name='Dhaka', price=50, rating=4,
+                address='a', latitude=0, longitude=0, room_type='Double', image='http://x/y.jpg',
+                local_image_path='p', description='Written before fingerprints.',
+            )
+            PropertySummary.objects.create(property=hotel, summary='Old summary.')
+            PropertyReview.objects.create(property=hotel, rating=4, review='Old review.')
+
+            for stage in stages:
+                self.assertTrue(stage.pending().filter(pk=hotel.pk).exists())
+                self.assertFalse(stage.pending(assume_adopted=True).filter(pk=hotel.pk).exists())
+            self.assertFalse(pending_any(stages, assume_adopted=True).filter(pk=hotel.pk).exists())
+            transaction.set_rollback(True)
+
+if __name__ == '__main__':
+    unittest.main()
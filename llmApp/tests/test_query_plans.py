@@ -0,0 +1,50 @@
+import unittest
+from django.db import DatabaseError, connection, transaction
+from llmApp.models import Hotel
+from llmApp.services.stages import STAGES
+
+class TestWorkDiscoveryPlans(unittest.TestCase):
+    """
+    EXPLAIN the pending-work queries against the configured PostgreSQL
+    database (nothing is executed), skipped when there is none
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        if connection.vendor != 'postgresql':
+            raise unittest.SkipTest('Query plans are only checked on PostgreSQL')
+        try:
+            connection.ensure_connection()
+        except DatabaseError as e:
+            raise unittest.SkipTest(f'No database to explain against: {e}')
+
+    def explain(self, queryset) -> str:
+        # Test tables are tiny, where a sequential scan always wins; ruling
+        # it out shows whether an index can serve the query at all
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            plan = queryset.explain()
+            transaction.set_rollback(True)
+        return plan
+
+    def test_pending_summaries_anti_join_uses_the_fk_index(self):
+        plan = self.explain(STAGES['summary'].pending())
+
+        self.assertIn('Anti Join', plan)
+        self.assertIn('property_summaries_property', plan)
+
+    def test_pending_reviews_anti_join_uses_the_fk_index(self):
+        plan = self.explain(STAGES['review'].pending())
+
+        self.assertIn('Anti Join', plan)
+        self.assertIn('property_reviews_property', plan)
+
+    def test_unstamped_descriptions_use_the_partial_index(self):
+        plan = self.explain(Hotel.objects.filter(description__isnull=False, description_fingerprint__isnull=True))
+
+        self.assertIn('hotels_description_unstamped', plan)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from llmApp.services.rate_limiter import RateLimiter
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = 0.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+        self.slept += seconds
+
+class TestRateLimiter(unittest.TestCase):
+    def setUp(self):
+        handle, self.state_path = tempfile.mkstemp(suffix='.json')
+        os.close(handle)
+        self.clock = FakeClock()
+        patcher = patch('llmApp.services.rate_limiter.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(os.remove, self.state_path)
+
+    def make_limiter(self, **kwargs):
+        kwargs.setdefault('state_path', self.state_path)
+        return RateLimiter(**kwargs)
+
+    def test_burst_within_capacity_does_not_wait(self):
+        limiter = self.make_limiter(rpm=60)
+        for _ in range(10):
+            self.assertEqual(limiter.acquire(), 0.0)
+
+    def test_requests_beyond_capacity_are_paced(self):
+        limiter = self.make_limiter(rpm=60)
+        for _ in range(10):
+            limiter.acquire()
+        limiter.acquire()
+        limiter.acquire()
+        self.assertAlmostEqual(self.clock.slept, 2.0, places=3)
+
+    def test_token_budget_is_enforced(self):
+        limiter = self.make_limiter(rpm=0, tpm=6000)  # 100 tokens per second
+        limiter.acquire(1000)
+        self.assertEqual(self.clock.slept, 0.0)
+        limiter.acquire(500)
+        self.assertAlmostEqual(self.clock.slept, 5.0, places=3)
+
+    def test_state_is_shared_between_instances(self):
+        first = self.make_limiter(rpm=60)
+        second = self.make_limiter(rpm=60)
+        for _ in range(5):
+            first.acquire()
+            second.acquire()
+        second.acquire()
+        self.assertGreater(self.clock.slept, 0)
+
+    def test_throttle_scales_down_and_successes_recover(self):
+        limiter = self.make_limiter(rpm=60, recovery_after=2, recovery_step=0.25)
+        limiter.record_throttle()
+        limiter.record_throttle()
+        self.assertEqual(limiter.scale, 0.25)
+
+        for _ in range(4):
+            limiter.record_success()
+        self.assertEqual(limiter.scale, 0.75)
+
+        for _ in range(10):
+            limiter.record_success()
+        self.assertEqual(limiter.scale, 1.0)
+
+    def test_adjust_tokens_charges_actual_usage(self):
+        limiter = self.make_limiter(rpm=0, tpm=6000)
+        limiter.acquire(100)
+        limiter.adjust_tokens(900)
+        limiter.acquire(100)
+        self.assertAlmostEqual(self.clock.slept, 1.0, places=3)
+
+    def test_disabled_limiter_never_waits(self):
+        limiter = self.make_limiter(rpm=0, tpm=0)
+        for _ in range(100):
+            self.assertEqual(limiter.acquire(10000), 0.0)
+        self.assertEqual(self.clock.slept, 0.0)
+
+    def test_limits_default_to_the_published_quota_of_the_model(self):
+        with patch.dict(os.environ, {}, clear=True):
+            limiter = RateLimiter.from_env(['gemini-1.5-flash', 'gemini-1.5-pro'])
+            self.assertEqual((limiter.rpm, limiter.tpm), (1000, 4_000_000))
+            self.assertFalse(RateLimiter.from_env(['some-local-model']).enabled)
+        with patch.dict(os.environ, {'GEMINI_RPM': '30'}, clear=True):
+            self.assertEqual(RateLimiter.from_env(['gemini-1.5-pro']).rpm, 30)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+from unittest.mock import patch
+from llmApp.services.response_cache import ResponseCache
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = ResponseCache(path=':memory:', ttl=60, max_entries=3)
+        self.addCleanup(self.cache.close)
+
+    def test_get_returns_stored_response(self):
+        self.cache.set('key', 'value')
+        self.assertEqual(self.cache.get('key'), 'value')
+        self.assertIsNone(self.cache.get('missing'))
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_key_depends_on_model_prompt_and_params(self):
+        key = ResponseCache.make_key('model-a', 'prompt', {'temperature': 0.2})
+        self.assertEqual(key, ResponseCache.make_key('model-a', 'prompt', {'temperature': 0.2}))
+        self.assertNotEqual(key, ResponseCache.make_key('model-b', 'prompt', {'temperature': 0.2}))
+        self.assertNotEqual(key, ResponseCache.make_key('model-a', 'other', {'temperature': 0.2}))
+        self.assertNotEqual(key, ResponseCache.make_key('model-a', 'prompt', {'temperature': 0.9}))
+
+    @patch('llmApp.services.response_cache.time.time')
+    def test_entries_expire_after_ttl(self, mock_time):
+        mock_time.return_value = 1000
+        self.cache.set('key', 'value')
+        mock_time.return_value = 1061
+        self.assertIsNone(self.cache.get('key'))
+        self.assertEqual(len(self.cache), 0)
+
+    @patch('llmApp.services.response_cache.time.time')
+    def test_least_recently_used_entries_are_evicted(self, mock_time):
+        for tick, key in enumerate(['a', 'b', 'c']):
+            mock_time.return_value = 1000 + tick
+            self.cache.set(key, key)
+        mock_time.return_value = 1010
+        self.cache.get('a')
+        mock_time.return_value = 1011
+        self.cache.set('d', 'd')
+
+        self.assertEqual(len(self.cache), 3)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache.get('a'), 'a')
+
+    def test_sets_only_evict_when_needed(self):
+        cache = ResponseCache(path=':memory:', ttl=60, max_entries=100)
+        self.addCleanup(cache.close)
+        with patch.object(cache, '_evict', wraps=cache._evict) as evict:
+            for number in range(100):
+                cache.set(f'key{number}', 'value')
+            evict.assert_not_called()
+
+            cache.set('key100', 'value')
+            evict.assert_called_once()
+        # Room is made for a tenth of the limit, so the next sets do not evict
+        self.assertEqual(len(cache), 90)
+        self.assertIsNone(cache.get('key0'))
+        self.assertEqual(cache.get('key100'), 'value')
+
+    @patch('llmApp.services.response_cache.EVICT_INTERVAL', 2)
+    @patch('llmApp.services.response_cache.time.time')
+    def test_expired_entries_are_swept_periodically(self, mock_time):
+        mock_time.return_value = 1000
+        self.cache.set('old', 'value')
+        mock_time.return_value = 1100
+        self.cache.set('new', 'value')
+
+        self.assertEqual(len(self.cache), 1)
+        indexes = [row[1] for row in self.cache._connection.execute('PRAGMA index_list(responses)')]
+        self.assertIn('responses_created_at', indexes)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import unittest
+from contextlib import nullcontext
+from unittest.mock import MagicMock, patch
+from llmApp.services.write_buffer import WriteBuffer
+
+class FakeStage:
+    def __init__(self, name, fail_on=()):
+        self.name = name
+        self.fail_on = set(fail_on)
+        self.calls = []
+
+    def apply_many(self, results, force=False):
+        results = list(results)
+        self.calls.append(results)
+        if any(hotel in self.fail_on for hotel, _ in results):
+            raise ValueError('bad row')
+        return len(results)
+
+@patch('llmApp.services.write_buffer.transaction.atomic', lambda: nullcontext())
+class TestWriteBuffer(unittest.TestCase):
+    def test_flushes_in_bulk_when_size_is_reached(self):
+        stage = FakeStage('summary')
+        saved = MagicMock()
+        buffer = WriteBuffer(flush_size=3, flush_interval=60, on_saved=saved)
+
+        for hotel in ('a', 'b', 'c', 'd'):
+            buffer.add(hotel, stage, f'summary {hotel}')
+
+        self.assertEqual(stage.calls, [[('a', 'summary a'), ('b', 'summary b'), ('c', 'summary c')]])
+        self.assertEqual(len(buffer), 1)
+        self.assertEqual(saved.call_count, 3)
+
+        buffer.flush()
+        self.assertEqual(buffer.stats['flushes'], 2)
+        self.assertEqual(buffer.stats['written'], 4)
+
+    def test_groups_results_per_stage(self):
+        titles, reviews = FakeStage('title'), FakeStage('review')
+        with WriteBuffer(flush_size=10) as buffer:
+            buffer.add('a', titles, 'Title A')
+            buffer.add('a', reviews, (4, 'Good'))
+            buffer.add('b', titles, 'Title B')
+
+        self.assertEqual(titles.calls, [[('a', 'Title A'), ('b', 'Title B')]])
+        self.assertEqual(reviews.calls, [[('a', (4, 'Good'))]])
+
+    @patch('llmApp.services.write_buffer.time.monotonic')
+    def test_flushes_when_interval_elapses(self, mock_monotonic):
+        mock_monotonic.return_value = 100
+        stage = FakeStage('description')
+        buffer = WriteBuffer(flush_size=100, flush_interval=5)
+
+        buffer.add('a', stage, 'A')
+        self.assertEqual(stage.calls, [])
+        mock_monotonic.return_value = 106
+        buffer.add('b', stage, 'B')
+        self.assertEqual(stage.calls, [[('a', 'A'), ('b', 'B')]])
+
+    def test_failed_bulk_flush_isolates_bad_rows(self):
+        stage = FakeStage('summary', fail_on={'b'})
+        saved, failed = MagicMock(), MagicMock()
+        buffer = WriteBuffer(flush_size=10, on_saved=saved, on_error=failed)
+
+        for hotel in ('a', 'b', 'c'):
+            buffer.add(hotel, stage, hotel.upper())
+        self.assertEqual(buffer.flush(), 2)
+
+        self.assertEqual([call.args[0] for call in saved.call_args_list], ['a', 'c'])
+        failed.assert_called_once()
+        self.assertEqual(failed.call_args.args[0], 'b')
+        self.assertEqual(buffer.stats['failed'], 1)
+
+    def test_on_flush_sees_only_rows_written(self):
+        stage = FakeStage('summary', fail_on={'b'})
+        flushed = []
+        buffer = WriteBuffer(flush_size=10, on_flush=flushed.extend)
+
+        for hotel in ('a', 'b', 'c'):
+            buffer.add(hotel, stage, hotel.upper())
+        buffer.flush()
+
+        self.assertEqual(flushed, [(stage, [('a', 'A')]), (stage, [('c', 'C')])])
+
+    def test_guard_drops_results_before_they_are_written(self):
+        stage = FakeStage('summary')
+        saved = MagicMock()
+
+        def guard(pending):
+            return [(stage, [item for item in items if item[0] != 'b']) for stage, items in pending]
+
+        buffer = WriteBuffer(flush_size=10, on_saved=saved, guard=guard)
+        for hotel in ('a', 'b', 'c'):
+            buffer.add(hotel, stage, hotel.upper())
+
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(stage.calls, [[('a', 'A'), ('c', 'C')]])
+        self.assertEqual([call.args[0] for call in saved.call_args_list], ['a', 'c'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+# llmApp/views.py
+import hashlib
+
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_safe
+from llmApp.models import Hotel
+from llmApp.services.hotel_api import InvalidCursor, decode_cursor, get_entries, get_entry, page_ids, summary_document
+from llmApp.services.metrics import get_registry
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+# Query parameter, lookup
+FILTERS = {
+    'min_rating': 'rating__gte',
+    'max_rating': 'rating__lte',
+    'min_price': 'price__gte',
+    'max_price': 'price__lte',
+}
+
+
+def metrics(request):
+    """
+    Generation metrics from every command run on this host, in the
+    Prometheus text format
+    """
+    return HttpResponse(get_registry().render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def conditional_json(request, data, etag, last_modified):
+    """
+    JSON response with validators, or 304 when the client's copy is current
+    """
+    etag = quote_etag(etag)
+    response = JsonResponse(data)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = 'no-cache'
+    return get_conditional_response(request, etag=etag, last_modified=last_modified, response=response)
+
+
+def error(message, status=400):
+    return JsonResponse({'error': message}, status=status)
+
+
+@require_safe
+def hotel_list(request):
+    """
+    Hotels ordered by id, filtered by city_name, min/max_rating and
+    min/max_price, a page at a time: pass the response's next_cursor as
+    ?cursor= for the next page
+    """
+    queryset = Hotel.objects.all()
+    if request.GET.get('city_name'):
+        queryset = queryset.filter(city_name__iexact=request.GET['city_name'])
+    for parameter, lookup in FILTERS.items():
+        if request.GET.get(parameter):
+            try:
+                queryset = queryset.filter(**{lookup: float(request.GET[parameter])})
+            except ValueError:
+                return error(f"{parameter} must be a number")
+    try:
+        limit = min(MAX_PAGE_SIZE, max(1, int(request.GET.get('limit', DEFAULT_PAGE_SIZE))))
+        after = decode_cursor(request.GET['cursor']) if request.GET.get('cursor') else None
+    except InvalidCursor as e:
+        return error(str(e))
+    except ValueError:
+        return error('limit must be a whole number')
+
+    hotel_ids, next_cursor = page_ids(queryset, after, limit)
+    entries = get_entries(hotel_ids)
+    # A hotel deleted since the page was read is left out
+    entries = [entries[hotel_id] for hotel_id in hotel_ids if hotel_id in entries]
+    etag = hashlib.md5(
+        ','.join([entry['etag'] for entry in entries] + [next_cursor or '']).encode()
+    ).hexdigest()
+    last_modified = max((entry['last_modified'] for entry in entries), default=0)
+    data = {
+        'results': [summary_document(entry['document']) for entry in entries],
+        'next_cursor': next_cursor,
+    }
+    return conditional_json(request, data, etag, last_modified)
+
+
+@require_safe
+def hotel_detail(request, hotel_id):
+    """
+    One hotel with its latest summary and newest reviews
+    """
+    entry = get_entry(hotel_id)
+    if entry is None:
+        return error('Hotel not found', status=404)
+    return conditional_json(request, entry['document'], entry['etag'], entry['last_modified'])